@@ -1,10 +1,24 @@
 import os
 import sys
 import argparse
-from text_to_speech import TextToSpeechGenerator
-from image_downloader import ImageDownloader
+from text_to_speech import TextToSpeechGenerator, voice_for
+from image_downloader import ImageDownloader, POLLINATIONS_URL, GOOGLE_URL
 from video_creator import VideoCreator
 from video_downloader import VideoDownloader
+from asset_hash import AssetHashIndex
+from asset_index import AssetReuseIndex
+from hedged_fetch import FetchBudget, LatencyRecorder
+from stage_executor import StageGraph
+from keyword_extractor import KeywordExtractor, chunk_script
+from render_farm import RenderCoordinator, ContentStore, DEFAULT_PORT
+from clip_analysis import ClipAnalyzer
+from frame_cache import FrameCache
+from workspace import Workspace, WorkspaceCleaner, new_job_id
+from karaoke import WORDS_SUFFIX
+from translation import ScriptTranslator
+from fragment_stream import FragmentTailer, build_sinks
+from cost_model import CostModel, job_features, stage_seconds
+from moviepy import AudioFileClip
 import nltk
 from nltk.tokenize import sent_tokenize
 import spacy
@@ -12,17 +26,21 @@ import json
 import logging
 from datetime import datetime
 from pathlib import Path
-import shutil
+import time
 import traceback
+import glob
 
 class ScriptToVideo:
-    def __init__(self, config_path='config.json'):
+    def __init__(self, config_path='config.json', render_farm=None):
         """
         Initialize the video creation application
         
         Parameters:
         config_path (str): Path to configuration file
+        render_farm (RenderCoordinator): Coordinator already running in this process, for
+            creators that share it; by default one is started when the config has render_farm
         """
+        self.render_farm = render_farm
         self.setup_logging()
         self.load_config(config_path)
         self.setup_workspace()
@@ -67,29 +85,99 @@ class ScriptToVideo:
                 json.dump(self.config, f, indent=2)
                 
     def setup_workspace(self):
-        """Create necessary folders"""
+        """Create necessary folders; each job works in its own folder under temp"""
         self.folders = {
             'output': self.config['output_folder'],
             'temp': self.config['temp_folder'],
-            'audio': os.path.join(self.config['temp_folder'], 'audio'),
-            'images': os.path.join(self.config['temp_folder'], 'images'),
-            'videos': os.path.join(self.config['temp_folder'], 'videos'),
-            'subtitles': os.path.join(self.config['temp_folder'], 'subtitles')
+            # Input images for method 'image' are placed here beforehand
+            'images': os.path.join(self.config['temp_folder'], 'images')
         }
         
         for folder in self.folders.values():
             os.makedirs(folder, exist_ok=True)
+        # Job scratch folders go here when set, e.g. /dev/shm for RAM-backed intermediates
+        self.scratch_root = self.config.get('scratch_folder')
+        self.workspace_cleaner = WorkspaceCleaner()
             
     def initialize_components(self):
         """Initialize all required components"""
         try:
            
             
+            # Perceptual-hash index shared by the downloaders (null in config disables it)
+            index_path = self.config.get('asset_hash_index', 'asset_hashes.json')
+            retention_days = self.config.get('asset_hash_retention_days', 30)
+            self.hash_index = None
+            if index_path:
+                self.hash_index = AssetHashIndex(index_path,
+                                                 retention=retention_days * 86400 if retention_days else None)
+            # Library of fetched assets reused for similar queries in later jobs (null in config disables it)
+            library_dir = self.config.get('asset_library', 'asset_library')
+            self.asset_index = None
+            if library_dir:
+                self.asset_index = AssetReuseIndex(library_dir, self.config.get('asset_reuse_threshold', 0.6))
+
+            # Fetch latency per source, shared by the downloaders and logged after each job
+            self.fetch_latency = LatencyRecorder()
+            # Library matches standing in for fetches that ran out of time; None keeps asset_reuse_threshold
+            fallback_threshold = self.config.get('fallback_threshold')
+
             # Initialize other components
-            self.speech_generator = TextToSpeechGenerator()
-            self.image_downloader = ImageDownloader()
-            self.video_creator = VideoCreator()
-            self.video_downloader = VideoDownloader()
+            self.speech_generator = TextToSpeechGenerator(command=self.config.get('tts_command', 'edge-tts'))
+            self.image_downloader = ImageDownloader(
+                hash_index=self.hash_index,
+                pollinations_url=self.config.get('pollinations_url', POLLINATIONS_URL),
+                google_url=self.config.get('google_url', GOOGLE_URL),
+                asset_index=self.asset_index,
+                hedge_after=self.config.get('hedge_after', 8.0),
+                max_hedges=self.config.get('max_hedges', 1),
+                fetch_timeout=self.config.get('fetch_timeout', 120.0),
+                fallback_threshold=fallback_threshold,
+                latency_recorder=self.fetch_latency
+            )
+            # Segment encoding moves to worker nodes when a render farm is configured. The
+            # coordinator owns its port, so further creators in the process are handed this one
+            farm_config = self.config.get('render_farm')
+            if farm_config and self.render_farm is None:
+                self.render_farm = RenderCoordinator(
+                    ContentStore(farm_config['store']),
+                    host=farm_config.get('host', '0.0.0.0'),
+                    port=farm_config.get('port', DEFAULT_PORT),
+                    lease_seconds=farm_config.get('lease_seconds', 120),
+                    max_attempts=farm_config.get('max_attempts', 3)
+                )
+                self.render_farm.start()
+            # Motion profiles of stock clips, cached so each clip is analysed once
+            self.clip_analyzer = None
+            if self.config.get('smart_trim', True):
+                self.clip_analyzer = ClipAnalyzer(self.config.get('clip_scores', 'clip_scores.json'))
+            # Decoded frames shared by every render process on this machine (null disables)
+            self.frame_cache = None
+            frame_cache_dir = self.config.get('frame_cache', 'frame_cache')
+            if frame_cache_dir:
+                self.frame_cache = FrameCache(frame_cache_dir, self.config.get('frame_cache_mb', 2048) << 20)
+            # Fragmented outputs streamed to sinks while they render (null disables)
+            self.progressive_output = self.config.get('progressive_output')
+            self.video_creator = VideoCreator(render_farm=self.render_farm, clip_analyzer=self.clip_analyzer,
+                                              frame_cache=self.frame_cache,
+                                              fragment_seconds=(self.progressive_output or {}).get('fragment_seconds'),
+                                              zoom_rate=self.config.get('zoom_rate', 0.05),
+                                              variable_frame_rate=self.config.get('variable_frame_rate', False))
+            self.video_downloader = VideoDownloader(hash_index=self.hash_index, asset_index=self.asset_index,
+                                                    fetch_timeout=self.config.get('fetch_timeout', 120.0),
+                                                    fallback_threshold=fallback_threshold,
+                                                    latency_recorder=self.fetch_latency)
+            self.keyword_extractor = KeywordExtractor(
+                model=self.config.get('spacy_model', 'en_core_web_sm'),
+                batch_size=self.config.get('keyword_batch_size', 64),
+                n_process=self.config.get('keyword_processes', 1),
+                cache_path=self.config.get('keyword_cache')
+            )
+            # Sentence-level translations for --variants, cached across runs
+            self.translator = ScriptTranslator(cache_path=self.config.get('translation_cache', 'translations.json'))
+            # Stage timings of finished jobs, fitted to predict the cost of queued ones (null disables)
+            timings_path = self.config.get('cost_model', 'stage_timings.jsonl')
+            self.cost_model = CostModel(timings_path) if timings_path else None
             
             self.logger.info("All components initialized successfully")
         except Exception as e:
@@ -98,24 +186,213 @@ class ScriptToVideo:
             
     def extract_keywords(self, text):
         """Extract relevant keywords from text for image search"""
-        doc = self.nlp(text)
-        keywords = []
+        return self.keyword_extractor.extract(text)
         
-        # Extract named entities
-        entities = [ent.text for ent in doc.ents]
+    def build_job_graph(self, script, method, topic, voice_gender, language,
+                        audio_path, subtitles_path, encoded_audio_path, output_video, on_stage=None,
+                        on_event=None, cancelled=None, preview_dir=None, workspace=None, words_path=None,
+                        include_render=True):
+        """
+        Express one video job as a graph of stages.
+        
+        tts and keywords start immediately. keywords adds one fetch stage per
+        asset (and a preprocess stage per image), so downloads run while the
+        narration is synthesized. render waits for the narration, the
+        pre-encoded audio and the 'assets' barrier; with include_render=False the
+        graph stops before it (see prepare_video).
         
-        # Extract noun phrases
-        noun_phrases = [chunk.text for chunk in doc.noun_chunks]
+        Assets are written to workspace (the shared temp folder when None).
+        With words_path, TTS also writes word timings there and the captions
+        highlight each word as it is spoken.
         
-        # Combine and clean keywords
-        keywords = list(set(entities + noun_phrases))
+        Returns:
+        StageGraph: Graph ready to run
+        """
+        stage_names = {'tts': 'voiced', 'assets': 'assets_ready'}
+        def stage_event(name, status):
+            if on_event:
+                on_event(name, status)
+            if on_stage and status == 'finished' and name in stage_names:
+                on_stage(stage_names[name])
+        graph = StageGraph(max_workers=self.config.get('stage_workers', 8), on_event=stage_event,
+                           cancelled=cancelled)
+        resolution = self.config['video_resolution']
+        workspace = workspace or Workspace(self.config['temp_folder'])
+        # Method 'image' renders the images placed in the shared images folder
+        images_folder = self.folders['images'] if method == 'image' else workspace.folder('images')
+        captions_path = words_path or subtitles_path
         
-        # Filter out single-character keywords and common words
-        keywords = [k for k in keywords if len(k) > 1]
+        def tts(inputs):
+            self.logger.info("Generating audio and subtitles from script...")
+            success, result = self.speech_generator.generate_speech(
+                script,
+                voice_gender=voice_gender,
+                output_path=audio_path,
+                subtitles_path=subtitles_path,
+                force_language=language,
+                words_path=words_path
+            )
+            if not success:
+                raise Exception(f"Audio generation failed: {result}")
+            return audio_path
         
+        def audio_encode(inputs):
+            return self.video_creator.encode_audio(inputs['tts'], encoded_audio_path)
+        
+        def render(inputs):
+            if not inputs['assets']:
+                raise Exception("No assets were downloaded successfully")
+            if preview_dir:
+                self.logger.info("Sampling frames for the contact sheet...")
+                return self.video_creator.create_contact_sheet(
+                    media_folder=workspace.folder('videos') if method == 'video' else images_folder,
+                    audio_path=audio_path,
+                    subtitles_path=captions_path,
+                    output_dir=preview_dir,
+                    timestamps=self.config.get('preview_timestamps', 'scenes'),
+                    transition_duration=self.config['transition_duration'],
+                    transition_effect=self.config.get('transition_effect', 'crossfade'),
+                    resolution=resolution,
+                    max_scene_duration=self.config.get('max_scene_duration')
+                )
+            # Step 3: Create video
+            self.logger.info("Finally creating video...")
+            self.stream_output(output_video, lambda: self.render_video(
+                method, workspace, audio_path, captions_path, output_video, inputs['audio_encode']))
+            return output_video
+        
+        graph.add('tts', tts)
+        graph.add('audio_encode', audio_encode, deps=['tts'])
+        graph.add('keywords', self.keywords_stage(graph, script, method, topic, resolution, workspace))
+        if include_render:
+            graph.add('render', render, deps=['tts', 'audio_encode', 'assets'])
+        return graph
+        
+    def keywords_stage(self, graph, script, method, topic, resolution, workspace):
+        """
+        Stage function that picks the scenes' queries and adds one fetch stage per
+        asset (and a preprocess stage per image) to graph, behind an 'assets' barrier.
+        
+        The fetches share the job's fetch_budget: each gets a deadline from
+        what is left of it, and falls back to a library asset when that passes.
+        """
+        def keywords(inputs):
+            scenes = chunk_script(script)
+            if method == 'video':
+                # Stock-footage search works best with a few keywords per scene
+                keywords = self.keyword_extractor.queries_for(scenes)
+            else:
+                # Generated images keep the whole scene text as their prompt
+                keywords = scenes
+            self.logger.info(keywords)
+            prepared = []
+            budget = FetchBudget(self.config.get('fetch_budget', 600), self.config.get('stage_workers', 8))
+            def fetch(download):
+                def stage(inputs):
+                    try:
+                        return download(budget.start())
+                    finally:
+                        budget.done()
+                return stage
+            if method == 'video':
+                # Download pexel videoClips
+                budget.add(len(keywords))
+                for idx, keyword in enumerate(keywords):
+                    prepared.append(graph.add(
+                        f"fetch_{idx + 1:02d}",
+                        fetch(lambda deadline, idx=idx, keyword=keyword: self.video_downloader.download_video(
+                            idx, keyword, workspace=workspace, deadline=deadline))
+                    ))
+            elif method == 'image':
+                # Images are expected in the images folder already
+                image_files = sorted(
+                    path for format in VideoCreator.SUPPORTED_IMAGE_FORMATS
+                    for path in glob.glob(os.path.join(self.folders['images'], f"*{format}"))
+                )
+                for idx, image_path in enumerate(image_files, 1):
+                    prepared.append(graph.add(
+                        f"prep_{idx:02d}",
+                        lambda inputs, image_path=image_path: self.video_creator.preprocess_image(
+                            image_path, resolution, workspace)
+                    ))
+            else:
+                #Download AI Image
+                budget.add(len(keywords))
+                for idx, keyword in enumerate(keywords, 1):
+                    fetched = graph.add(
+                        f"fetch_{idx:02d}",
+                        fetch(lambda deadline, idx=idx, keyword=keyword: self.image_downloader.create_image(
+                            idx, keyword, topic, workspace=workspace, deadline=deadline))
+                    )
+                    prepared.append(graph.add(f"prep_{idx:02d}", self.preprocess_stage(fetched, resolution, workspace),
+                                              deps=[fetched]))
+            graph.add('assets', lambda inputs: [path for path in inputs.values() if path], deps=prepared)
+            return keywords
         return keywords
         
-    def create_video(self, script, method='image', topic='',voice_gender='male', language='en'):
+    def render_video(self, method, workspace, audio_path, subtitles_path, output_video, encoded_audio_path=None):
+        """Render the job's assets over the narration; without subtitles_path the video has no captions"""
+        resolution = self.config['video_resolution']
+        if method == 'video':
+            self.video_creator.create_clip_video(
+                video_folder=workspace.folder('videos'),
+                audio_path=audio_path,
+                subtitles_path=subtitles_path,
+                output_path=output_video,
+                transition_duration=self.config['transition_duration'],
+                transition_effect=self.config.get('transition_effect', 'crossfade'),
+                target_resolution=resolution,
+                segmented=self.config.get('segmented_render', False),
+                encoded_audio_path=encoded_audio_path,
+                max_scene_duration=self.config.get('max_scene_duration'),
+                workspace=workspace
+            )
+        else:
+            # Method 'image' renders the images placed in the shared images folder
+            self.video_creator.create_image_video(
+                image_folder=self.folders['images'] if method == 'image' else workspace.folder('images'),
+                audio_path=audio_path,
+                subtitles_path=subtitles_path,
+                output_path=output_video,
+                transition_duration=self.config['transition_duration'],
+                transition_effect=self.config.get('transition_effect', 'crossfade'),
+                resolution=resolution,
+                segmented=self.config.get('segmented_render', False),
+                encoded_audio_path=encoded_audio_path,
+                max_scene_duration=self.config.get('max_scene_duration'),
+                workspace=workspace
+            )
+        return output_video
+        
+    def stream_output(self, output_video, render):
+        """
+        Run render, streaming output_video to the progressive_output sinks as its fragments are written
+        
+        A failing sink is dropped without failing the render.
+        """
+        if not self.progressive_output:
+            return render()
+        name = os.path.splitext(os.path.basename(output_video))[0]
+        tailer = FragmentTailer(output_video, build_sinks(self.progressive_output.get('sinks', []), name=name)).start()
+        try:
+            return render()
+        finally:
+            stats = tailer.finish()
+            if stats['first_fragment_seconds'] is not None:
+                self.logger.info(f"Streamed {name}: {stats['fragments']} fragments, {stats['bytes']} bytes, "
+                                 f"first after {stats['first_fragment_seconds']:.1f}s")
+        
+    def preprocess_stage(self, fetch_stage, resolution, workspace=None):
+        """Stage function resizing the image a fetch stage produced, if any"""
+        def preprocess(inputs):
+            image_path = inputs[fetch_stage]
+            if image_path is None:
+                return None
+            return self.video_creator.preprocess_image(image_path, resolution, workspace)
+        return preprocess
+        
+    def create_video(self, script, method='image', topic='',voice_gender='male', language='en', on_stage=None,
+                     on_event=None, cancelled=None, preview_dir=None):
         """
         Create a video from the given script
         
@@ -123,131 +400,279 @@ class ScriptToVideo:
         script (str): The script text
         voice_gender (str): 'male' or 'female'
         language (str): 'en' or 'hi'
+        on_stage (callable): Called with 'voiced' and 'assets_ready' as those stages finish
+        on_event (callable): Called with (stage name, status) for every stage of the job graph
+        cancelled (threading.Event): Set it to stop the job before its next stage starts
+        preview_dir (str): Write sampled frames and a contact sheet here instead of rendering the video
         
         Returns:
-        str: Path to the created video
+        str: Path to the created video (or the contact sheet in preview mode)
         """
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_video = os.path.join(
-                self.folders['output'],
-                f"video_{timestamp}.mp4"
-            )
-            
-            self.logger.info("Starting video creation process...")
+            workspace, paths = self.start_job()
+            try:
+                # Steps 1-3: TTS, asset downloads, preprocessing and render run as a
+                # dependency graph so independent stages overlap
+                graph = self.build_job_graph(
+                    script, method, topic, voice_gender, language,
+                    paths['audio'], paths['subtitles'], paths['encoded_audio'], paths['output'], on_stage,
+                    on_event, cancelled, preview_dir, workspace, paths['words']
+                )
+                output_video = graph.run()['render']
+                self.logger.info(graph.report())
+                if not preview_dir:
+                    self.record_job(script, method, stage_seconds(graph.timings()))
+                if self.asset_index is not None:
+                    self.logger.info(self.asset_index.report())
+                self.logger.info(f"Fetch latency so far:\n{self.fetch_latency.report()}")
+            finally:
+                # Step 4: Cleanup temporary files, failed jobs' too, in the background so the next job can start
+                self.finish_job(workspace)
             
-            # Step 1: Generate audio from script
-            self.logger.info("Generating audio and subtitles from script...")
-            audio_path = os.path.join(
-                self.folders['audio'],
-                f"audio_{timestamp}.wav"
-            )
-            subtitles_path = os.path.join(
-                self.folders['subtitles'],
-                f"subtitles_{timestamp}.srt"
-            )
+            self.logger.info(f"Video created successfully: {output_video}")
+            return output_video
             
-            success, result = self.speech_generator.generate_speech(
-                script,
-                voice_gender=voice_gender,
-                output_path=audio_path,
-                subtitles_path=subtitles_path,
-                force_language=language
+        except Exception as e:
+            self.logger.error(f"Video creation failed in {traceback.extract_tb(e.__traceback__)[0]}:\n{str(e.__cause__)}") 
+            raise
+    
+    def start_job(self):
+        """
+        Create a job's workspace and mark the start of its video in the asset indexes
+        
+        Returns:
+        tuple: (Workspace, dict of the job's narration, caption, encoded audio and output paths)
+        """
+        # Every job gets its own folders, so jobs on one host never share files
+        workspace = Workspace(self.config['temp_folder'], new_job_id(), self.scratch_root).create()
+        job_id = workspace.job_id
+        self.logger.info(f"Starting video creation process in {workspace.root}...")
+        if self.hash_index is not None:
+            self.hash_index.begin_video(job_id)
+        if self.asset_index is not None:
+            self.asset_index.begin_video(job_id)
+        karaoke = self.config.get('caption_style', 'static') == 'karaoke'
+        paths = {
+            'audio': workspace.path('audio', f"audio_{job_id}.wav"),
+            'subtitles': workspace.path('subtitles', f"subtitles_{job_id}.srt"),
+            'words': workspace.path('subtitles', f"subtitles_{job_id}{WORDS_SUFFIX}") if karaoke else None,
+            # Read back only by the render, so it lives in scratch
+            'encoded_audio': workspace.path('scratch', f"audio_{job_id}.m4a"),
+            'output': os.path.join(self.folders['output'], f"video_{job_id}.mp4")
+        }
+        return workspace, paths
+    
+    def finish_job(self, workspace):
+        """Remove a job's temporary files, in the background so the next job can start"""
+        if not self.config.get('keep_temp_files', False):
+            self.logger.info(f"Cleaning up {workspace.root}...")
+            self.workspace_cleaner.remove(workspace)
+    
+    def prepare_video(self, script, method='image', topic='', voice_gender='male', language='en', on_stage=None,
+                      cancelled=None):
+        """
+        Run a job up to its render: narration, pre-encoded audio, asset fetches and preprocessing
+        
+        The batch runner prepares upcoming jobs this way while another job
+        renders (see prefetch.py). Parameters are those of create_video.
+        
+        Returns:
+        dict: The prepared job, for render_prepared or discard_prepared
+        """
+        try:
+            workspace, paths = self.start_job()
+            graph = self.build_job_graph(
+                script, method, topic, voice_gender, language,
+                paths['audio'], paths['subtitles'], paths['encoded_audio'], paths['output'], on_stage,
+                None, cancelled, None, workspace, paths['words'], include_render=False
             )
+            try:
+                results = graph.run()
+                if not results['assets']:
+                    raise Exception("No assets were downloaded successfully")
+            except Exception:
+                self.finish_job(workspace)
+                raise
+            self.logger.info(f"Prepared {workspace.root}: {graph.report()}")
+            return dict(paths, workspace=workspace, method=method, script=script,
+                        seconds=stage_seconds(graph.timings()))
+        
+        except Exception as e:
+            self.logger.error(f"Preparing the video failed in {traceback.extract_tb(e.__traceback__)[0]}:\n{str(e.__cause__)}")
+            raise
+    
+    def render_prepared(self, prepared):
+        """
+        Render a job prepared by prepare_video
+        
+        Returns:
+        str: Path to the created video
+        """
+        workspace = prepared['workspace']
+        output_video = prepared['output']
+        started = time.monotonic()
+        try:
+            self.logger.info("Finally creating video...")
+            self.stream_output(output_video, lambda: self.render_video(
+                prepared['method'], workspace, prepared['audio'], prepared['words'] or prepared['subtitles'],
+                output_video, prepared['encoded_audio']))
+        finally:
+            self.finish_job(workspace)
+        self.record_job(prepared['script'], prepared['method'],
+                        dict(prepared['seconds'], render=time.monotonic() - started))
+        self.logger.info(f"Video created successfully: {output_video}")
+        return output_video
+    
+    def discard_prepared(self, prepared):
+        """Drop a prepared job that will not be rendered here"""
+        self.finish_job(prepared['workspace'])
+    
+    def job_group(self, method):
+        """
+        Cost-model group of a job: its method and the render settings that change how long encoding takes
+        """
+        profile = 'segmented' if self.config.get('segmented_render', False) else 'single'
+        if self.render_farm is not None:
+            profile += '+farm'
+        if self.config.get('variable_frame_rate', False):
+            profile += '+vfr'
+        if self.progressive_output:
+            profile += '+fragmented'
+        return f"{method}/{profile}"
+    
+    def predict_job(self, script, method='video'):
+        """
+        Predicted seconds of a job's stages ('tts', 'assets', 'render') and in 'total'
+        
+        Returns:
+        dict: The prediction, or None before the cost model has any timings
+        """
+        if self.cost_model is None:
+            return None
+        return self.cost_model.predict(self.job_group(method),
+                                       job_features(script, self.config['video_resolution']))
+    
+    def record_job(self, script, method, seconds):
+        """Add a finished job's stage times to the cost model"""
+        if self.cost_model is None:
+            return
+        try:
+            self.cost_model.record(self.job_group(method), job_features(script, self.config['video_resolution']),
+                                   seconds)
+        except OSError as e:
+            self.logger.warning(f"Recording stage timings failed: {e}")
+
+    def create_variants(self, script, languages, method='image', topic='', voice_gender='male', language='en',
+                        on_event=None, cancelled=None):
+        """
+        Create one video per language from a single set of visuals
+        
+        The script is translated into each language and every narration is
+        synthesized concurrently, while the assets are fetched once for the
+        original script. The caption-free visuals are rendered once, timed to
+        the longest narration; each language then only gets its captions
+        burned in and its narration muxed, with the base stretched to fit.
+        
+        Parameters:
+        script (str): The script text
+        languages (list): Language codes to produce, e.g. ['en', 'hi', 'es']
+        language (str): Language the script is written in
+        on_event (callable): Called with (stage name, status) for every stage of the job graph
+        cancelled (threading.Event): Set it to stop the job before its next stage starts
+        
+        Returns:
+        dict: Language -> path of its video
+        """
+        workspace = None
+        try:
+            # The single-narration paths go unused: every language gets its own below
+            workspace, _ = self.start_job()
+            job_id = workspace.job_id
+            resolution = self.config['video_resolution']
+            karaoke = self.config.get('caption_style', 'static') == 'karaoke'
+            self.logger.info(f"Creating {', '.join(languages)} variants...")
             
-            if not success:
-                raise Exception(f"Audio generation failed: {result}")
-            
-            # Step 2: Extract keywords and download images
-            words = script.split()
-            total_words = len(words)
-            
-            # Calculate the number of keywords
-            full_keywords_count = total_words // 10
-            remaining_words_count = total_words % 10
-            
-            # Initialize an empty list to store the keywords
-            keywords = []
-            
-            # Generate keywords for every 10 words
-            for i in range(full_keywords_count):
-                keyword = ' '.join(words[i * 10:(i + 1) * 10])
-                keywords.append(keyword)
-            
-            # Generate a keyword for remaining words if any
-            if remaining_words_count > 0:
-                keyword = ' '.join(words[full_keywords_count * 10:])
-                keywords.append(keyword)
-            
-            self.logger.info(keywords)
-                      
-                           
-            images_needed = len(keywords)
-            
-            if method=='image':
-                # Download images
-              #
-                # if download_results['successful_downloads'] == 0:
-                #     raise Exception("No images were downloaded successfully")
+            graph = StageGraph(max_workers=self.config.get('stage_workers', 8), on_event=on_event,
+                               cancelled=cancelled)
+            narrations = {}
+            for lang in languages:
+                narrations[lang] = {
+                    'audio': workspace.path('audio', f"audio_{job_id}_{lang}.wav"),
+                    'subtitles': workspace.path('subtitles', f"subtitles_{job_id}_{lang}.srt"),
+                    'words': workspace.path('subtitles', f"subtitles_{job_id}_{lang}{WORDS_SUFFIX}") if karaoke else None,
+                    'output': os.path.join(self.folders['output'], f"video_{job_id}_{lang}.mp4")
+                }
             
-                # Step 3: Create video
-                self.logger.info("Finally creating video...")
-                
-                self.video_creator.create_image_video(
-                    image_folder=self.folders['images'],
-                    audio_path=audio_path,
-                    subtitles_path=subtitles_path,
-                    output_path=output_video,
-                    transition_duration=self.config['transition_duration'],
-                    resolution=self.config['video_resolution']
-                )
-            elif method=='video':
-                # Download pexel videoClips
-                download_results = self.video_downloader.download_videos(keywords) 
-                # Step 3: Create video
-                self.logger.info("Finally creating video...")
-                self.video_creator.create_clip_video(
-                    video_folder=self.folders['videos'],
-                    audio_path=audio_path,
-                    subtitles_path=subtitles_path,
-                    output_path=output_video,
-                    transition_duration=self.config['transition_duration'],
-                    target_resolution=self.config['video_resolution']
-                )
-
-            else :
-                #Download AI Image
-                self.image_downloader.create_images(keywords , topic)
-
-
-                # Step 3: Create video
-                self.logger.info("Finally creating video...")
-                
-                self.video_creator.create_image_video(
-                    image_folder=self.folders['images'],
-                    audio_path=audio_path,
-                    subtitles_path=subtitles_path,
-                    output_path=output_video,
-                    transition_duration=self.config['transition_duration'],
-                    resolution=self.config['video_resolution']
-                ) 
-
+            def translate(lang):
+                def stage(inputs):
+                    return script if lang == language else self.translator.translate(script, lang)
+                return stage
             
+            def tts(lang):
+                def stage(inputs):
+                    paths = narrations[lang]
+                    success, result = self.speech_generator.generate_speech(
+                        inputs[f"translate_{lang}"],
+                        voice_gender=voice_gender,
+                        output_path=paths['audio'],
+                        subtitles_path=paths['subtitles'],
+                        force_language=lang,
+                        words_path=paths['words'],
+                        voice=voice_for(lang, voice_gender)
+                    )
+                    if not success:
+                        raise Exception(f"Audio generation failed for '{lang}': {result}")
+                    audio = AudioFileClip(paths['audio'])
+                    duration = audio.duration
+                    audio.close()
+                    return duration
+                return stage
             
+            def base(inputs):
+                if not inputs['assets']:
+                    raise Exception("No assets were downloaded successfully")
+                # The visuals follow the longest narration, so no variant runs out of them
+                longest = max(languages, key=lambda lang: inputs[f"tts_{lang}"])
+                base_path = workspace.path('scratch', f"base_{job_id}.mp4")
+                self.logger.info(f"Rendering caption-free visuals once, timed to the '{longest}' narration...")
+                self.render_video(method, workspace, narrations[longest]['audio'], None, base_path)
+                return base_path, inputs[f"tts_{longest}"]
             
+            def variant(lang):
+                def stage(inputs):
+                    base_path, base_duration = inputs['base']
+                    paths = narrations[lang]
+                    self.stream_output(paths['output'], lambda: self.video_creator.create_variant(
+                        base_path, base_duration, paths['audio'], paths['words'] or paths['subtitles'],
+                        paths['output'], resolution, workspace=workspace
+                    ))
+                    return paths['output']
+                return stage
             
-            # Step 4: Cleanup temporary files
-            if not self.config.get('keep_temp_files', False):
-                self.logger.info("Cleaning up temporary files...")
-                shutil.rmtree(self.folders['temp'])
-                self.setup_workspace()
+            graph.add('keywords', self.keywords_stage(graph, script, method, topic, resolution, workspace))
+            for lang in languages:
+                graph.add(f"translate_{lang}", translate(lang))
+                graph.add(f"tts_{lang}", tts(lang), deps=[f"translate_{lang}"])
+            graph.add('base', base, deps=[f"tts_{lang}" for lang in languages] + ['assets'])
+            for lang in languages:
+                graph.add(f"variant_{lang}", variant(lang), deps=['base'])
+            results = graph.run()
+            self.logger.info(graph.report())
+            if self.asset_index is not None:
+                self.logger.info(self.asset_index.report())
+            self.logger.info(f"Fetch latency so far:\n{self.fetch_latency.report()}")
             
-            self.logger.info(f"Video created successfully: {output_video}")
-            return output_video
+            outputs = {lang: results[f"variant_{lang}"] for lang in languages}
+            self.logger.info(f"Variants created successfully: {outputs}")
+            return outputs
             
         except Exception as e:
-            self.logger.error(f"Video creation failed in {traceback.extract_tb(e.__traceback__)[0]}:\n{str(e.__cause__)}") 
+            self.logger.error(f"Variant creation failed in {traceback.extract_tb(e.__traceback__)[0]}:\n{str(e.__cause__)}")
             raise
+        finally:
+            # Failed variants' files too, in the background so the next job can start
+            if workspace is not None:
+                self.finish_job(workspace)
 
 def main():
     parser = argparse.ArgumentParser(description='Create video from script')
@@ -260,6 +685,10 @@ def main():
                       help='Script language')
     parser.add_argument('--config', type=str, default='config.json',
                       help='Path to configuration file')
+    parser.add_argument('--preview', type=str, default=None,
+                      help='Write a QA contact sheet of sampled frames to this folder instead of rendering')
+    parser.add_argument('--variants', type=str, default=None,
+                      help='Comma-separated languages (e.g. en,hi,es): one video per language sharing one visual render')
     
     args = parser.parse_args()
     
@@ -274,13 +703,28 @@ def main():
         else:
             script = args.script
         
+        if args.variants:
+            outputs = creator.create_variants(
+                script,
+                [lang.strip() for lang in args.variants.split(',') if lang.strip()],
+                method=args.method,
+                topic=args.topic,
+                voice_gender=args.voice,
+                language=args.language
+            )
+            print(f"\nVariants created successfully!")
+            for lang, output_video in outputs.items():
+                print(f"{lang}: {output_video}")
+            return
+        
         # Create video
         output_video = creator.create_video(
             script,
             method=args.method,
             topic=args.topic,
             voice_gender=args.voice,
-            language=args.language
+            language=args.language,
+            preview_dir=args.preview
         )
         
         print(f"\nVideo created successfully!")
@@ -0,0 +1,228 @@
+"""
+Perceptual-hash index used by the downloaders to reject near-duplicate and
+low-detail assets before they reach the renderer.
+
+Images are hashed with dHash and pHash on a downscaled grayscale copy. MP4
+clips get a signature made of the hashes of their first and middle frames.
+"""
+import contextlib
+import os
+import threading
+import time
+import numpy as np
+from PIL import Image
+from shared_file import locked, read_json, version, write_json
+
+HASH_SIZE = 8
+PHASH_SIZE = 32
+DETAIL_SIZE = 64
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II basis, so a 2D DCT is two matrix products."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+_DCT = _dct_matrix(PHASH_SIZE)
+_BIT_WEIGHTS = (1 << np.arange(HASH_SIZE * HASH_SIZE, dtype=np.uint64)).astype(np.uint64)
+
+
+def _pack_bits(bits):
+    return int(np.bitwise_or.reduce(_BIT_WEIGHTS[bits.ravel()]))
+
+
+def to_gray(image, size):
+    """Downscale a PIL image or RGB array to a float32 grayscale array of size (w, h)"""
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(np.asarray(image, dtype=np.uint8))
+    return np.asarray(image.convert('L').resize(size, Image.BILINEAR), dtype=np.float32)
+
+
+def dhash(image):
+    """Difference hash: sign of horizontal gradients on a 9x8 thumbnail"""
+    gray = to_gray(image, (HASH_SIZE + 1, HASH_SIZE))
+    return _pack_bits(gray[:, 1:] > gray[:, :-1])
+
+
+def phash(image):
+    """DCT hash: low-frequency 8x8 DCT coefficients above their median"""
+    gray = to_gray(image, (PHASH_SIZE, PHASH_SIZE))
+    coefficients = (_DCT @ gray @ _DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    median = np.median(coefficients.ravel()[1:])  # ignore the DC term
+    return _pack_bits(coefficients > median)
+
+
+def detail_score(image):
+    """
+    Cheap measure of how much is going on in an image.
+
+    Variance of intensities on a 64x64 thumbnail plus mean gradient energy;
+    blank, flat or heavily blurred images score close to zero.
+    """
+    gray = to_gray(image, (DETAIL_SIZE, DETAIL_SIZE))
+    gradient = np.abs(np.diff(gray, axis=0)).mean() + np.abs(np.diff(gray, axis=1)).mean()
+    return float(gray.var() + gradient * gradient)
+
+
+def hamming(a, b):
+    """Vectorized Hamming distance between one hash and an array of hashes"""
+    xor = np.bitwise_xor(np.asarray(b, dtype=np.uint64), np.uint64(a))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def video_frames(path, size=(DETAIL_SIZE, DETAIL_SIZE)):
+    """First and middle frames of a clip, decoded at a small resolution"""
+    from moviepy import VideoFileClip
+    clip = VideoFileClip(path, audio=False, target_resolution=(size[1], size[0]))
+    try:
+        return [clip.get_frame(0), clip.get_frame(clip.duration / 2.0)]
+    finally:
+        clip.close()
+
+
+class AssetHashIndex:
+    """
+    Remembers perceptual hashes of accepted assets across a video and a batch.
+
+    Call begin_video() when a new video starts, then check_asset() for every
+    downloaded file. Accepted assets are added to the index; the index is
+    saved to index_path so later jobs in the batch see earlier assets.
+
+    Every job on the host shares index_path (see shared_file.py): each check
+    sees the assets other jobs accepted up to that moment. An accepted asset
+    blocks its duplicates for retention seconds, after which it is dropped.
+    """
+
+    def __init__(self, index_path=None, max_distance=10, min_detail=60.0, retention=None):
+        """
+        Args:
+            index_path: JSON file to persist hashes in, or None for memory only.
+            max_distance: Hamming distance (of 64 bits) at or below which two
+                assets count as near-duplicates.
+            min_detail: Images with a detail_score below this are rejected.
+            retention: Seconds an accepted asset is remembered (None for as
+                long as index_path is kept).
+        """
+        self.index_path = index_path
+        self.max_distance = max_distance
+        self.min_detail = min_detail
+        self.retention = retention
+        self.video_id = None
+        self.entries = []
+        self._version = None
+        self._lock = threading.Lock()
+        self._rebuild()
+        with self._shared():
+            self._refresh()
+
+    def _shared(self):
+        return locked(self.index_path) if self.index_path else contextlib.nullcontext()
+
+    def _refresh(self):
+        """Reload the entries if another job rewrote index_path; callers hold its lock"""
+        if not self.index_path or version(self.index_path) == self._version:
+            return
+        entries = read_json(self.index_path, [])
+        now = time.time()
+        for entry in entries:
+            # Entries from before retention existed count from now
+            entry.setdefault('added_at', now)
+        self.entries = [entry for entry in entries
+                        if self.retention is None or entry['added_at'] >= now - self.retention]
+        self._version = version(self.index_path)
+        self._rebuild()
+
+    def _rebuild(self):
+        # Per-frame hash arrays; a video entry contributes several frames
+        self._owners = []
+        dhashes, phashes = [], []
+        for position, entry in enumerate(self.entries):
+            for frame_dhash, frame_phash in entry['frames']:
+                self._owners.append(position)
+                dhashes.append(frame_dhash)
+                phashes.append(frame_phash)
+        self._dhashes = np.array(dhashes, dtype=np.uint64)
+        self._phashes = np.array(phashes, dtype=np.uint64)
+
+    def begin_video(self, video_id):
+        """Mark the start of a new video so duplicates can be attributed"""
+        self.video_id = video_id
+
+    def signature(self, path):
+        """
+        Hash an asset file.
+
+        Returns:
+            tuple: (list of (dhash, phash) per frame, lowest detail score)
+        """
+        if path.lower().endswith('.mp4'):
+            frames = video_frames(path)
+        else:
+            with Image.open(path) as img:
+                frames = [img.convert('RGB')]
+        hashes = [(dhash(frame), phash(frame)) for frame in frames]
+        return hashes, min(detail_score(frame) for frame in frames)
+
+    def find_duplicate(self, hashes):
+        """Return the entry that matches every frame of hashes, if any"""
+        if not len(self._owners):
+            return None
+        matches = None
+        for frame_dhash, frame_phash in hashes:
+            close = ((hamming(frame_dhash, self._dhashes) <= self.max_distance) &
+                     (hamming(frame_phash, self._phashes) <= self.max_distance))
+            owners = {self._owners[i] for i in np.flatnonzero(close)}
+            matches = owners if matches is None else matches & owners
+            if not matches:
+                return None
+        return self.entries[min(matches)]
+
+    def check_asset(self, path, add=True):
+        """
+        Decide whether a downloaded asset may be used.
+
+        Args:
+            path: Image or MP4 file.
+            add: Record the asset in the index when it is accepted.
+
+        Returns:
+            tuple: (accepted (bool), reason (str))
+        """
+        try:
+            hashes, detail = self.signature(path)
+        except Exception as e:
+            return False, f"could not decode asset: {e}"
+        if detail < self.min_detail:
+            return False, f"low detail (score {detail:.1f} < {self.min_detail})"
+        # Checked and added under the file's lock, so two jobs never both accept the same asset
+        with self._lock, self._shared():
+            self._refresh()
+            return self._check_and_add(path, hashes, add)
+
+    def _check_and_add(self, path, hashes, add):
+        duplicate = self.find_duplicate(hashes)
+        if duplicate is not None:
+            where = 'this video' if duplicate['video_id'] == self.video_id else f"video {duplicate['video_id']}"
+            return False, f"near-duplicate of {duplicate['asset']} from {where}"
+        if add:
+            self.entries.append({
+                'asset': os.path.basename(path),
+                'video_id': self.video_id,
+                'frames': [list(pair) for pair in hashes],
+                'added_at': time.time(),
+            })
+            position = len(self.entries) - 1
+            self._owners.extend([position] * len(hashes))
+            self._dhashes = np.append(self._dhashes, np.array([h[0] for h in hashes], dtype=np.uint64))
+            self._phashes = np.append(self._phashes, np.array([h[1] for h in hashes], dtype=np.uint64))
+            self.save()
+        return True, 'accepted'
+
+    def save(self):
+        # Callers hold the lock of index_path and have refreshed the entries
+        if not self.index_path:
+            return
+        self._version = write_json(self.index_path, self.entries)
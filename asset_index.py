@@ -0,0 +1,209 @@
+"""
+Similar-query asset reuse across jobs.
+
+Every asset a downloader accepts is kept in a library folder together with
+the query that found it and any tags the source attached. Before going to
+the network, a downloader asks the index for an asset whose query is similar
+enough to its own: "sunrise over an old temple" can reuse the image fetched
+for "ancient temple at sunrise" by an earlier job in the batch.
+
+Similarity is the cosine of TF-IDF weighted character n-grams of the query
+words, which tolerates word order, plurals and small spelling differences
+without any external service. An asset is never used twice in one video.
+
+Every job on the host shares the library: index.json is only changed under
+its lock, after reloading what other jobs wrote (see shared_file.py).
+"""
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+import uuid
+from collections import Counter, defaultdict
+from shared_file import locked, read_json, version, write_json
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZES = (3, 4)
+# Words that say nothing about what an asset shows
+STOP_WORDS = {
+    'a', 'an', 'the', 'and', 'or', 'of', 'at', 'in', 'on', 'over', 'under', 'with', 'to', 'for', 'from', 'by',
+    'is', 'are', 'its', 'it', 'this', 'that', 'hd', 'vertical', 'image', 'images', 'video', 'photo',
+}
+
+
+def query_terms(text):
+    return [word for word in re.findall(r'\w+', text.lower()) if word not in STOP_WORDS]
+
+
+def char_ngrams(text, sizes=NGRAM_SIZES):
+    """Counts of the character n-grams of each word, padded so word starts and ends count"""
+    counts = Counter()
+    for word in query_terms(text):
+        padded = f" {word} "
+        for size in sizes:
+            for start in range(len(padded) - size + 1):
+                counts[padded[start:start + size]] += 1
+    return counts
+
+
+class AssetReuseIndex:
+    """
+    Library of fetched assets searchable by the similarity of their queries.
+
+    Call begin_video() when a new video starts, find() before fetching an
+    asset and add() once a fetched asset is accepted.
+
+    Example:
+        index = AssetReuseIndex('asset_library', threshold=0.6)
+        index.begin_video(job_id)
+        path = index.find('sunrise over an old temple', 'image', destination)
+        if path is None:
+            ...  # fetch, then
+            index.add(destination, 'sunrise over an old temple', 'image')
+    """
+
+    def __init__(self, library_dir, threshold=0.6):
+        """
+        Args:
+            library_dir: Folder holding the kept assets and index.json.
+            threshold: Cosine similarity (0-1) a query needs to reuse an asset.
+        """
+        self.library_dir = library_dir
+        self.index_path = os.path.join(library_dir, 'index.json')
+        self.threshold = threshold
+        self.video_id = None
+        self.entries = []
+        self.stats = {'hits': 0, 'misses': 0, 'added': 0}
+        self._version = None
+        self._lock = threading.Lock()
+        os.makedirs(library_dir, exist_ok=True)
+        self._rebuild()
+        with locked(self.index_path):
+            self._refresh()
+
+    def _refresh(self):
+        """Reload the entries if another job rewrote index.json; callers hold its lock"""
+        if version(self.index_path) == self._version:
+            return
+        self.entries = read_json(self.index_path, [])
+        self._version = version(self.index_path)
+        self._rebuild()
+
+    def _rebuild(self):
+        # Inverted index of n-gram -> entries, and document frequencies for the IDF weights
+        self._vectors = []
+        self._postings = defaultdict(set)
+        self._document_frequency = Counter()
+        for entry in self.entries:
+            self._index(entry)
+
+    def _index(self, entry):
+        position = len(self._vectors)
+        vectors = [char_ngrams(text) for text in [entry['query']] + [' '.join(entry['tags'])] if text]
+        self._vectors.append(vectors)
+        for ngram in set().union(*vectors):
+            self._postings[ngram].add(position)
+            self._document_frequency[ngram] += 1
+
+    def _weights(self, counts):
+        total = len(self._vectors) + 1
+        weights = {ngram: count * (math.log(total / (1 + self._document_frequency[ngram])) + 1)
+                   for ngram, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        return {ngram: weight / norm for ngram, weight in weights.items()} if norm else {}
+
+    def _cosine(self, query_weights, counts):
+        weights = self._weights(counts)
+        return sum(weight * weights.get(ngram, 0.0) for ngram, weight in query_weights.items())
+
+    def begin_video(self, video_id):
+        """Mark the start of a new video; assets are reused at most once per video"""
+        self.video_id = video_id
+
+    def search(self, query, kind=None, threshold=None):
+        """
+        Entries similar to query, best first.
+
+        Returns:
+            list: (similarity, entry) pairs at or above threshold (the index's when None)
+        """
+        threshold = self.threshold if threshold is None else threshold
+        query_weights = self._weights(char_ngrams(query))
+        candidates = set()
+        for ngram in query_weights:
+            candidates |= self._postings.get(ngram, set())
+        matches = []
+        for position in candidates:
+            entry = self.entries[position]
+            if kind is not None and entry['kind'] != kind:
+                continue
+            score = max(self._cosine(query_weights, counts) for counts in self._vectors[position])
+            if score >= threshold:
+                matches.append((score, entry))
+        matches.sort(key=lambda match: match[0], reverse=True)
+        return matches
+
+    def find(self, query, kind, destination, threshold=None):
+        """
+        Place the best unused match for query at destination.
+
+        Args:
+            query: The search query or prompt the asset is for.
+            kind: 'image' or 'video'.
+            destination: Path the asset is copied to.
+            threshold: Similarity required instead of the index's own, e.g. a
+                low one when the fetch has failed and anything related will do.
+
+        Returns:
+            str: destination, or None when nothing similar enough is left for this video
+        """
+        with self._lock, locked(self.index_path):
+            self._refresh()
+            for score, entry in self.search(query, kind, threshold):
+                if self.video_id in entry['video_ids']:
+                    continue
+                source = os.path.join(self.library_dir, entry['asset'])
+                if not os.path.exists(source):
+                    continue
+                entry['video_ids'].append(self.video_id)
+                self.stats['hits'] += 1
+                self.save()
+                break
+            else:
+                self.stats['misses'] += 1
+                return None
+        # Copies, not links: downloaders overwrite their files in place
+        shutil.copyfile(source, destination)
+        logger.info(f"Reusing {entry['asset']} (fetched for '{entry['query']}', similarity {score:.2f}) for '{query}'")
+        return destination
+
+    def add(self, path, query, kind, tags=()):
+        """Keep an accepted asset in the library under its query and tags"""
+        asset = f"{uuid.uuid4().hex}{os.path.splitext(path)[1].lower()}"
+        shutil.copyfile(path, os.path.join(self.library_dir, asset))
+        entry = {'asset': asset, 'kind': kind, 'query': query, 'tags': list(tags), 'video_ids': [self.video_id]}
+        with self._lock, locked(self.index_path):
+            self._refresh()
+            self.entries.append(entry)
+            self._index(entry)
+            self.stats['added'] += 1
+            self.save()
+        return entry
+
+    def hit_rate(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def report(self):
+        """One-line summary of reuse for logs"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return (f"Asset reuse: {self.stats['hits']}/{lookups} lookups served from the library "
+                f"({self.hit_rate():.0%}), {self.stats['added']} assets added, {len(self.entries)} in total")
+
+    def save(self):
+        # Callers hold the lock of index.json and have refreshed the entries
+        self._version = write_json(self.index_path, self.entries, ensure_ascii=False)
+
@@ -1,35 +1,281 @@
-import pandas as pd
-import subprocess
+import time
+import argparse
+import multiprocessing
+from datetime import datetime
+from cost_model import ORDERS, order_jobs, queue_etas
+from job_store import JobStore, RENDERED, SCRIPTED, default_worker_id
+from prefetch import JobPrefetcher
+from resource_scheduler import GIB, ResourceScheduler, apply_thread_limits
 
+MIB = 1 << 20
+DEFAULT_PREFETCH = {'lookahead': 1, 'max_mb': None, 'min_free_disk_mb': 1024, 'min_free_memory_mb': 1024}
 
-# Load the Excel file
-excel_file = 'viral_scripts.xlsx'
-df = pd.read_excel(excel_file)
 
-# Ensure the DataFrame has a column Script
-if 'Script' not in df.columns:
-    print("Column Script not found in the Excel file.")
-else:
-    # Iterate over each row and write the content of column B to a text file
+def import_excel(store, excel_file):
+    """Load scripts from a legacy viral_scripts.xlsx into the job store"""
+    import pandas as pd
+    df = pd.read_excel(excel_file)
+
+    # Ensure the DataFrame has a column Script
+    if 'Script' not in df.columns:
+        print("Column Script not found in the Excel file.")
+        return 0
     for index, row in df.iterrows():
-        content = row['Script']
-        file_name = f'prompt_{index + 1:02d}.txt'
-        with open(file_name, 'w') as file:
-            file.write(content)
-        print(f"Saved {file_name}")
-        command = f"python3.11 app.py --script {file_name} --method video"
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True)
-    
-        while True:
-            output = process.stdout.readline()
-            if output == b'' and process.poll() is not None:
+        topic = row['Topic'] if 'Topic' in df.columns else f"prompt_{index + 1:02d}"
+        store.add_script(str(topic), row['Script'])
+        # An optional Deadline column sets when each video is due, for --order deadline
+        if 'Deadline' in df.columns and not pd.isna(row['Deadline']):
+            store.set_deadline(str(topic), pd.Timestamp(row['Deadline']).timestamp())
+    return len(df)
+
+
+def predicted_seconds(creator, method):
+    """Function of a job returning its predicted total seconds, or None while the cost model knows nothing"""
+    def predict(job):
+        prediction = creator.predict_job(job['script'], method)
+        return prediction['total'] if prediction else None
+    return predict
+
+
+def claim_order(creator, method, order):
+    """order argument of JobStore.claim for an --order policy (None keeps the store's oldest-first)"""
+    if order == 'fifo':
+        return None
+    predict = predicted_seconds(creator, method)
+    return lambda jobs: order_jobs(jobs, order, predict)
+
+
+def print_queue(store, creator, method, order, workers):
+    """Print the scripted jobs in the order they would start, with predicted times and ETAs"""
+    predict = predicted_seconds(creator, method)
+    jobs = order_jobs([job for job in store.jobs(SCRIPTED) if job['claimed_by'] is None], order, predict)
+    etas = queue_etas(jobs, predict, workers)
+    print(creator.cost_model.report() if creator.cost_model else "Cost model disabled")
+    for job in jobs:
+        seconds, eta = predict(job), etas[job['id']]
+        line = f"{job['id']:>5}  {job['topic'][:40]:<40}  "
+        line += f"{seconds:7.0f}s  ETA {datetime.fromtimestamp(eta):%Y-%m-%d %H:%M}" if eta else "   unknown"
+        if job['deadline']:
+            line += f"  due {datetime.fromtimestamp(job['deadline']):%Y-%m-%d %H:%M}"
+            if eta and eta > job['deadline']:
+                line += "  LATE"
+        print(line)
+
+
+def render_worker(store_path, method, voice, language, config, idle_timeout, poll_interval, scheduler=None,
+                  lookahead=None, order='fifo'):
+    """
+    Claim scripted jobs and render them until no work arrives for idle_timeout seconds.
+
+    ScriptToVideo is created once per worker, so components stay loaded
+    between jobs. With a ResourceScheduler shared by the workers, a worker
+    only claims a job once it has a slot, and renders it with the slot's
+    thread counts. With a lookahead (the config's prefetch settings unless
+    given), the next jobs' narration and assets are prepared while the
+    current job renders; see prefetch.py. order picks the next job: 'fifo',
+    'shortest' (shortest predicted first) or 'deadline' (see cost_model.py).
+    """
+    from app import ScriptToVideo
+    store = JobStore(store_path)
+    creator = ScriptToVideo(config)
+    worker = default_worker_id()
+    order = claim_order(creator, method, order)
+    # null in config disables prefetching
+    prefetch = dict(DEFAULT_PREFETCH, **(creator.config.get('prefetch', {}) or {'lookahead': 0}))
+    if lookahead is not None:
+        prefetch['lookahead'] = lookahead
+    if prefetch.get('lookahead', 0) > 0:
+        prefetch_worker(store, creator, worker, method, voice, language, idle_timeout, poll_interval, scheduler,
+                        prefetch, order)
+        finish_worker(store, creator)
+        return
+    idle_since = time.time()
+
+    while True:
+        plan = scheduler.acquire() if scheduler is not None else None
+        job = store.claim(worker, order=order)
+        if job is None:
+            if plan is not None:
+                scheduler.release(plan, record=False)
+            if time.time() - idle_since >= idle_timeout:
                 break
-            if output:
-                print(output.decode().strip())
+            time.sleep(poll_interval)
+            continue
+
+        print(f"[{worker}] Rendering job {job['id']}: {job['topic']}")
+        rendered = False
+        if plan is not None:
+            apply_thread_limits(plan, creator.video_creator)
+        try:
+            output = creator.create_video(
+                job['script'],
+                method=method,
+                topic=job['topic'],
+                voice_gender=voice,
+                language=language,
+                on_stage=lambda stage: store.advance(job['id'], stage, worker=worker)
+            )
+            store.advance(job['id'], RENDERED, output=output, worker=worker)
+            print(f"[{worker}] Job {job['id']} rendered: {output}")
+            rendered = True
+        except Exception as e:
+            store.fail(job['id'], str(e), worker=worker)
+            print(f"[{worker}] Job {job['id']} failed: {e}")
+        finally:
+            if plan is not None:
+                # Failed jobs say nothing about how fast this concurrency renders
+                scheduler.release(plan, record=rendered)
+                print(f"[{worker}] {scheduler.report()}")
+        idle_since = time.time()
+    finish_worker(store, creator)
+
+
+def finish_worker(store, creator):
+    """Close a worker's store once its last job's workspace is gone"""
+    # Worker processes exit without running exit handlers, so the cleaner is drained here
+    creator.workspace_cleaner.drain()
+    store.close()
+
+
+def prefetch_worker(store, creator, worker, method, voice, language, idle_timeout, poll_interval, scheduler,
+                    prefetch, order=None):
+    """Render loop of render_worker that takes jobs from a JobPrefetcher"""
+    def megabytes(key):
+        return prefetch[key] * MIB if prefetch.get(key) is not None else None
+
+    def prepare(job):
+        print(f"[{worker}] Preparing job {job['id']}: {job['topic']}")
+        return creator.prepare_video(
+            job['script'],
+            method=method,
+            topic=job['topic'],
+            voice_gender=voice,
+            language=language,
+            on_stage=lambda stage: store.advance(job['id'], stage, worker=worker),
+            cancelled=prefetcher.stopping
+        )
+
+    prefetcher = JobPrefetcher(
+        lambda: store.claim(worker, order=order), prepare,
+        lookahead=prefetch['lookahead'],
+        measure=lambda prepared: prepared['workspace'].size(),
+        max_bytes=megabytes('max_mb'),
+        min_free_disk=megabytes('min_free_disk_mb') or 0,
+        min_free_memory=megabytes('min_free_memory_mb') or 0,
+        disk_path=creator.config['temp_folder'],
+        poll_interval=poll_interval
+    )
+    # Started only once assigned, since prepare refers to it
+    prefetcher.start()
+    idle_since = time.time()
+    try:
+        while True:
+            item = prefetcher.get(timeout=poll_interval)
+            if item is None:
+                if prefetcher.idle and time.time() - idle_since >= idle_timeout:
+                    break
+                continue
+            job, prepared, error = item
+            if error is not None:
+                store.fail(job['id'], str(error), worker=worker)
+                print(f"[{worker}] Job {job['id']} failed: {error}")
+                idle_since = time.time()
+                continue
+
+            plan = scheduler.acquire() if scheduler is not None else None
+            print(f"[{worker}] Rendering job {job['id']}: {job['topic']}")
+            rendered = False
+            if plan is not None:
+                apply_thread_limits(plan, creator.video_creator)
+            try:
+                output = creator.render_prepared(prepared)
+                store.advance(job['id'], RENDERED, output=output, worker=worker)
+                print(f"[{worker}] Job {job['id']} rendered: {output}")
+                rendered = True
+            except Exception as e:
+                store.fail(job['id'], str(e), worker=worker)
+                print(f"[{worker}] Job {job['id']} failed: {e}")
+            finally:
+                if plan is not None:
+                    scheduler.release(plan, record=rendered)
+                    print(f"[{worker}] {scheduler.report()}")
+            idle_since = time.time()
+    finally:
+        # Jobs prepared but never rendered go back to the queue for any worker
+        for job, prepared, error in prefetcher.stop():
+            if prepared is not None:
+                creator.discard_prepared(prepared)
+            store.release(job['id'], 'prefetched, not rendered', worker=worker)
+        print(f"[{worker}] {prefetcher.report()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render videos for scripted jobs as they become available')
+    parser.add_argument('--store', default='jobs.db', help='Job store written by topics_to_scripts.py')
+    parser.add_argument('--excel', default='', help='Import scripts from a legacy Excel file first')
+    parser.add_argument('--workers', type=lambda value: value if value == 'auto' else int(value), default=1,
+                        help="Number of concurrent render workers, or 'auto' to fit jobs and their threads to "
+                             "the host's cores and memory and tune their number by measured throughput")
+    parser.add_argument('--job-memory', type=float, default=1.5, help="GiB one job needs, for --workers auto")
+    parser.add_argument('--method', choices=['video', 'image', 'AIimage'], default='video', help='video/image for video creation')
+    parser.add_argument('--voice', choices=['male', 'female'], default='male', help='Voice gender for text-to-speech')
+    parser.add_argument('--language', choices=['en', 'hi'], default='en', help='Script language')
+    parser.add_argument('--config', default='config.json', help='Path to configuration file')
+    parser.add_argument('--idle-timeout', type=float, default=0,
+                        help='Keep waiting this many seconds for new scripts (e.g. while topics_to_scripts.py runs)')
+    parser.add_argument('--poll-interval', type=float, default=2, help='Seconds between checks for new jobs')
+    parser.add_argument('--lookahead', type=int, default=None,
+                        help="Jobs to prepare (narration, assets) while the current one renders; "
+                             "defaults to the config's prefetch.lookahead, 0 disables")
+    parser.add_argument('--order', choices=ORDERS, default='fifo',
+                        help="Which job to start next: oldest first, shortest predicted first, or least slack "
+                             "before its deadline first (then shortest)")
+    parser.add_argument('--deadline', action='append', default=[], metavar='TOPIC=WHEN',
+                        help="Set when a topic's video is due, e.g. 'Black holes=2026-11-01T18:00' (repeatable)")
+    parser.add_argument('--eta', action='store_true',
+                        help='Print the queue in start order with predicted times and ETAs, and exit')
+    parser.add_argument('--lease', type=float, default=3600, help='Release jobs whose worker went silent this long ago')
+    args = parser.parse_args()
+
+    store = JobStore(args.store)
+    if args.excel:
+        print(f"Imported {import_excel(store, args.excel)} scripts from {args.excel}")
+    for entry in args.deadline:
+        topic, _, when = entry.rpartition('=')
+        if not store.set_deadline(topic, datetime.fromisoformat(when).timestamp()):
+            print(f"No job for topic '{topic}', deadline ignored")
+    released = store.reclaim_stale(args.lease)
+    if released:
+        print(f"Released {released} jobs from workers that went silent")
+
+    worker_args = (args.store, args.method, args.voice, args.language, args.config,
+                   args.idle_timeout, args.poll_interval)
+    worker_kwargs = {'lookahead': args.lookahead, 'order': args.order}
+    workers = args.workers
+    if workers == 'auto':
+        scheduler = ResourceScheduler(job_memory=args.job_memory * GIB)
+        print(scheduler.report())
+        # One process per possible slot; the scheduler decides how many render at once
+        worker_kwargs['scheduler'] = scheduler
+        workers = scheduler.max_jobs
+    if args.eta:
+        from app import ScriptToVideo
+        print_queue(store, ScriptToVideo(args.config), args.method, args.order,
+                    scheduler.level if args.workers == 'auto' else workers)
+        return
+    if workers == 1:
+        render_worker(*worker_args, **worker_kwargs)
+    else:
+        processes = [multiprocessing.Process(target=render_worker, args=worker_args, kwargs=worker_kwargs)
+                     for _ in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+    print(f"Job states: {store.counts()}")
+    print("Process completed.")
 
-        
-        rc = process.poll()
-        #return rc # Removed return statement from the loop.
 
-print("Process completed.")
-print("Process completed.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Benchmarks for pipeline stages.
+
+    python benchmarks.py keywords --scripts viral_scripts.jsonl --batch-sizes 1 16 64
+    python benchmarks.py fetch --jobs 20 --method image --latency 0.2 --jitter 0.3 --error-rate 0.05
+    python benchmarks.py captions --frames 300
+    python benchmarks.py frames --scenes 4 --fps 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from image_downloader import ImageDownloader, sniff_image_size
+from karaoke import group_words
+from keyword_extractor import KeywordExtractor, chunk_script, load_model
+from stub_services import Faults, STUB_SCRIPT, StubServer, tts_command
+from text_to_speech import TextToSpeechGenerator
+from topics_to_scripts import AsyncGroqClient, build_script_payload, load_completed, OUTPUT_JSONL
+from video_downloader import VideoDownloader
+from workspace import Workspace
+
+SAMPLE_SCRIPT = ("Did you know the Great Wall of China is not visible from space with the naked eye? "
+                 "Astronauts on the International Space Station have confirmed it. The wall is long "
+                 "but only a few meters wide, about the same as a highway. Marco Polo never even "
+                 "mentioned it in his travels. Thanks for watching, and subscribe for more facts!")
+
+
+def load_scripts(path, limit):
+    scripts = list(load_completed(path).values())[:limit]
+    if not scripts:
+        print(f"No scripts in {path}, using {limit} copies of a sample script")
+        scripts = [f"{SAMPLE_SCRIPT} ({i})" for i in range(limit)]
+    return scripts
+
+
+def bench_keywords(args):
+    scripts = load_scripts(args.scripts, args.limit)
+    scenes = [scene for script in scripts for scene in chunk_script(script)]
+
+    start = time.perf_counter()
+    nlp = load_model(args.model)
+    print(f"Model load: {time.perf_counter() - start:.2f}s")
+    if nlp is None:
+        return
+    print(f"{len(scripts)} scripts, {len(scenes)} scenes")
+
+    start = time.perf_counter()
+    for scene in scenes:
+        nlp(scene)
+    baseline = time.perf_counter() - start
+    print(f"one at a time         {1000 * baseline / len(scripts):8.2f} ms/script")
+
+    for batch_size in args.batch_sizes:
+        extractor = KeywordExtractor(args.model, batch_size=batch_size, n_process=args.n_process, nlp=nlp)
+        start = time.perf_counter()
+        extractor.queries_for(scenes)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        extractor.queries_for(scenes)
+        cached = time.perf_counter() - start
+        print(f"batch_size={batch_size:<4} cold {1000 * cold / len(scripts):8.2f} ms/script, "
+              f"cached {1000 * cached / len(scripts):8.3f} ms/script")
+
+
+def percentiles(values, qs=(50, 95, 99)):
+    if not values:
+        return [float('nan')] * len(qs)
+    return list(np.percentile(values, qs))
+
+
+def check_output(path):
+    """'ok' for a usable asset, 'invalid' for a file that is not one, 'missing' for no file"""
+    if not path or not os.path.exists(path):
+        return 'missing'
+    if path.endswith('.jpg'):
+        with open(path, 'rb') as f:
+            return 'ok' if sniff_image_size(f.read(64 * 1024)) else 'invalid'
+    return 'ok' if os.path.getsize(path) > 0 else 'invalid'
+
+
+def bench_fetch(args):
+    faults = Faults(args.latency, args.jitter, args.error_rate, args.rate_limit_rate, args.truncate_rate,
+                    args.retry_after, args.stall_rate, args.stall)
+    server = StubServer(faults={'*': faults}, seed=args.seed).start()
+    workdir = tempfile.mkdtemp(prefix='fetch_bench_')
+    config_path = os.path.join(workdir, 'config.json')
+    with open(config_path, 'w') as f:
+        json.dump({'api_url': server.pexels_url, 'api_key': 'stub'}, f)
+    print(f"Stub services on {server.url}, working in {workdir}")
+
+    results = defaultdict(list)  # stage -> [(seconds, outcome)]
+
+    async def scripts():
+        client = AsyncGroqClient('stub', api_url=server.groq_url, concurrency=args.concurrency,
+                                 rate=args.groq_rate, burst=args.concurrency, backoff=args.backoff)
+        async with client.session() as session:
+            async def one(job):
+                start = time.perf_counter()
+                content = await client.complete(session, build_script_payload(f"topic {job}"))
+                results['script'].append((time.perf_counter() - start, 'ok' if content else 'failed'))
+            await asyncio.gather(*(one(job) for job in range(args.jobs)))
+        return client.stats
+
+    start = time.perf_counter()
+    groq_stats = asyncio.run(scripts())
+    script_seconds = time.perf_counter() - start
+
+    speech = TextToSpeechGenerator(command=tts_command(Faults(args.latency, args.jitter, args.error_rate)))
+    hedge_after = args.hedge_after if args.hedge_after > 0 else None
+    images = ImageDownloader(pool_size=args.concurrency, pollinations_url=server.url, google_url=server.url,
+                             hedge_after=hedge_after, max_hedges=args.max_hedges, fetch_timeout=args.fetch_timeout)
+    videos = VideoDownloader(config_path, fetch_timeout=args.fetch_timeout)
+    scenes = chunk_script(STUB_SCRIPT)
+
+    def timed(stage, fetch):
+        start = time.perf_counter()
+        try:
+            outcome = check_output(fetch())
+        except Exception as e:
+            outcome = f"error:{type(e).__name__}"
+        results[stage].append((time.perf_counter() - start, outcome))
+
+    def job(number):
+        workspace = Workspace(workdir, f"job_{number:03d}").create()
+        audio_path = workspace.path('audio', 'audio.wav')
+        timed('tts', lambda: speech.generate_speech(
+            STUB_SCRIPT, output_path=audio_path, subtitles_path=workspace.path('subtitles', 'subtitles.srt')
+        ) and audio_path)
+        for idx, text in enumerate(scenes, 1):
+            if args.method == 'video':
+                timed('pexels', lambda: videos.download_video(idx - 1, text, workspace=workspace))
+            elif args.method == 'google':
+                timed('google', lambda: images.download_image(idx, text, workspace=workspace))
+            else:
+                timed('pollinations', lambda: images.create_image(idx, text, 'topic', workspace=workspace))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        list(executor.map(job, range(args.jobs)))
+    fetch_seconds = time.perf_counter() - start
+    server.stop()
+
+    print(f"\n{args.jobs} jobs: scripts in {script_seconds:.2f}s, assets in {fetch_seconds:.2f}s "
+          f"({args.jobs / fetch_seconds:.2f} jobs/s)")
+    print(f"{'stage':<13}{'calls':>6}{'ok':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  other outcomes")
+    for stage, samples in results.items():
+        outcomes = defaultdict(int)
+        for _, outcome in samples:
+            outcomes[outcome] += 1
+        p50, p95, p99 = percentiles([1000 * seconds for seconds, _ in samples])
+        other = ', '.join(f"{outcome}={count}" for outcome, count in sorted(outcomes.items()) if outcome != 'ok')
+        print(f"{stage:<13}{len(samples):>6}{outcomes['ok']:>6}{p50:>9.0f}{p95:>9.0f}{p99:>9.0f}  {other}")
+    print(f"\n{'upstream':<13}{'requests':>9}  injected")
+    for service, counts in sorted(server.stats.items()):
+        injected = ', '.join(f"{outcome}={count}" for outcome, count in sorted(counts.items())
+                             if outcome not in ('requests', 'ok'))
+        print(f"{service:<13}{counts['requests']:>9}  {injected}")
+    print(f"groq client: {dict(groq_stats)}")
+    print(f"image fetcher: {images.fetcher.stats}")
+
+
+def bench_captions(args):
+    from moviepy import ColorClip, CompositeVideoClip
+    from video_creator import VideoCreator
+    creator = VideoCreator()
+    resolution = tuple(args.resolution)
+    # Evenly paced words, as TTS word boundaries would report them
+    words = [(word, 0.3 * index, 0.3 * index + 0.25) for index, word in enumerate(STUB_SCRIPT.split())]
+    cues = group_words(words, text=STUB_SCRIPT)
+    duration = cues[-1][1]
+    background = ColorClip(resolution, color=(40, 90, 160)).with_duration(duration)
+    times = np.linspace(0, duration, args.frames, endpoint=False)
+
+    for name, captions in (('static', [cue[:3] for cue in cues]), ('karaoke', cues)):
+        start = time.perf_counter()
+        clips = creator.caption_clips(captions, resolution)
+        build = time.perf_counter() - start
+        composite = CompositeVideoClip([background] + clips, size=resolution)
+        start = time.perf_counter()
+        for t in times:
+            composite.get_frame(t)
+        per_frame = (time.perf_counter() - start) / len(times)
+        print(f"{name:<8} {len(clips):4d} clips, built in {1000 * build:7.1f} ms, {1000 * per_frame:6.2f} ms/frame")
+
+
+def bench_frames(args):
+    from moviepy import CompositeVideoClip, concatenate_videoclips
+    from PIL import Image
+    from video_creator import VideoCreator
+    resolution = tuple(args.resolution)
+    folder = tempfile.mkdtemp()
+    image_paths = []
+    for number in range(args.scenes):
+        image_paths.append(os.path.join(folder, f"{number:02d}.png"))
+        Image.new('RGB', resolution, (40 * number % 255, 90, 160)).save(image_paths[-1])
+    words = [(word, 0.3 * index, 0.3 * index + 0.25) for index, word in enumerate(STUB_SCRIPT.split())]
+    cues = [cue[:3] for cue in group_words(words, text=STUB_SCRIPT)]
+    duration = cues[-1][1]
+    scene_duration = duration / args.scenes
+    times = np.arange(0, duration, 1 / args.fps)
+
+    for zoom_rate in (0.05, 0):
+        creator = VideoCreator(zoom_rate=zoom_rate)
+        scenes = [creator.scene_clip(path, scene_duration + 0.5, resolution) for path in image_paths]
+        pieces = creator.compose_scenes(scenes, [scene_duration] * args.scenes, resolution, 'crossfade', 0.5)
+        overlays = creator.create_overlays(None, resolution, duration) + creator.caption_clips(cues, resolution)
+        clips = [clip for _, clip in pieces]
+        for name, clip in (('every frame', CompositeVideoClip([concatenate_videoclips(clips)] + overlays)),
+                           ('memoized', creator.composite(clips, overlays, duration)[0])):
+            start = time.perf_counter()
+            for t in times:
+                clip.get_frame(t)
+            per_frame = (time.perf_counter() - start) / len(times)
+            print(f"zoom {zoom_rate:<5} {name:<12} {1000 * per_frame:6.2f} ms/frame over {len(times)} frames")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pipeline stages')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    keywords = subparsers.add_parser('keywords', help='Keyword extraction time per script')
+    keywords.add_argument('--scripts', default=OUTPUT_JSONL, help='JSONL file of generated scripts')
+    keywords.add_argument('--limit', type=int, default=200, help='Number of scripts to use')
+    keywords.add_argument('--model', default='en_core_web_sm', help='spaCy model')
+    keywords.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 16, 64, 256])
+    keywords.add_argument('--n-process', type=int, default=1)
+    keywords.set_defaults(run=bench_keywords)
+
+    fetch = subparsers.add_parser('fetch', help='Fetch throughput, tail latency and retries against stub upstreams')
+    fetch.add_argument('--jobs', type=int, default=20, help='Scripts to fetch assets for')
+    fetch.add_argument('--method', choices=['image', 'google', 'video'], default='image',
+                       help='Pollinations images, Google image search or Pexels clips')
+    fetch.add_argument('--concurrency', type=int, default=8, help='Jobs fetched at once')
+    fetch.add_argument('--latency', type=float, default=0.05, help='Upstream seconds before every response')
+    fetch.add_argument('--jitter', type=float, default=0.1, help='Up to this many extra upstream seconds')
+    fetch.add_argument('--error-rate', type=float, default=0.0, help='Share of upstream requests answered with 500')
+    fetch.add_argument('--rate-limit-rate', type=float, default=0.0, help='Share answered with 429')
+    fetch.add_argument('--truncate-rate', type=float, default=0.0, help='Share of bodies cut off halfway')
+    fetch.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with 429s')
+    fetch.add_argument('--groq-rate', type=float, default=20.0, help='Script requests per second')
+    fetch.add_argument('--backoff', type=float, default=0.1, help='Base retry backoff of the script client')
+    fetch.add_argument('--stall-rate', type=float, default=0.0, help='Share of upstream requests that hang')
+    fetch.add_argument('--stall', type=float, default=30.0, help='Extra seconds of a hanging request')
+    fetch.add_argument('--hedge-after', type=float, default=8.0,
+                       help='Seconds before a slow Pollinations request is duplicated (0 disables hedging)')
+    fetch.add_argument('--max-hedges', type=int, default=1, help='Duplicates per request')
+    fetch.add_argument('--fetch-timeout', type=float, default=120.0, help='Deadline of each asset fetch')
+    fetch.add_argument('--seed', type=int, default=0, help='Seed of the injected faults')
+    fetch.set_defaults(run=bench_fetch)
+
+    captions = subparsers.add_parser('captions', help='Compositing cost of static and karaoke captions')
+    captions.add_argument('--frames', type=int, default=300, help='Frames to composite per mode')
+    captions.add_argument('--resolution', type=int, nargs=2, default=[1080, 1920])
+    captions.set_defaults(run=bench_captions)
+
+    frames = subparsers.add_parser('frames', help='Compositing cost with and without frame reuse')
+    frames.add_argument('--scenes', type=int, default=4, help='Still images in the timeline')
+    frames.add_argument('--fps', type=int, default=30)
+    frames.add_argument('--resolution', type=int, nargs=2, default=[1080, 1920])
+    frames.set_defaults(run=bench_frames)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Motion analysis and smart trimming for stock clips.
+
+Each clip is decoded once at a few frames per second into tiny grayscale
+frames. The mean absolute difference between neighbouring samples is its
+motion profile; spikes in it are scene changes. The best window of a given
+length is the one with the most motion and no scene change, and it is cut
+with ffmpeg input-side seeking so nothing before it is decoded.
+
+Profiles are cached per asset (by content hash), so a clip is analysed once
+no matter how many windows are later taken from it.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import subprocess
+import threading
+import numpy as np
+from moviepy.config import FFMPEG_BINARY
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_FPS = 4
+SAMPLE_WIDTH = 32
+SAMPLE_HEIGHT = 56
+SCENE_CHANGE_THRESHOLD = 0.25  # mean absolute difference, 0..1
+DURATION_PATTERN = re.compile(rb'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)')
+
+
+def asset_key(path, chunk_size=1 << 20):
+    """Content hash of a file, used as its cache key"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def motion_profile(path, sample_fps=SAMPLE_FPS, size=(SAMPLE_WIDTH, SAMPLE_HEIGHT), threads=None):
+    """
+    Decode a clip into tiny grayscale samples and measure change between them.
+
+    Returns:
+        dict: {'duration': seconds, 'sample_fps': ..., 'motion': [...]} where
+        motion[i] is the change from sample i to sample i + 1 (0..1)
+    """
+    width, height = size
+    command = [FFMPEG_BINARY, '-nostdin'] + (['-threads', str(threads)] if threads else []) + ['-i', path, '-an',
+               '-vf', f"fps={sample_fps},scale={width}:{height}:flags=fast_bilinear,format=gray",
+               '-f', 'rawvideo', '-pix_fmt', 'gray', '-']
+    result = subprocess.run(command, capture_output=True, check=True)
+    frames = np.frombuffer(result.stdout, dtype=np.uint8)
+    frames = frames[:len(frames) // (width * height) * width * height].reshape(-1, height, width)
+    match = DURATION_PATTERN.search(result.stderr)
+    if match:
+        hours, minutes, seconds = match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    else:
+        duration = len(frames) / sample_fps
+    motion = np.abs(np.diff(frames.astype(np.int16), axis=0)).mean(axis=(1, 2)) / 255.0
+    return {'duration': duration, 'sample_fps': sample_fps, 'motion': [round(float(m), 4) for m in motion]}
+
+
+def best_window(profile, duration, scene_change_threshold=SCENE_CHANGE_THRESHOLD):
+    """
+    Start time of the window of length duration with the most motion.
+
+    Windows that contain a scene change are only used when every window does.
+    """
+    motion = np.asarray(profile['motion'], dtype=np.float64)
+    sample_fps = profile['sample_fps']
+    latest_start = profile['duration'] - duration
+    if latest_start <= 0 or len(motion) == 0:
+        return 0.0
+    span = max(min(int(round(duration * sample_fps)), len(motion)), 1)
+    count = int(latest_start * sample_fps) + 1
+    totals = np.convolve(motion, np.ones(span), mode='valid')[:count]
+    cuts = np.convolve(motion > scene_change_threshold, np.ones(span), mode='valid')[:count]
+    # A scene change dominates any amount of motion
+    scores = totals - cuts * span
+    return min(float(np.argmax(scores)) / sample_fps, latest_start)
+
+
+class ClipAnalyzer:
+    """
+    Picks and extracts the best window of each stock clip.
+
+    Example:
+        analyzer = ClipAnalyzer('clip_scores.json')
+        trimmed_path = analyzer.trim('temp/videos/01.mp4', 4.5)
+    """
+
+    def __init__(self, cache_path=None, max_slowdown=1.5):
+        """
+        Args:
+            cache_path: JSON file to persist motion profiles in, or None for memory only.
+            max_slowdown: Clips shorter than the slot are slowed down by up to this
+                factor; anything shorter is looped instead.
+        """
+        self.cache_path = cache_path
+        self.max_slowdown = max_slowdown
+        # ffmpeg threads for decoding and re-encoding clips (None lets ffmpeg use all cores)
+        self.threads = None
+        self.profiles = {}
+        self._lock = threading.Lock()
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, 'r') as f:
+                self.profiles = json.load(f)
+
+    def profile(self, path):
+        """Motion profile of a clip, computed once per distinct file"""
+        key = asset_key(path)
+        with self._lock:
+            profile = self.profiles.get(key)
+        if profile is None:
+            profile = motion_profile(path, threads=self.threads)
+            with self._lock:
+                self.profiles[key] = profile
+                self.save()
+        return profile
+
+    def trim(self, path, duration, output_dir=None):
+        """
+        Cut the best duration-second window of a clip into its own file.
+
+        Returns:
+            str: Path of the trimmed clip (reused if it already exists)
+        """
+        profile = self.profile(path)
+        output_dir = output_dir or os.path.join(os.path.dirname(path), 'trimmed')
+        os.makedirs(output_dir, exist_ok=True)
+        base_name = os.path.splitext(os.path.basename(path))[0]
+        output_path = os.path.join(output_dir, f"{base_name}_{duration:.2f}.mp4")
+        if os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(path):
+            return output_path
+
+        source_duration = profile['duration']
+        # Placed before an input, -threads sets that input's decoder threads; before the output, the encoder's
+        threads = ['-threads', str(self.threads)] if self.threads else []
+        command = [FFMPEG_BINARY, '-y', '-v', 'error'] + threads
+        if source_duration >= duration:
+            start = best_window(profile, duration)
+            logger.info(f"Using {start:.2f}s-{start + duration:.2f}s of {path}")
+            # -ss before -i seeks in the input instead of decoding up to start
+            command += ['-ss', f"{start:.3f}", '-i', path]
+        elif duration <= source_duration * self.max_slowdown:
+            factor = duration / source_duration
+            logger.info(f"Slowing {path} down {factor:.2f}x to fill {duration:.2f}s")
+            command += ['-i', path, '-vf', f"setpts={factor:.4f}*PTS"]
+        else:
+            logger.info(f"Looping {path} ({source_duration:.2f}s) to fill {duration:.2f}s")
+            command += ['-stream_loop', '-1', '-i', path]
+        command += ['-t', f"{duration:.3f}", '-an', '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18',
+                    '-pix_fmt', 'yuv420p'] + threads + [output_path]
+        try:
+            subprocess.run(command, capture_output=True, text=True, check=True)
+        except subprocess.CalledProcessError as e:
+            logger.error(f"ffmpeg trim failed for {path}: {e.stderr}")
+            raise
+        return output_path
+
+    def save(self):
+        if not self.cache_path:
+            return
+        with open(self.cache_path, 'w') as f:
+            json.dump(self.profiles, f)
@@ -0,0 +1,239 @@
+"""
+Predicting how long a job takes before it starts.
+
+Every finished job records how long its stages took together with what
+drives their cost: words of script (narration), scenes (one asset fetch or
+preprocess each), and megapixel-frames to composite and encode (narration
+length x fps x resolution). Per job group (method and encode profile, whose
+costs differ too much to share coefficients) and stage, a least-squares fit
+over those features then predicts the stages of a job that has not started:
+
+    tts     narration and its pre-encoded audio
+    assets  keyword extraction, fetches and preprocessing, wall time
+    render  compositing and encoding
+
+A job's total is max(tts, assets) + render, since narration and fetches run
+side by side. Groups with too few samples for a full fit scale their mean by
+the stage's main feature, and groups without samples borrow every group's.
+
+The predictions order the batch queue (shortest predicted job first, or least
+slack before its deadline first) and give queued jobs an ETA.
+"""
+import json
+import math
+import os
+import threading
+import time
+import numpy as np
+from keyword_extractor import chunk_script
+
+STAGES = ('tts', 'assets', 'render')
+FEATURES = ('words', 'scenes', 'megapixel_frames')
+# Feature a stage's cost grows with, for groups with too few samples for a full fit
+MAIN_FEATURE = {'tts': 'words', 'assets': 'scenes', 'render': 'megapixel_frames'}
+# Narration pace of the TTS voices, used to estimate the video's length from its script
+WORDS_PER_SECOND = 2.5
+ORDERS = ('fifo', 'shortest', 'deadline')
+
+
+def job_features(script, resolution, fps=30):
+    """Cost drivers of a job, known before it starts"""
+    words = len(script.split())
+    frames = words / WORDS_PER_SECOND * fps
+    return {
+        'words': words,
+        'scenes': len(chunk_script(script)),
+        'megapixel_frames': frames * resolution[0] * resolution[1] / 1e6,
+    }
+
+
+def stage_seconds(timings):
+    """
+    Seconds of each cost-model stage from StageGraph.timings().
+
+    Stages the graph did not run (render, when a job was only prepared) are left out.
+    """
+    seconds = {}
+    if 'tts' in timings:
+        seconds['tts'] = timings['tts'][1] + timings.get('audio_encode', (0, 0))[1]
+    if 'keywords' in timings and 'assets' in timings:
+        start, duration = timings['assets']
+        seconds['assets'] = start + duration - timings['keywords'][0]
+    if 'render' in timings:
+        seconds['render'] = timings['render'][1]
+    return seconds
+
+
+def total_seconds(prediction):
+    return max(prediction['tts'], prediction['assets']) + prediction['render']
+
+
+class CostModel:
+    """
+    Stage-time predictions fitted from the recorded timings of earlier jobs.
+
+    Samples are appended to a JSON-lines file shared by every process on the
+    host, and the fits are redone when it changes.
+
+    Example:
+        model = CostModel('stage_timings.jsonl')
+        model.record('video/single', job_features(script, resolution), {'tts': 12.0, 'assets': 30.5, 'render': 95.1})
+        model.predict('video/single', job_features(next_script, resolution))  # {'tts': ..., 'total': ...}
+    """
+
+    def __init__(self, path=None, ridge=1e-6):
+        """
+        Args:
+            path: JSON-lines file of samples (None keeps them in memory).
+            ridge: Regularisation of the fits, keeping them stable while
+                features are nearly collinear.
+        """
+        self.path = path
+        self.ridge = ridge
+        self.samples = []
+        self.lock = threading.Lock()
+        self._loaded_size = 0
+        self._fits = {}
+
+    def record(self, group, features, seconds):
+        """Add a finished job's stage times (stages that did not run may be missing)"""
+        sample = {'group': group, 'features': {name: features[name] for name in FEATURES},
+                  'seconds': {stage: seconds[stage] for stage in STAGES if stage in seconds}, 'at': time.time()}
+        with self.lock:
+            self._reload()
+            if self.path:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(sample) + '\n')
+                self._loaded_size = os.path.getsize(self.path)
+            self.samples.append(sample)
+            self._fits = {}
+
+    def predict(self, group, features):
+        """
+        Predicted seconds of each stage and in total, or None before any job was recorded.
+        """
+        with self.lock:
+            self._reload()
+            prediction = {}
+            for stage in STAGES:
+                seconds = self._predict_stage(group, stage, features)
+                if seconds is None:
+                    return None
+                prediction[stage] = seconds
+        prediction['total'] = total_seconds(prediction)
+        return prediction
+
+    def report(self):
+        """One-line summary for logs"""
+        with self.lock:
+            self._reload()
+            groups = sorted({sample['group'] for sample in self.samples})
+            return f"Cost model: {len(self.samples)} jobs recorded ({', '.join(groups) or 'none yet'})"
+
+    def _reload(self):
+        # Callers hold self.lock
+        if not self.path or not os.path.exists(self.path):
+            return
+        size = os.path.getsize(self.path)
+        if size == self._loaded_size:
+            return
+        samples = []
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    samples.append(json.loads(line))
+                except json.JSONDecodeError:
+                    pass  # a line another process is still writing
+        self.samples = samples
+        self._loaded_size = size
+        self._fits = {}
+
+    def _predict_stage(self, group, stage, features):
+        fit = self._fits.get((group, stage))
+        if fit is None:
+            # Without samples of this group yet, every group's jobs are the best guess there is
+            fit = (self._fit([sample for sample in self.samples if sample['group'] == group], stage)
+                   or self._fit(self.samples, stage) or False)
+            self._fits[(group, stage)] = fit
+        if fit is False:
+            return None
+        return max(fit(features), 0.0)
+
+    def _fit(self, samples, stage):
+        """Prediction function of stage over samples, or None if none timed it"""
+        rows = [(sample['features'], sample['seconds'][stage]) for sample in samples if stage in sample['seconds']]
+        if not rows:
+            return None
+        seconds = np.array([row[1] for row in rows])
+        if len(rows) > len(FEATURES) + 1:
+            x = np.array([[1.0] + [row[0][name] for name in FEATURES] for row in rows])
+            # Scale columns so the ridge weighs features of different magnitudes alike
+            scale = np.maximum(np.abs(x).max(axis=0), 1e-9)
+            x = x / scale
+            a = np.vstack([x, math.sqrt(self.ridge) * np.eye(x.shape[1])])
+            b = np.concatenate([seconds, np.zeros(x.shape[1])])
+            coefficients = np.linalg.lstsq(a, b, rcond=None)[0] / scale
+            return lambda features: float(coefficients[0] + sum(
+                coefficient * features[name] for coefficient, name in zip(coefficients[1:], FEATURES)))
+        main = MAIN_FEATURE[stage]
+        mean_feature = float(np.mean([row[0][main] for row in rows]))
+        mean_seconds = float(seconds.mean())
+        if mean_feature <= 0:
+            return lambda features: mean_seconds
+        return lambda features: mean_seconds * features[main] / mean_feature
+
+
+def order_jobs(jobs, order, predict, now=None):
+    """
+    Jobs in the order to start them.
+
+    Args:
+        jobs: Dicts with 'id' and optionally 'deadline' (epoch seconds or None).
+        order: 'fifo' (by id), 'shortest' (shortest predicted first) or
+            'deadline' (least slack before the deadline first, then the
+            jobs without one, shortest first).
+        predict: Function of a job returning its predicted seconds, or None
+            when unknown (unknown jobs keep their id order).
+    """
+    if order == 'fifo':
+        return sorted(jobs, key=lambda job: job['id'])
+    if order not in ORDERS:
+        raise ValueError(f"Unknown order '{order}', expected one of {ORDERS}")
+    now = time.time() if now is None else now
+    predicted = {job['id']: predict(job) or 0.0 for job in jobs}
+
+    def key(job):
+        deadline = job.get('deadline')
+        if order == 'deadline' and deadline is not None:
+            return 0, deadline - now - predicted[job['id']], job['id']
+        return 1, predicted[job['id']], job['id']
+
+    return sorted(jobs, key=key)
+
+
+def queue_etas(jobs, predict, workers=1, now=None, busy_until=()):
+    """
+    Expected finish time of each job when jobs start in the given order.
+
+    Each job starts on whichever of the workers frees up first.
+
+    Args:
+        busy_until: Expected finish times of the jobs already running; the
+            other workers are free now.
+
+    Returns:
+        dict: job id -> epoch seconds, or None for jobs without a prediction
+    """
+    now = time.time() if now is None else now
+    busy_until = sorted(max(finish, now) for finish in busy_until)[:max(workers, 1)]
+    free_at = busy_until + [now] * (max(workers, 1) - len(busy_until))
+    etas = {}
+    for job in jobs:
+        seconds = predict(job)
+        if seconds is None:
+            etas[job['id']] = None
+            continue
+        start = min(free_at)
+        free_at[free_at.index(start)] = start + seconds
+        etas[job['id']] = start + seconds
+    return etas
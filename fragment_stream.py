@@ -0,0 +1,235 @@
+"""
+Streaming a fragmented MP4 to its consumers while it is being written.
+
+With fragment_seconds set, VideoCreator writes final outputs as fragmented
+MP4: an init segment (ftyp + an empty moov) followed by self-contained
+moof + mdat fragments of a few seconds each. A FragmentTailer follows the
+growing file and hands the init segment and every completed fragment to its
+sinks as soon as the encoder has finished writing it, so an upload or a
+preview can start seconds into a render instead of after it.
+
+Sinks:
+    FileSink       byte-for-byte copy, e.g. on a mounted share
+    PipeSink       stdin of a command, e.g. an uploader reading from '-'
+    DirectorySink  init.mp4 plus numbered .m4s fragments and a manifest.json,
+                   for a local upload agent that ships files as they appear
+"""
+import json
+import logging
+import os
+import struct
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+HEADER_BYTES = 8
+
+
+def read_box_header(f, offset):
+    """
+    (box type, box size) of the box starting at offset, or None if its header is not written yet.
+
+    A size of 0 means the box runs to the end of the file.
+    """
+    f.seek(offset)
+    header = f.read(HEADER_BYTES)
+    if len(header) < HEADER_BYTES:
+        return None
+    size, box_type = struct.unpack('>I4s', header)
+    if size == 1:
+        large = f.read(8)
+        if len(large) < 8:
+            return None
+        size = struct.unpack('>Q', large)[0]
+    return box_type.decode('latin-1'), size
+
+
+class FileSink:
+    """Appends everything to a file"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'wb')
+
+    def write(self, kind, data):
+        self.file.write(data)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class PipeSink:
+    """Writes everything to the stdin of a command"""
+
+    def __init__(self, command):
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, kind, data):
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            logger.warning(f"{self.process.args[0]} exited with {self.process.returncode}")
+
+
+class DirectorySink:
+    """
+    Writes the init segment and each fragment as its own file.
+
+    manifest.json lists the files written so far, in playback order, and
+    'complete' once the stream has ended; each file is renamed into place
+    only when fully written.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.files = []
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, kind, data):
+        if kind == 'init':
+            name = 'init.mp4'
+        elif kind == 'fragment':
+            name = f"fragment_{len(self.files):05d}.m4s"
+        else:
+            name = 'tail.mp4'
+        self._write_atomic(name, data)
+        self.files.append(name)
+        self._write_manifest(False)
+
+    def close(self):
+        self._write_manifest(True)
+
+    def _write_manifest(self, complete):
+        self._write_atomic('manifest.json', json.dumps({'files': self.files, 'complete': complete}).encode())
+
+    def _write_atomic(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path + '.part', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.part', path)
+
+
+SINK_TYPES = {'file': FileSink, 'pipe': PipeSink, 'directory': DirectorySink}
+
+
+def build_sinks(specs, **fields):
+    """
+    Sinks from config entries such as {"type": "directory", "path": "publish/{name}"}.
+
+    Paths and command arguments are formatted with fields (e.g. name=...).
+    """
+    sinks = []
+    for spec in specs:
+        if spec['type'] == 'pipe':
+            sinks.append(PipeSink([argument.format(**fields) for argument in spec['command']]))
+        else:
+            sinks.append(SINK_TYPES[spec['type']](spec['path'].format(**fields)))
+    return sinks
+
+
+class FragmentTailer:
+    """
+    Follows an MP4 while it is written and passes complete pieces to sinks.
+
+    Pieces are ('init', ftyp..moov), one ('fragment', [styp/sidx] moof mdat)
+    per fragment and, at the end, ('tail', anything left such as mfra). A
+    file that turns out not to be fragmented reaches the sinks whole, as
+    'init', when finish() is called.
+
+    Example:
+        tailer = FragmentTailer(output_path, [DirectorySink('publish/job')]).start()
+        creator.create_clip_video(..., output_path=output_path)
+        tailer.finish()
+    """
+
+    def __init__(self, path, sinks, poll_interval=0.1):
+        self.path = path
+        self.sinks = list(sinks)
+        self.poll_interval = poll_interval
+        self.offset = 0          # end of the last complete box
+        self.pending_start = 0   # start of the bytes not handed to sinks yet
+        self.init_sent = False
+        self.in_fragment = False
+        self.stats = {'fragments': 0, 'bytes': 0, 'first_fragment_seconds': None}
+        self._started = None
+        self._finishing = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._started = time.monotonic()
+        self._thread.start()
+        return self
+
+    def finish(self):
+        """Wait for the writer's last bytes to reach the sinks, then close them"""
+        self._finishing.set()
+        self._thread.join()
+        return self.stats
+
+    def _run(self):
+        try:
+            while True:
+                finishing = self._finishing.is_set()
+                if os.path.exists(self.path):
+                    with open(self.path, 'rb') as f:
+                        self._scan(f, os.path.getsize(self.path))
+                        if finishing:
+                            self._flush_rest(f, os.path.getsize(self.path))
+                if finishing:
+                    break
+                self._finishing.wait(self.poll_interval)
+        except Exception as e:
+            logger.error(f"Streaming {self.path} failed: {e}")
+        finally:
+            for sink in self.sinks:
+                try:
+                    sink.close()
+                except Exception as e:
+                    logger.error(f"Closing {type(sink).__name__} failed: {e}")
+
+    def _scan(self, f, size):
+        while True:
+            header = read_box_header(f, self.offset)
+            if header is None:
+                return
+            box_type, box_size = header
+            if box_size == 0 or self.offset + box_size > size:
+                return  # still being written
+            if box_type == 'moof':
+                if not self.init_sent:
+                    self._emit(f, 'init', self.offset)
+                    self.init_sent = True
+                self.in_fragment = True
+            self.offset += box_size
+            if box_type == 'mdat' and self.in_fragment:
+                self._emit(f, 'fragment', self.offset)
+                self.in_fragment = False
+
+    def _flush_rest(self, f, size):
+        if size > self.pending_start:
+            self._emit(f, 'tail' if self.init_sent else 'init', size)
+
+    def _emit(self, f, kind, end):
+        f.seek(self.pending_start)
+        data = f.read(end - self.pending_start)
+        self.pending_start = end
+        if kind == 'fragment':
+            self.stats['fragments'] += 1
+            if self.stats['first_fragment_seconds'] is None:
+                self.stats['first_fragment_seconds'] = time.monotonic() - self._started
+        self.stats['bytes'] += len(data)
+        for sink in list(self.sinks):
+            try:
+                sink.write(kind, data)
+            except Exception as e:
+                # A failing consumer must not stop the render or the other sinks
+                logger.error(f"{type(sink).__name__} failed, dropping it: {e}")
+                self.sinks.remove(sink)
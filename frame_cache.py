@@ -0,0 +1,146 @@
+"""
+Disk cache of decoded, preprocessed frames.
+
+Each entry is one frame at the output resolution stored as a raw uint8 .npy
+file, keyed by the source asset's content hash, the resolution and the crop
+mode. Entries are opened with np.load(mmap_mode='r'), so every render worker
+on a machine shares the same pages through the OS page cache instead of
+decoding the JPEG again.
+
+The cache directory is kept under a byte budget by evicting the least
+recently used entries (by modification time, which hits refresh).
+"""
+import hashlib
+import logging
+import os
+import threading
+import uuid
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+CROP_MODES = ('stretch', 'cover')
+
+
+def resize_frame(image, resolution, crop='stretch'):
+    """
+    Resize a PIL image to resolution as an RGB uint8 array.
+
+    'stretch' scales to the exact size like VideoCreator.preprocess_image
+    always did; 'cover' scales to fill and crops the centre.
+    """
+    if crop not in CROP_MODES:
+        raise ValueError(f"Unknown crop mode '{crop}'. Available: {CROP_MODES}")
+    width, height = resolution
+    image = image.convert('RGB')
+    if image.size != (width, height) and crop == 'cover':
+        scale = max(width / image.width, height / image.height)
+        scaled = (max(width, round(image.width * scale)), max(height, round(image.height * scale)))
+        image = image.resize(scaled, Image.LANCZOS)
+        left, top = (scaled[0] - width) // 2, (scaled[1] - height) // 2
+        image = image.crop((left, top, left + width, top + height))
+    elif image.size != (width, height):
+        image = image.resize((width, height), Image.LANCZOS)
+    return np.asarray(image, dtype=np.uint8)
+
+
+def decode_image(path, resolution, crop='stretch'):
+    """Decode an image file straight to a frame at resolution"""
+    with Image.open(path) as image:
+        return resize_frame(image, resolution, crop)
+
+
+class FrameCache:
+    """
+    Budgeted directory of memory-mapped frames.
+
+    Example:
+        cache = FrameCache('frame_cache', budget_bytes=2 << 30)
+        frame = cache.image('temp/images/01.jpg', (1080, 1920))
+    """
+
+    def __init__(self, root='frame_cache', budget_bytes=2 << 30):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'evicted': 0}
+        self._hashes = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def asset_hash(self, path):
+        """Content hash of a file, remembered while its size and mtime are unchanged"""
+        stat = os.stat(path)
+        signature = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        digest = self._hashes.get(signature)
+        if digest is None:
+            sha = hashlib.sha1()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(chunk)
+            digest = self._hashes[signature] = sha.hexdigest()
+        return digest
+
+    def entry_path(self, asset_hash, resolution, crop='stretch', tag=''):
+        width, height = resolution
+        return os.path.join(self.root, f"{asset_hash}{tag}_{width}x{height}_{crop}.npy")
+
+    def image(self, path, resolution, crop='stretch'):
+        """Frame of an image file at resolution, decoded only on the first request"""
+        entry = self.entry_path(self.asset_hash(path), resolution, crop)
+        return self._get(entry, lambda: decode_image(path, resolution, crop))
+
+    def video_frame(self, path, t, resolution, crop='stretch'):
+        """Frame of a video file at time t, decoded only on the first request"""
+        def decode():
+            from moviepy import VideoFileClip
+            clip = VideoFileClip(path, audio=False)
+            try:
+                frame = clip.get_frame(min(t, max(clip.duration - 1.0 / clip.fps, 0)))
+            finally:
+                clip.close()
+            return resize_frame(Image.fromarray(frame), resolution, crop)
+        entry = self.entry_path(self.asset_hash(path), resolution, crop, tag=f"@{t:.3f}")
+        return self._get(entry, decode)
+
+    def _get(self, entry, decode):
+        try:
+            frame = np.load(entry, mmap_mode='r')
+            os.utime(entry)
+            self.stats['hits'] += 1
+            return frame
+        except (FileNotFoundError, ValueError):
+            pass
+        self.stats['misses'] += 1
+        frame = decode()
+        # Write under a unique name and rename, so other processes never map a partial file
+        partial = f"{entry}.{uuid.uuid4().hex}.partial.npy"
+        np.save(partial, np.ascontiguousarray(frame))
+        os.replace(partial, entry)
+        self.evict(keep=entry)
+        return np.load(entry, mmap_mode='r')
+
+    def size(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.root) if entry.name.endswith('.npy'))
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the cache fits its budget"""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.root):
+                if entry.name.endswith('.npy') and '.partial' not in entry.name:
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.budget_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    # Processes that mapped the file keep their pages until they unmap it
+                    os.remove(path)
+                except (FileNotFoundError, PermissionError):
+                    continue
+                total -= size
+                self.stats['evicted'] += 1
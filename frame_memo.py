@@ -0,0 +1,102 @@
+"""
+Reusing composited frames while nothing on screen changes.
+
+Without zoom, during a still image's hold, a title card or an end screen,
+consecutive frames are identical, yet compositing redraws every layer for
+each one. Each frame therefore gets a cheap state key instead: what its
+scene shows (image path, or source frame index of a clip, plus the zoomed
+size) and which overlays are playing. While the key repeats the previous
+frame is handed out again, so compositing work follows the number of
+distinct frames rather than the frame rate.
+
+Scene clips carry their key function as a frame_key attribute (set by
+VideoCreator.scene_clip and kept through compose_scenes). Clips without one,
+such as transition blends, are always composited. Overlays are taken to be
+still images at fixed positions, which is what create_overlays makes.
+"""
+import numpy as np
+from moviepy import ImageClip
+
+
+def video_frame_index(t, fps):
+    """Frame of a clip file shown at t, the way moviepy's reader picks it"""
+    return int(fps * t + 0.00001)
+
+
+def zoom_size(size, scale):
+    """Frame size after scaling, truncated the way moviepy's Resize does it"""
+    return int(size[0] * scale), int(size[1] * scale)
+
+
+def keyed(clip, frame_key):
+    """Attach frame_key (a function of clip time returning a hashable, or None) to clip"""
+    clip.frame_key = frame_key
+    return clip
+
+
+def shifted_key(clip, offset):
+    """Key function of a subclip starting offset seconds into clip, or None if clip has none"""
+    frame_key = getattr(clip, 'frame_key', None)
+    if frame_key is None:
+        return None
+    return lambda t: frame_key(t + offset)
+
+
+def timeline_key(clips, overlays):
+    """
+    Key function of clips played one after another with overlays on top.
+
+    Equal keys mean equal frames; None means the frame must be composited.
+    """
+    timings = np.cumsum([0] + [clip.duration for clip in clips])
+    keys = [getattr(clip, 'frame_key', None) for clip in clips]
+    stills = [isinstance(overlay, ImageClip) for overlay in overlays]
+
+    def key(t):
+        # Same clip as concatenate_videoclips picks: the last one starting at or before t
+        index = int(np.searchsorted(timings, t, side='right')) - 1
+        if index >= len(keys) or keys[index] is None:
+            return None
+        scene = keys[index](t - timings[index])
+        if scene is None:
+            return None
+        playing = []
+        for number, overlay in enumerate(overlays):
+            if overlay.is_playing(t):
+                if not stills[number]:
+                    return None
+                playing.append(number)
+        return scene, tuple(playing)
+
+    return key
+
+
+class MemoizedFrames:
+    """
+    Frame function that composites a frame only when its key differs from the previous frame's.
+
+    Example:
+        frames = MemoizedFrames(composite.get_frame, timeline_key(clips, overlays))
+        clip = VideoClip(frame_function=frames, duration=composite.duration)
+    """
+
+    def __init__(self, frame_function, key_function):
+        self.frame_function = frame_function
+        self.key_function = key_function
+        self.last_key = None
+        self.last_frame = None
+        self.stats = {'frames': 0, 'composited': 0}
+
+    def __call__(self, t):
+        key = self.key_function(t)
+        self.stats['frames'] += 1
+        if key is not None and key == self.last_key:
+            return self.last_frame
+        frame = self.frame_function(t)
+        self.stats['composited'] += 1
+        self.last_key, self.last_frame = key, frame
+        return frame
+
+    def report(self):
+        frames, composited = self.stats['frames'], self.stats['composited']
+        return f"Composited {composited} distinct frames of {frames} ({frames - composited} reused)"
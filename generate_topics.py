@@ -1,23 +1,38 @@
-import requests
 import os
+import re
+import asyncio
+import argparse
+import unicodedata
+from collections import Counter
+from topics_to_scripts import AsyncGroqClient, API_URL
 
 # Configuration
 API_KEY = "YOUR_API_KEY"  # Replace with your Groq API key
-NICHE = input("Enter your niche (e.g., 'DIY', 'Fitness', 'Tech', etc.): ")
 TOPICS_FILE = "topics.txt"
 
-def generate_topics(niche, api_key):
+# Angles mixed into the prompt so parallel requests explore different sub-topics
+PROMPT_ANGLES = [
+    "surprising facts",
+    "common myths and misconceptions",
+    "beginner mistakes",
+    "little-known history",
+    "quick how-to tips",
+    "current trends",
+    "record-breaking extremes",
+    "everyday science behind it",
+    "famous people and stories",
+    "future predictions",
+    "budget and money-saving ideas",
+    "weird and unusual cases",
+]
+
+def build_topics_payload(niche, angle, per_request, temperature=0.9):
     """
-    Generate 100 interesting topic ideas for a given niche using Groq API.
+    Chat-completions request body asking for per_request topics from one angle.
     """
-    headers = {
-        'Authorization': f'Bearer {api_key}',
-        'Content-Type': 'application/json'
-    }
-
-    prompt = f"Generate 5 interesting, unique, and engaging topic ideas for viral video content in the {niche} niche. Each topic should be catchy, trending, and suitable for a broad audience. Make sure topics are diverse and cover various sub-topics within the {niche} niche."
+    prompt = f"Generate {per_request} interesting, unique, and engaging topic ideas for viral video content in the {niche} niche, focused on {angle}. Each topic should be catchy, trending, and suitable for a broad audience. Return one topic per line with no numbering and no extra text."
 
-    data = {
+    return {
         "model": "mixtral-8x7b-32768",
         "messages": [
             {
@@ -25,21 +40,111 @@ def generate_topics(niche, api_key):
                 "content": prompt
             }
         ],
-        "temperature": 0.7,
-        "max_tokens": 1000
+        "temperature": temperature,
+        "max_tokens": 60 * per_request
     }
 
-    response = requests.post(
-        "https://api.groq.com/openai/v1/chat/completions",
-        headers=headers,
-        json=data
-    )
+def normalize_topic(line):
+    """
+    Clean one line of model output into a topic, or None if it is not one.
 
-    if response.status_code == 200:
-        return response.json()["choices"][0]["message"]["content"]
-    else:
-        print("Failed to generate topics. Check your API key and try again.")
+    Strips list numbering, bullets, quotes and markdown emphasis.
+    """
+    topic = re.sub(r'^\s*(?:[-*•]+|\d+\s*[.):-]|topic\s*\d*\s*:)\s*', '', line, flags=re.IGNORECASE)
+    topic = topic.strip().strip('"\'*_ ').strip()
+    topic = re.sub(r'\s+', ' ', topic)
+    if len(topic.split()) < 3 or len(topic) > 150 or topic.endswith(':'):
         return None
+    return topic
+
+def shingles(topic, n=3):
+    """Character n-grams of the casefolded, punctuation-free topic, in any script"""
+    text = unicodedata.normalize('NFKC', topic).casefold()
+    # Letters, numbers and combining marks (Devanagari vowel signs, accents) are kept; \w alone drops the marks
+    text = ''.join(char for char in text if char.isspace() or unicodedata.category(char)[0] in 'LMN')
+    text = f" {' '.join(text.split())} "
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+class TopicDeduper:
+    """
+    Incremental near-duplicate filter for topics.
+
+    Keeps an inverted index from character trigram to topic ids, so a new
+    topic is only compared against topics that share trigrams with it.
+    """
+
+    def __init__(self, threshold=0.6):
+        self.threshold = threshold
+        self.topics = []
+        self.sizes = []
+        self.index = {}
+
+    def __len__(self):
+        return len(self.topics)
+
+    def add(self, topic):
+        """Add topic unless it is a near-duplicate. Returns True if added."""
+        grams = shingles(topic)
+        if not grams:
+            return False
+        overlap = Counter()
+        for gram in grams:
+            overlap.update(self.index.get(gram, ()))
+        for other, shared in overlap.items():
+            if shared / (len(grams) + self.sizes[other] - shared) >= self.threshold:
+                return False
+        topic_id = len(self.topics)
+        self.topics.append(topic)
+        self.sizes.append(len(grams))
+        for gram in grams:
+            self.index.setdefault(gram, []).append(topic_id)
+        return True
+
+async def generate_topics(niche, count, client, per_request=10, max_requests=None, deduper=None):
+    """
+    Fan out small topic requests until count unique topics are collected.
+
+    New requests are only launched while the topics already collected plus
+    the optimistic yield of the requests in flight fall short of count. Once
+    count is reached, requests still in flight are cancelled.
+
+    Returns:
+        list: Up to count unique topics, in the order they were accepted
+    """
+    deduper = deduper or TopicDeduper()
+    max_requests = max_requests or max(4 * count // per_request, 10)
+    launched = 0
+    pending = set()
+
+    async with client.session() as session:
+        while len(deduper) < count:
+            while (launched < max_requests and len(pending) < client.concurrency and
+                   len(deduper) + len(pending) * per_request < count):
+                angle = PROMPT_ANGLES[launched % len(PROMPT_ANGLES)]
+                # Later rounds over the same angle run a little hotter for variety
+                temperature = min(0.7 + 0.1 * (launched // len(PROMPT_ANGLES)), 1.2)
+                payload = build_topics_payload(niche, angle, per_request, temperature)
+                pending.add(asyncio.ensure_future(client.complete(session, payload)))
+                launched += 1
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                response = task.result()
+                if not response:
+                    continue
+                for line in response.split('\n'):
+                    topic = normalize_topic(line)
+                    if topic and len(deduper) < count:
+                        deduper.add(topic)
+            print(f"{len(deduper)}/{count} unique topics after {launched} requests")
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    if len(deduper) < count:
+        print(f"Not enough topics generated after {launched} requests. count = {len(deduper)}")
+    return deduper.topics[:count]
 
 def save_topics_to_file(topics, filename):
     """
@@ -51,26 +156,32 @@ def save_topics_to_file(topics, filename):
     print(f"Topics saved to: {os.path.abspath(filename)}")
 
 def main():
-    print(f"Generating 100 topics for niche: {NICHE}")
-    topics_response = generate_topics(NICHE, api_key)
-
-    if topics_response:
-        # Split the response into individual topics
-        topics_list = topics_response.split('\n')
-
-        # Remove any empty lines or duplicates
-        unique_topics = list(dict.fromkeys([topic.strip() for topic in topics_list if topic.strip() != '']))
-
-        # Ensure we have at least 100 topics
-        if len(unique_topics) >= 100:
-            final_topics = '\n'.join(unique_topics[:100])
-            save_topics_to_file(final_topics, TOPICS_FILE)
-        else:
-            print("Not enough topics generated. count ="+ str(len(unique_topics)) )
-            final_topics = '\n'.join(unique_topics[:100])
-            save_topics_to_file(final_topics, TOPICS_FILE)
+    parser = argparse.ArgumentParser(description='Generate unique video topic ideas for a niche')
+    parser.add_argument('--niche', type=str, help="Niche to generate topics for (e.g., 'DIY', 'Fitness', 'Tech')")
+    parser.add_argument('--count', type=int, default=100, help='Number of unique topics to collect')
+    parser.add_argument('--per-request', type=int, default=10, help='Topics asked for in each request')
+    parser.add_argument('--concurrency', type=int, default=6, help='Maximum requests in flight')
+    parser.add_argument('--rate', type=float, default=2.0, help='Request starts per second')
+    parser.add_argument('--max-requests', type=int, default=None, help='Give up after this many requests')
+    parser.add_argument('--similarity', type=float, default=0.6, help='Trigram similarity at which topics count as duplicates')
+    parser.add_argument('--output', type=str, default=TOPICS_FILE, help='File to write topics to')
+    parser.add_argument('--api-url', type=str, default=API_URL, help='Chat-completions endpoint')
+    args = parser.parse_args()
+
+    niche = args.niche or input("Enter your niche (e.g., 'DIY', 'Fitness', 'Tech', etc.): ")
+    api_key = os.environ.get('GROQ_API_KEY', API_KEY)
+    client = AsyncGroqClient(api_key, api_url=args.api_url, concurrency=args.concurrency, rate=args.rate,
+                             burst=args.concurrency)
+
+    print(f"Generating {args.count} topics for niche: {niche}")
+    topics = asyncio.run(generate_topics(niche, args.count, client, args.per_request,
+                                         args.max_requests, TopicDeduper(args.similarity)))
+    print(f"Request stats: {client.stats}")
+
+    if topics:
+        save_topics_to_file('\n'.join(topics), args.output)
     else:
         print("Failed to generate topics.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,213 @@
+"""
+Deadline budgets and hedged requests for asset fetches.
+
+A job gets one FetchBudget. Each fetch stage asks it for a deadline: the
+time left, split across the waves of fetches still to run. Within its
+deadline a HedgedFetcher sends the request and, if no good response has
+arrived after hedge_after seconds, a duplicate (for Pollinations, the same
+prompt with another seed). The first good response wins and the others stop
+reading and close their connections. Every fetch's latency is recorded per
+source, so slow upstreams show up as p95/p99 rather than as stalled videos.
+"""
+import math
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
+
+CHUNK_BYTES = 64 * 1024
+CONNECT_TIMEOUT = 10
+
+
+class DeadlineExceeded(Exception):
+    """No good response arrived before the fetch's deadline"""
+
+
+class FetchBudget:
+    """
+    Time allowed for all the fetches of one job.
+
+    Fetches run `parallelism` at a time, so the time left is split across
+    the waves of fetches that are still pending.
+
+    Example:
+        budget = FetchBudget(300, parallelism=8)
+        budget.add(len(scenes))
+        deadline = budget.start()  # in each fetch stage
+        ...
+        budget.done()
+    """
+
+    def __init__(self, seconds, parallelism=1, clock=time.monotonic):
+        self.clock = clock
+        self.expires = clock() + seconds
+        self.parallelism = max(parallelism, 1)
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def add(self, count=1):
+        """Register fetches that will run under this budget"""
+        with self._lock:
+            self.pending += count
+
+    def remaining(self):
+        return max(self.expires - self.clock(), 0.0)
+
+    def start(self):
+        """Deadline (on the budget's clock) for a fetch starting now"""
+        with self._lock:
+            waves = max(math.ceil(self.pending / self.parallelism), 1)
+        now = self.clock()
+        return now + max(self.expires - now, 0.0) / waves
+
+    def done(self):
+        with self._lock:
+            self.pending = max(self.pending - 1, 0)
+
+
+class LatencyRecorder:
+    """Fetch latencies and outcomes per source"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.outcomes = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def record(self, source, seconds, outcome='ok'):
+        with self._lock:
+            self.samples[source].append(seconds)
+            self.outcomes[source][outcome] += 1
+
+    def percentiles(self, source, qs=(50, 95, 99)):
+        """Latency percentiles of a source in seconds (nan without samples)"""
+        with self._lock:
+            values = list(self.samples.get(source, ()))
+        if not values:
+            return [float('nan')] * len(qs)
+        return list(np.percentile(values, qs))
+
+    def report(self):
+        """One line per source for logs"""
+        lines = []
+        for source in sorted(self.samples):
+            p50, p95, p99 = self.percentiles(source)
+            outcomes = ', '.join(f"{outcome}={count}" for outcome, count in sorted(self.outcomes[source].items()))
+            lines.append(f"{source}: p50 {p50:.2f}s, p95 {p95:.2f}s, p99 {p99:.2f}s ({outcomes})")
+        return '\n'.join(lines)
+
+
+class HedgedFetcher:
+    """
+    GETs with a deadline, hedged by duplicate requests when the first is slow.
+
+    Example:
+        fetcher = HedgedFetcher(session, hedge_after=8, max_hedges=2)
+        content = fetcher.fetch('pollinations', lambda attempt: url_with_seed(attempt), deadline)
+    """
+
+    def __init__(self, session, hedge_after=8.0, max_hedges=1, default_timeout=120.0, max_workers=16,
+                 recorder=None, clock=time.monotonic):
+        """
+        Args:
+            session: requests.Session the requests go through.
+            hedge_after: Seconds without a good response before the next duplicate
+                is sent; None disables hedging.
+            max_hedges: Duplicates sent at most per fetch.
+            default_timeout: Deadline of fetches that are given none.
+            max_workers: Requests in flight at once across all fetches.
+            recorder: LatencyRecorder to add samples to.
+        """
+        self.session = session
+        self.hedge_after = hedge_after
+        self.max_hedges = max_hedges if hedge_after is not None else 0
+        self.default_timeout = default_timeout
+        self.recorder = recorder or LatencyRecorder()
+        self.clock = clock
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fetch')
+        self.stats = {'fetches': 0, 'hedges': 0, 'hedge_wins': 0, 'deadline_exceeded': 0}
+        self._lock = threading.Lock()
+
+    def fetch(self, source, url_for, deadline=None, validate=None, max_hedges=None):
+        """
+        Fetch the body of the first good response.
+
+        Args:
+            source: Name latencies are recorded under.
+            url_for: Callable taking the attempt number (0 for the original
+                request, 1.. for duplicates) and returning the URL.
+            deadline: Time on the fetcher's clock to give up at.
+            validate: Callable(bytes) -> bool; a body failing it is not good.
+            max_hedges: Duplicates allowed for this fetch instead of the fetcher's.
+
+        Returns:
+            bytes: The winning response body
+
+        Raises:
+            DeadlineExceeded: No good response before the deadline, or every
+                attempt failed.
+        """
+        start = self.clock()
+        deadline = deadline if deadline is not None else start + self.default_timeout
+        cancelled = threading.Event()
+        futures = {}
+        attempt = 0
+        max_hedges = self.max_hedges if max_hedges is None or self.hedge_after is None else max_hedges
+        next_hedge = start + self.hedge_after if max_hedges else math.inf
+        with self._lock:
+            self.stats['fetches'] += 1
+        try:
+            futures[self.executor.submit(self._get, url_for(0), deadline, cancelled)] = 0
+            while True:
+                now = self.clock()
+                if now >= deadline:
+                    break
+                if not futures or now >= next_hedge:
+                    # Slow or failed so far: send a duplicate if any are left
+                    if attempt >= max_hedges:
+                        if not futures:
+                            break
+                        next_hedge = math.inf
+                    else:
+                        attempt += 1
+                        with self._lock:
+                            self.stats['hedges'] += 1
+                        futures[self.executor.submit(self._get, url_for(attempt), deadline, cancelled)] = attempt
+                        next_hedge = now + self.hedge_after
+                done, _ = wait(list(futures), timeout=max(min(deadline, next_hedge) - now, 0),
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    winner = futures.pop(future)
+                    try:
+                        content = future.result()
+                    except Exception:
+                        continue
+                    if content is not None and (validate is None or validate(content)):
+                        self.recorder.record(source, self.clock() - start, 'hedged' if winner else 'ok')
+                        if winner:
+                            with self._lock:
+                                self.stats['hedge_wins'] += 1
+                        return content
+        finally:
+            # Losers stop reading at their next chunk and close their connections
+            cancelled.set()
+        outcome = 'deadline' if self.clock() >= deadline else 'failed'
+        self.recorder.record(source, self.clock() - start, outcome)
+        if outcome == 'deadline':
+            with self._lock:
+                self.stats['deadline_exceeded'] += 1
+        raise DeadlineExceeded(f"{source}: no good response after {self.clock() - start:.1f}s "
+                               f"and {attempt + 1} request(s)")
+
+    def _get(self, url, deadline, cancelled):
+        """Body of a 200 response, or None if cancelled or not OK"""
+        timeout = (CONNECT_TIMEOUT, max(deadline - self.clock(), 0.1))
+        with self.session.get(url, stream=True, timeout=timeout) as response:
+            if response.status_code != 200:
+                return None
+            chunks = []
+            for chunk in response.iter_content(chunk_size=CHUNK_BYTES):
+                if cancelled.is_set() or self.clock() >= deadline:
+                    return None
+                chunks.append(chunk)
+            return b''.join(chunks)
@@ -4,29 +4,131 @@ import requests
 import os
 import re
 import time
+import math
+import random
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from workspace import Workspace
+from hedged_fetch import DeadlineExceeded, HedgedFetcher
+
+# Headers to mimic a browser request
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Connection': 'keep-alive',
+}
+IMAGE_URL_PATTERN = re.compile(r'https?://[^"\']+(?:jpg|jpeg|png|gif)', re.IGNORECASE)
+# JPEG start-of-frame markers carrying the image dimensions
+JPEG_SOF_MARKERS = {0xc0, 0xc1, 0xc2, 0xc3, 0xc5, 0xc6, 0xc7, 0xc9, 0xca, 0xcb, 0xcd, 0xce, 0xcf}
+PROBE_MAX_BYTES = 64 * 1024
+PROBE_CHUNK_BYTES = 4 * 1024
+POLLINATIONS_URL = 'https://image.pollinations.ai'
+GOOGLE_URL = 'https://www.google.com'
 
 class ImageDownloader:
     """
     Downloads images from Google Images for given search terms.
     """
 
-    def __init__(self):
+    def __init__(self, pool_size=16, hash_index=None, pollinations_url=POLLINATIONS_URL, google_url=GOOGLE_URL,
+                 asset_index=None, hedge_after=8.0, max_hedges=1, fetch_timeout=120.0, fallback_threshold=None,
+                 latency_recorder=None):
          self.image_urls = []
-    def create_images(self, prompts, topic):
+         # Base URLs, overridable to point at stand-ins (see stub_services.py)
+         self.pollinations_url = pollinations_url.rstrip('/')
+         self.google_url = google_url.rstrip('/')
+         # Optional AssetHashIndex consulted before an image is accepted
+         self.hash_index = hash_index
+         # Optional AssetReuseIndex searched for an earlier asset with a similar query before fetching
+         self.asset_index = asset_index
+         # One pooled session so probes and downloads reuse connections
+         self.session = requests.Session()
+         adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+         self.session.mount('http://', adapter)
+         self.session.mount('https://', adapter)
+         self.session.headers.update(BROWSER_HEADERS)
+         # Deadline-bound downloads; slow Pollinations generations get a duplicate with another seed
+         self.fetcher = HedgedFetcher(self.session, hedge_after=hedge_after, max_hedges=max_hedges,
+                                      default_timeout=fetch_timeout, max_workers=pool_size,
+                                      recorder=latency_recorder)
+         # Similarity accepted from the asset index when a fetch runs out of time (None: the index's own)
+         self.fallback_threshold = fallback_threshold
+    def create_images(self, prompts, topic, max_attempts=3, workspace=None, budget=None):
+        for idx, prompt in enumerate(prompts, 1):
+            self.create_image(idx, prompt, topic, max_attempts, workspace,
+                              deadline=budget.start() if budget is not None else None)
+    def create_image(self, idx, prompt, topic, max_attempts=3, workspace=None, deadline=None):
+        """
+        Generate the image for one scene with Pollinations.
+
+        The image is saved in the images folder of workspace (the shared temp
+        folder when None). A generation still running after hedge_after gets a
+        duplicate with another seed; if no image is accepted by deadline (see
+        FetchBudget), the most similar asset in the asset index stands in.
+
+        Returns:
+            str: Path of the accepted image, or None
+        """
         width=1080
         height=1920
         model='flux' 
         seed=None
-        for idx, prompt in enumerate(prompts, 1):
-            prompt = topic+" "+prompt
-            url = f"https://image.pollinations.ai/prompt/{prompt}?width={width}&height={height}&model={model}&seed={seed}"
-            response = requests.get(url)
-            filename = f'{idx:02d}.jpg'
-            filepath = os.path.join('temp', 'images', filename) 
+        prompt = topic+" "+prompt
+        filename = f'{idx:02d}.jpg'
+        filepath = (workspace or Workspace()).path('images', filename)
+        if self.reuse_asset(prompt, filepath):
+            return filepath
+        def url_for(attempt, hedge):
+            # A fresh seed gives a different generation when one is rejected or hedged
+            seed = None if attempt == 0 and hedge == 0 else random.randint(0, 2**31 - 1)
+            return f"{self.pollinations_url}/prompt/{prompt}?width={width}&height={height}&model={model}&seed={seed}"
+        for attempt in range(max_attempts):
+            try:
+                content = self.fetcher.fetch('pollinations', lambda hedge: url_for(attempt, hedge), deadline,
+                                             validate=is_image)
+            except DeadlineExceeded as e:
+                print(f"Pollinations failed for '{prompt}': {e}")
+                if self.fetcher.clock() >= (deadline or math.inf):
+                    break
+                continue
             with open(filepath, 'wb') as file:
-                file.write(response.content)
+                file.write(content)
+            if self.accept_asset(filepath):
                 print(f"created using POllinationAI: {filepath}")
-    def download_images(self, search_terms, num_results_per_term=1, max_retries=5):
+                self.keep_asset(filepath, prompt, tags=[topic] if topic else ())
+                return filepath
+        return self.fallback_asset(prompt, filepath)
+    def accept_asset(self, filepath):
+        """
+        Check a downloaded file against the hash index; delete it if rejected.
+
+        Returns:
+            bool: True if the file may be used
+        """
+        if self.hash_index is None:
+            return True
+        accepted, reason = self.hash_index.check_asset(filepath)
+        if not accepted:
+            print(f"Rejected {filepath}: {reason}")
+            os.remove(filepath)
+        return accepted
+    def reuse_asset(self, query, filepath):
+        """Place a library image fetched for a similar query at filepath; False if there is none"""
+        return self.asset_index is not None and self.asset_index.find(query, 'image', filepath) is not None
+    def fallback_asset(self, query, filepath):
+        """Closest library image for a fetch that ran out of time or candidates, or None"""
+        if self.asset_index is None:
+            return None
+        return self.asset_index.find(query, 'image', filepath, threshold=self.fallback_threshold)
+    def keep_asset(self, filepath, query, tags=()):
+        """Add an accepted image to the reuse library"""
+        if self.asset_index is not None:
+            self.asset_index.add(filepath, query, 'image', tags)
+    def download_images(self, search_terms, num_results_per_term=1, max_retries=5, target_size=(1080, 1920),
+                        workspace=None):
         """
         Downloads images for given search terms.
 
@@ -34,48 +136,62 @@ class ImageDownloader:
             search_terms: List of search keywords.
             num_results_per_term: Number of images to download per term.
             max_retries: Maximum number of retries for failed downloads.
+            target_size: (width, height) the images should fill without upscaling.
+            workspace: Workspace whose images folder receives the files.
         """
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Connection': 'keep-alive',
-        }
-        
         for idx, term in enumerate(search_terms, 1):
-            keyword =term+ " HD vertical image "
-            
-            print(f"\nSearching for '{keyword}'...")
-            
-            # Get verified image URLs
-            verified_urls = self.verify_image_urls(self.get_image_urls(keyword))
-
-            if verified_urls:
-                #create file name
-                filename = f'{idx:02d}.jpg'
-                filepath = os.path.join('temp', 'images', filename) 
-                retries = 0
-                #Download Image 
+            self.download_image(idx, term, max_retries, target_size, workspace)
+
+    def download_image(self, idx, term, max_retries=5, target_size=(1080, 1920), workspace=None, deadline=None):
+        """
+        Search for and download the image for one scene.
+
+        Downloads stop at deadline; the most similar asset in the asset index
+        then stands in.
+
+        Returns:
+            str: Path of the accepted image, or None
+        """
+        keyword =term+ " HD vertical image "
+        filepath = (workspace or Workspace()).path('images', f'{idx:02d}.jpg')
+        if self.reuse_asset(term, filepath):
+            return filepath
+        
+        print(f"\nSearching for '{keyword}'...")
+        
+        # Get verified image URLs
+        verified_urls = self.verify_image_urls(self.get_image_urls(keyword), target_size=target_size)
+
+        if verified_urls:
+            #Download the best candidate that passes the hash index
+            for url in verified_urls[:max_retries]:
                 try:
-                    response = requests.get(verified_urls[0], headers=headers)
-                    response.raise_for_status()
+                    # The next candidate is the better hedge for a slow host, so no duplicates here
+                    content = self.fetcher.fetch('google', lambda hedge: url, deadline, validate=is_image,
+                                                 max_hedges=0)
                     with open(filepath, 'wb') as f:
-                        f.write(response.content)
-                    print(f"Downloaded: {filepath}")
-                    
+                        f.write(content)
                 except Exception as e:
-                        print(f"Error downloading {verified_urls[0]}: {e}")
-            else:
-                print(f"No Verified image URLs found")
+                    print(f"Error downloading {url}: {e}")
+                    if self.fetcher.clock() >= (deadline or math.inf):
+                        break
+                    continue
+                if self.accept_asset(filepath):
+                    print(f"Downloaded: {filepath}")
+                    self.keep_asset(filepath, term)
+                    return filepath
+        else:
+            print(f"No Verified image URLs found")
+        return self.fallback_asset(term, filepath)
 
 
-    def get_image_urls(self, keyword, num_images=5):
+    def get_image_urls(self, keyword, num_images=20):
         """
         Get image URLs directly from Google Images
         
         Args:
             query (str): Search query for images
-            num_images (int): Number of images to retrieve
+            num_images (int): Number of candidate URLs to collect
         
         Returns:
             list: List of image URLs
@@ -83,84 +199,203 @@ class ImageDownloader:
         print("keyword for search is - "+keyword)
         # Format the search URL
         #search_url = f"https://www.google.com/search?q={query}&tbm=isch"
-        search_url = f"https://www.google.com/search?as_st=y&as_q={keyword}&as_epq=&as_oq=&as_eq=&imgsz=xga&imgar=t%7Cxt&imgcolor=&imgtype=&cr=&as_sitesearch=&as_filetype=&tbs=&safe=active&udm=2"
-        
-        # Headers to mimic a browser request
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Connection': 'keep-alive',
-        }
+        search_url = f"{self.google_url}/search?as_st=y&as_q={keyword}&as_epq=&as_oq=&as_eq=&imgsz=xga&imgar=t%7Cxt&imgcolor=&imgtype=&cr=&as_sitesearch=&as_filetype=&tbs=&safe=active&udm=2"
         
         try:
             # Make the request
             print("Fetching search results..." +search_url)
-            response = requests.get(search_url, headers=headers, timeout=10)
+            response = self.session.get(search_url, timeout=10)
             response.raise_for_status()
             
             print("Parsing response...")
-            # Find image URLs using regex
+            # Scan lazily and stop as soon as enough candidates are collected
             image_urls = []
-            pattern = r'https?://[^"\']+(?:jpg|jpeg|png|gif)'
-            matches = re.findall(pattern, response.text, re.IGNORECASE)
-            
-            # Filter and clean URLs
-            for url in matches:
+            seen = set()
+            for match in IMAGE_URL_PATTERN.finditer(response.text):
+                url = match.group(0)
                 # Skip small thumbnails and Google's own URLs
-                if 'gstatic.com' not in url and 'google.com' not in url:
-                    if url not in image_urls:  # Avoid duplicates
-                        image_urls.append(url)
-                        #print(f"Found image URL: {url}")
-                        if len(image_urls) >= num_images:
-                            break
+                if 'gstatic.com' in url or 'google.com' in url or url in seen:
+                    continue
+                seen.add(url)
+                image_urls.append(url)
+                if len(image_urls) >= num_images:
+                    break
             
             return image_urls
             
         except Exception as e:
             print(f"Error occurred: {str(e)}")
             return []
-    def verify_image_urls(self,urls):
+
+    def verify_image_urls(self, urls, target_size=(1080, 1920), max_workers=8):
         """
-        Verify that the URLs actually point to accessible images
+        Verify candidate URLs concurrently and rank them by fitness for the video.
+
+        Each candidate is probed with a ranged GET that reads only the first
+        few KB, enough to parse the image dimensions from its header. As soon
+        as a portrait image at or above target_size is found, the remaining
+        probes are cancelled.
         
         Args:
             urls (list): List of image URLs to verify
+            target_size (tuple): Output (width, height) the image will fill
+            max_workers (int): Number of concurrent probes
         
         Returns:
-            list: List of verified image URLs
+            list: Verified image URLs, best candidate first
         """
-        verified_urls = []
-        
-        for url in urls:
-            try:
-                # Try to fetch the header of the image
-                response = requests.head(url, timeout=5)
-                content_type = response.headers.get('content-type', '')
-                
-                # Check if it's actually an image
-                if 'image' in content_type:
-                    verified_urls.append(url)
-                    #print(f"Verified URL: {url}")
+        if not urls:
+            return []
+
+        stop = threading.Event()
+        candidates = []
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(urls)))
+        futures = {executor.submit(self.probe_image_size, url, stop): (position, url)
+                   for position, url in enumerate(urls)}
+        try:
+            for future in as_completed(futures):
+                position, url = futures[future]
+                try:
+                    size = future.result()
+                except Exception as e:
+                    print(f"Failed to verify URL {url}: {str(e)}")
+                    continue
+                if size is None:
+                    continue
+                candidates.append((image_fit_score(size, target_size), position, url))
+                if is_good_fit(size, target_size):
+                    # Good enough: stop in-flight probes and drop queued ones
+                    stop.set()
                     break
-                
-            except Exception as e:
-                print(f"Failed to verify URL {url}: {str(e)}")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        candidates.sort(key=lambda c: (c[0], -c[1]), reverse=True)
+        return [url for _, _, url in candidates]
+
+    def probe_image_size(self, url, stop=None, max_bytes=PROBE_MAX_BYTES):
+        """
+        Read just enough of an image to learn its dimensions.
+
+        Args:
+            url (str): Image URL
+            stop (threading.Event): Abort early when set
+            max_bytes (int): Give up after reading this many bytes
+
+        Returns:
+            tuple: (width, height), or None if not an image or unparseable
+        """
+        headers = {'Range': f'bytes=0-{max_bytes - 1}'}
+        with self.session.get(url, headers=headers, stream=True, timeout=5) as response:
+            if response.status_code not in (200, 206):
+                return None
+            if 'image' not in response.headers.get('content-type', ''):
+                return None
+            data = b''
+            # Servers that ignore Range send the whole body; stop reading early anyway
+            for chunk in response.iter_content(chunk_size=PROBE_CHUNK_BYTES):
+                if stop is not None and stop.is_set():
+                    return None
+                data += chunk
+                size = sniff_image_size(data)
+                if size is not None or len(data) >= max_bytes:
+                    return size
+            return sniff_image_size(data)
+
+
+def sniff_image_size(data):
+    """
+    Parse (width, height) from the leading bytes of a JPEG, PNG, GIF, WebP or BMP.
+
+    Returns None when the header is incomplete or the format is unknown.
+    """
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        if len(data) >= 24 and data[12:16] == b'IHDR':
+            return struct.unpack('>II', data[16:24])
+        return None
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        if len(data) >= 10:
+            return struct.unpack('<HH', data[6:10])
+        return None
+    if data[:2] == b'BM':
+        if len(data) >= 26:
+            width, height = struct.unpack('<ii', data[18:26])
+            return width, abs(height)
+        return None
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        chunk = data[12:16]
+        if chunk == b'VP8 ' and len(data) >= 30:
+            width, height = struct.unpack('<HH', data[26:30])
+            return width & 0x3fff, height & 0x3fff
+        if chunk == b'VP8L' and len(data) >= 25:
+            bits = int.from_bytes(data[21:25], 'little')
+            return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+        if chunk == b'VP8X' and len(data) >= 30:
+            width = int.from_bytes(data[24:27], 'little') + 1
+            height = int.from_bytes(data[27:30], 'little') + 1
+            return width, height
+        return None
+    if data[:2] == b'\xff\xd8':
+        # Walk JPEG markers until a start-of-frame segment
+        position = 2
+        while position + 4 <= len(data):
+            if data[position] != 0xff:
+                return None
+            marker = data[position + 1]
+            if marker == 0xff:
+                position += 1
                 continue
-        
-        return verified_urls
+            if marker in (0xd8, 0x01) or 0xd0 <= marker <= 0xd7:
+                position += 2
+                continue
+            length = struct.unpack('>H', data[position + 2:position + 4])[0]
+            if marker in JPEG_SOF_MARKERS:
+                if position + 9 > len(data):
+                    return None
+                height, width = struct.unpack('>HH', data[position + 5:position + 9])
+                return width, height
+            position += 2 + length
+        return None
+    return None
+
+
+def is_image(content):
+    """Whether a response body starts like an image this module can size"""
+    return sniff_image_size(content[:PROBE_MAX_BYTES]) is not None
+
+
+def is_good_fit(size, target_size):
+    """Portrait image at least as large as the target in both dimensions"""
+    width, height = size
+    return height >= width and width >= target_size[0] and height >= target_size[1]
+
+
+def image_fit_score(size, target_size):
+    """
+    Rank an image for filling target_size; higher is better.
+
+    Good fits come first, then portrait images, then by how much of the target
+    the image covers without upscaling, then by how close the aspect ratio is.
+    """
+    width, height = size
+    if width <= 0 or height <= 0:
+        return (False, False, 0.0, 0.0)
+    coverage = min(width / target_size[0], height / target_size[1], 1.0)
+    aspect_error = abs(width / height - target_size[0] / target_size[1])
+    return (is_good_fit(size, target_size), height >= width, coverage, -aspect_error)
 
 # Example usage
 if __name__ == "__main__":
     search_term = "laddu HD image"
     print(f"\nSearching for '{search_term}'...")
     
+    downloader = ImageDownloader()
     # Get image URLs
-    urls = get_image_urls(search_term)
+    urls = downloader.get_image_urls(search_term)
     
     if urls:
         print("\nVerifying URLs...")
-        verified_urls = verify_image_urls(urls)
+        verified_urls = downloader.verify_image_urls(urls)
         
         print(f"\nTop {len(verified_urls)} verified image URLs for '{search_term}':")
         for i, url in enumerate(verified_urls, 1):
@@ -0,0 +1,264 @@
+"""
+SQLite job store that hands scripts from topics_to_scripts.py to the render
+workers in automate_scripts_to_video.py.
+
+Every state change is appended to the events table, which is never updated
+or deleted; the jobs table holds the current state of each job so workers
+can claim work with a single indexed query.
+"""
+import os
+import sqlite3
+import socket
+import threading
+import time
+
+# Job states in pipeline order
+TOPIC = 'topic'
+SCRIPTED = 'scripted'
+VOICED = 'voiced'
+ASSETS_READY = 'assets_ready'
+RENDERED = 'rendered'
+FAILED = 'failed'
+STATES = (TOPIC, SCRIPTED, VOICED, ASSETS_READY, RENDERED, FAILED)
+TERMINAL_STATES = (RENDERED, FAILED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic TEXT NOT NULL UNIQUE,
+    script TEXT,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_by TEXT,
+    claimed_at REAL,
+    output TEXT,
+    error TEXT,
+    deadline REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claimable ON jobs (state, claimed_by, id);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL REFERENCES jobs (id),
+    state TEXT NOT NULL,
+    detail TEXT,
+    worker TEXT,
+    at REAL NOT NULL
+);
+"""
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+class JobStore:
+    """
+    Durable queue of video jobs shared by several processes.
+
+    Safe to open from many processes at once: the database runs in WAL mode
+    and claims happen inside an immediate transaction.
+    """
+
+    def __init__(self, path='jobs.db', timeout=30):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        columns = {row['name'] for row in self.conn.execute('PRAGMA table_info(jobs)')}
+        if 'deadline' not in columns:
+            # Stores created before jobs had deadlines
+            try:
+                self.conn.execute('ALTER TABLE jobs ADD COLUMN deadline REAL')
+            except sqlite3.OperationalError:
+                pass  # another process added it first
+
+    def close(self):
+        self.conn.close()
+
+    def _transaction(self):
+        return _Transaction(self)
+
+    def _log(self, job_id, state, detail=None, worker=None):
+        self.conn.execute(
+            'INSERT INTO events (job_id, state, detail, worker, at) VALUES (?, ?, ?, ?, ?)',
+            (job_id, state, detail, worker, time.time())
+        )
+
+    def add_topics(self, topics):
+        """Register topics that still need a script. Known topics are left alone."""
+        now = time.time()
+        added = 0
+        with self._transaction():
+            for topic in topics:
+                cursor = self.conn.execute(
+                    'INSERT OR IGNORE INTO jobs (topic, state, created_at, updated_at) VALUES (?, ?, ?, ?)',
+                    (topic, TOPIC, now, now)
+                )
+                if cursor.rowcount:
+                    added += 1
+                    self._log(cursor.lastrowid, TOPIC)
+        return added
+
+    def add_script(self, topic, script):
+        """Store a generated script and make the job claimable by render workers"""
+        now = time.time()
+        with self._transaction():
+            self.conn.execute(
+                'INSERT OR IGNORE INTO jobs (topic, state, created_at, updated_at) VALUES (?, ?, ?, ?)',
+                (topic, TOPIC, now, now)
+            )
+            row = self.conn.execute('SELECT id, state FROM jobs WHERE topic = ?', (topic,)).fetchone()
+            if row['state'] != TOPIC:
+                return row['id']
+            self.conn.execute(
+                'UPDATE jobs SET script = ?, state = ?, updated_at = ? WHERE id = ?',
+                (script, SCRIPTED, now, row['id'])
+            )
+            self._log(row['id'], SCRIPTED)
+            return row['id']
+
+    def scripted_topics(self):
+        """Topics that already have a script, so a generator run can resume"""
+        rows = self.conn.execute('SELECT topic FROM jobs WHERE script IS NOT NULL').fetchall()
+        return {row['topic'] for row in rows}
+
+    def claim(self, worker=None, states=(SCRIPTED,), order=None):
+        """
+        Atomically take the oldest unclaimed job in one of states.
+
+        Args:
+            order: Optional function putting the claimable jobs (dicts) in the
+                order to start them, e.g. shortest predicted first; the first is taken.
+
+        Returns:
+            dict: The claimed job, or None if nothing is ready
+        """
+        worker = worker or default_worker_id()
+        placeholders = ','.join('?' * len(states))
+        with self._transaction():
+            query = f'SELECT * FROM jobs WHERE state IN ({placeholders}) AND claimed_by IS NULL ORDER BY id'
+            if order is None:
+                row = self.conn.execute(query + ' LIMIT 1', tuple(states)).fetchone()
+            else:
+                rows = {row['id']: row for row in self.conn.execute(query, tuple(states)).fetchall()}
+                ordered = order([dict(row) for row in rows.values()])
+                row = rows[ordered[0]['id']] if ordered else None
+            if row is None:
+                return None
+            now = time.time()
+            self.conn.execute(
+                'UPDATE jobs SET claimed_by = ?, claimed_at = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?',
+                (worker, now, now, row['id'])
+            )
+            self._log(row['id'], row['state'], 'claimed', worker)
+        job = dict(row)
+        job['claimed_by'] = worker
+        job['attempts'] += 1
+        return job
+
+    def advance(self, job_id, state, detail=None, output=None, worker=None):
+        """Move a claimed job to state. Terminal states release the claim."""
+        if state not in STATES:
+            raise ValueError(f"Unknown job state '{state}'")
+        now = time.time()
+        with self._transaction():
+            if state in TERMINAL_STATES:
+                self.conn.execute(
+                    'UPDATE jobs SET state = ?, output = COALESCE(?, output), error = ?, '
+                    'claimed_by = NULL, claimed_at = NULL, updated_at = ? WHERE id = ?',
+                    (state, output, detail if state == FAILED else None, now, job_id)
+                )
+            else:
+                # Progress also renews the claim's lease
+                self.conn.execute(
+                    'UPDATE jobs SET state = ?, output = COALESCE(?, output), claimed_at = ?, updated_at = ? WHERE id = ?',
+                    (state, output, now, now, job_id)
+                )
+            self._log(job_id, state, detail, worker)
+
+    def fail(self, job_id, error, max_attempts=3, worker=None):
+        """Record a failed attempt; the job is retried until max_attempts is reached"""
+        row = self.conn.execute('SELECT attempts FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row['attempts'] >= max_attempts:
+            self.advance(job_id, FAILED, detail=error, worker=worker)
+        else:
+            self.release(job_id, detail=f"retry after error: {error}", worker=worker)
+
+    def release(self, job_id, detail=None, worker=None):
+        """Put a job back to scripted and unclaimed so another worker starts it over"""
+        with self._transaction():
+            self.conn.execute(
+                'UPDATE jobs SET state = ?, claimed_by = NULL, claimed_at = NULL, updated_at = ? WHERE id = ?',
+                (SCRIPTED, time.time(), job_id)
+            )
+            self._log(job_id, SCRIPTED, detail or 'released', worker)
+
+    def set_deadline(self, topic, deadline):
+        """
+        Set when a job's video is due (epoch seconds, None to clear).
+
+        Returns:
+            bool: Whether the topic is known
+        """
+        with self._transaction():
+            cursor = self.conn.execute('UPDATE jobs SET deadline = ? WHERE topic = ?', (deadline, topic))
+        return cursor.rowcount > 0
+
+    def reclaim_stale(self, lease_seconds=3600):
+        """Release jobs whose worker has not reported progress within lease_seconds"""
+        cutoff = time.time() - lease_seconds
+        placeholders = ','.join('?' * len(TERMINAL_STATES))
+        rows = self.conn.execute(
+            f'SELECT id FROM jobs WHERE claimed_by IS NOT NULL AND claimed_at < ? AND state NOT IN ({placeholders})',
+            (cutoff,) + TERMINAL_STATES
+        ).fetchall()
+        for row in rows:
+            self.release(row['id'], detail='lease expired')
+        return len(rows)
+
+    def counts(self):
+        """Number of jobs per state"""
+        rows = self.conn.execute('SELECT state, COUNT(*) AS n FROM jobs GROUP BY state').fetchall()
+        counts = {state: 0 for state in STATES}
+        counts.update({row['state']: row['n'] for row in rows})
+        return counts
+
+    def jobs(self, state=None):
+        if state is None:
+            rows = self.conn.execute('SELECT * FROM jobs ORDER BY id').fetchall()
+        else:
+            rows = self.conn.execute('SELECT * FROM jobs WHERE state = ? ORDER BY id', (state,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def history(self, job_id):
+        rows = self.conn.execute('SELECT * FROM events WHERE job_id = ? ORDER BY id', (job_id,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def export_excel(self, excel_path):
+        """Optional export of topics and scripts in the old viral_scripts.xlsx layout"""
+        import pandas as pd
+        rows = [{"Topic": job['topic'], "Script": job['script']} for job in self.jobs() if job['script']]
+        pd.DataFrame(rows).to_excel(excel_path, index=False)
+        print("Scripts exported to:", excel_path)
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, serialised within the process by the store lock"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __enter__(self):
+        self.store.lock.acquire()
+        self.store.conn.execute('BEGIN IMMEDIATE')
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.store.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self.store.lock.release()
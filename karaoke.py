@@ -0,0 +1,162 @@
+"""
+Word-by-word highlighted ("karaoke") captions.
+
+TTS word boundaries are grouped into cues. Each cue is laid out once into
+two sprites of the same shape: the base caption and a fully highlighted
+copy. On screen a cue is its base sprite plus, for each word, a small patch
+cut from the highlighted copy at that word's rectangle and shown only while
+the word is spoken. Compositing a frame therefore blits the cached base
+sprite and one word-sized patch, about what a static caption costs, instead
+of redrawing the caption for every highlight state.
+
+Word timings are stored as JSON next to the SRT:
+
+    [{"start": 0.1, "end": 1.9, "text": "Honey never spoils",
+      "words": [["Honey", 0.1, 0.5], ["never", 0.5, 0.9], ["spoils", 0.9, 1.9]]}]
+"""
+import json
+import numpy as np
+from moviepy import ImageClip
+from PIL import Image, ImageDraw, ImageFont
+
+WORDS_SUFFIX = '.words.json'
+MAX_WORDS_PER_CUE = 6
+MAX_GAP = 0.4  # seconds of silence that end a cue
+SENTENCE_END = ('.', '!', '?', '।')
+
+
+def group_words(words, max_words=MAX_WORDS_PER_CUE, max_gap=MAX_GAP, text=None):
+    """
+    Group (text, start, end) word timings into cues.
+
+    A cue ends after max_words words, before a pause longer than max_gap, and
+    after a word that ends a sentence in text (boundaries carry no punctuation).
+
+    Returns:
+        list: (start, end, text, words) per cue
+    """
+    sentence_ends = set()
+    if text:
+        position = 0
+        for index, (word, _, _) in enumerate(words):
+            found = text.find(word, position)
+            if found < 0:
+                continue
+            position = found + len(word)
+            if text[position:position + 1] in SENTENCE_END:
+                sentence_ends.add(index)
+    cues = []
+    current = []
+    for index, word in enumerate(words):
+        if current and (len(current) >= max_words or word[1] - current[-1][2] > max_gap):
+            cues.append(current)
+            current = []
+        current.append(word)
+        if index in sentence_ends:
+            cues.append(current)
+            current = []
+    if current:
+        cues.append(current)
+    return [(cue[0][1], cue[-1][2], ' '.join(word for word, _, _ in cue), cue) for cue in cues]
+
+
+def save_words(cues, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump([{'start': start, 'end': end, 'text': text, 'words': [list(word) for word in words]}
+                   for start, end, text, words in cues], f, ensure_ascii=False)
+
+
+def load_words(path):
+    """Cues saved by save_words, as (start, end, text, words) tuples"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [(cue['start'], cue['end'], cue['text'], [tuple(word) for word in cue['words']])
+                for cue in json.load(f)]
+
+
+def srt_time(seconds):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+
+
+def save_srt(cues, path):
+    """Write cues as plain SRT, so the static caption mode can use the same timings"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for number, (start, end, text, _) in enumerate(cues, 1):
+            f.write(f"{number}\n{srt_time(start)} --> {srt_time(end)}\n{text}\n\n")
+
+
+def layout_cue(words, font, width, stroke_width=2, margin=10, line_spacing=4):
+    """
+    Place the words of a cue in centred lines no wider than width.
+
+    Returns:
+        tuple: (list of word boxes (left, top, right, bottom), sprite height)
+    """
+    space = font.getlength(' ')
+    ascent, descent = font.getmetrics()
+    line_height = ascent + descent + 2 * stroke_width
+    lines = [[]]
+    line_width = 0
+    for word in words:
+        word_width = font.getlength(word) + 2 * stroke_width
+        if lines[-1] and line_width + space + word_width > width - 2 * margin:
+            lines.append([])
+            line_width = 0
+        line_width += (space if lines[-1] else 0) + word_width
+        lines[-1].append(word_width)
+    boxes = []
+    for number, line in enumerate(lines):
+        left = (width - (sum(line) + space * (len(line) - 1))) / 2
+        top = margin + number * (line_height + line_spacing)
+        for word_width in line:
+            boxes.append((int(left), top, int(np.ceil(left + word_width)), top + line_height))
+            left += word_width + space
+    return boxes, 2 * margin + len(lines) * line_height + (len(lines) - 1) * line_spacing
+
+
+def render_sprite(words, boxes, size, font, color, stroke_color, stroke_width):
+    sprite = Image.new('RGBA', size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(sprite)
+    for word, (left, top, _, _) in zip(words, boxes):
+        draw.text((left + stroke_width, top + stroke_width), word, font=font, fill=color,
+                  stroke_width=stroke_width, stroke_fill=stroke_color)
+    return np.asarray(sprite)
+
+
+def rgba_clip(pixels, start, end, position):
+    """ImageClip of an RGBA array, with its alpha as mask"""
+    mask = ImageClip(pixels[:, :, 3] / 255.0, is_mask=True)
+    return (ImageClip(np.ascontiguousarray(pixels[:, :, :3])).with_mask(mask)
+            .with_start(start).with_end(end).with_position(position))
+
+
+def cue_clips(cue, video_size, font_path, font_size=60, color='white', highlight_color='yellow',
+              stroke_color='black', stroke_width=2, top=None):
+    """
+    Clips showing one cue with its words highlighted as they are spoken.
+
+    Returns:
+        list: The base sprite clip followed by one highlight patch per word
+    """
+    start, end, _, words = cue
+    width = video_size[0]
+    top = int(video_size[1] * 0.7) if top is None else top
+    font = ImageFont.truetype(font_path, font_size)
+    texts = [word for word, _, _ in words]
+    boxes, height = layout_cue(texts, font, width, stroke_width)
+    base = render_sprite(texts, boxes, (width, height), font, color, stroke_color, stroke_width)
+    highlighted = render_sprite(texts, boxes, (width, height), font, highlight_color, stroke_color, stroke_width)
+    # Long cues are raised rather than cut off at the bottom of the frame
+    top = max(min(top, video_size[1] - height), 0)
+
+    clips = [rgba_clip(base, start, end, (0, top))]
+    for (_, word_start, word_end), (left, box_top, right, bottom) in zip(words, boxes):
+        if word_end <= word_start:
+            continue
+        left, right = max(left, 0), min(right, width)
+        patch = highlighted[box_top:bottom, left:right]
+        clips.append(rgba_clip(patch, word_start, min(word_end, end), (left, top + box_top)))
+    return clips
@@ -0,0 +1,149 @@
+"""
+Keyword and search-query extraction for scripts and scenes.
+
+The spaCy model is loaded once per process and shared by every extractor in
+it. Texts are pushed through nlp.pipe in batches, and results are memoized
+by the model and a hash of the text, so re-rendering a script or repeating a
+scene costs nothing.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from functools import lru_cache
+from shared_file import write_json
+
+logger = logging.getLogger(__name__)
+
+# Entity labels that make useless stock-footage queries
+SKIPPED_ENTITY_LABELS = {'CARDINAL', 'ORDINAL', 'PERCENT', 'MONEY', 'QUANTITY', 'TIME', 'DATE'}
+
+
+@lru_cache(maxsize=None)
+def load_model(name):
+    """Load a spaCy pipeline once per process; None if it is not installed"""
+    import spacy
+    try:
+        # Only the entity recognizer and parser (for noun chunks) are needed
+        return spacy.load(name, exclude=['lemmatizer', 'textcat'])
+    except OSError:
+        logger.warning(f"spaCy model '{name}' is not installed, falling back to script chunks as queries")
+        return None
+
+
+def text_key(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def chunk_script(script, words_per_scene=10):
+    """Split a script into scenes of words_per_scene words; the last may be shorter"""
+    words = script.split()
+    return [' '.join(words[i:i + words_per_scene]) for i in range(0, len(words), words_per_scene)]
+
+
+def doc_keywords(doc):
+    """
+    Keywords of one parsed text, most useful first.
+
+    Named entities come first, then noun chunks stripped of stop words, each
+    in order of appearance. Duplicates are dropped case-insensitively.
+    """
+    candidates = [ent.text for ent in doc.ents if ent.label_ not in SKIPPED_ENTITY_LABELS]
+    if doc.has_annotation('DEP'):
+        for chunk in doc.noun_chunks:
+            words = [token.text for token in chunk if not (token.is_stop or token.is_punct)]
+            if words:
+                candidates.append(' '.join(words))
+    keywords = []
+    seen = set()
+    for keyword in candidates:
+        keyword = keyword.strip()
+        if len(keyword) > 1 and keyword.lower() not in seen:
+            seen.add(keyword.lower())
+            keywords.append(keyword)
+    return keywords
+
+
+class KeywordExtractor:
+    """
+    Batched, memoized keyword extraction with spaCy.
+
+    Example:
+        extractor = KeywordExtractor(batch_size=64)
+        queries = extractor.queries(script)
+    """
+
+    def __init__(self, model='en_core_web_sm', batch_size=64, n_process=1, max_terms=3,
+                 cache_path=None, nlp=None):
+        """
+        Args:
+            model: spaCy pipeline name, loaded on first use.
+            batch_size: Texts per nlp.pipe batch.
+            n_process: Processes nlp.pipe may fork; worth it only for large batches.
+            max_terms: Keywords joined into one search query.
+            cache_path: JSON file to persist results in, or None for memory only.
+            nlp: Already loaded pipeline to use instead of model.
+        """
+        self.model = model
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.max_terms = max_terms
+        self.cache_path = cache_path
+        self.cache = {}
+        self.stats = {'hits': 0, 'misses': 0}
+        self._nlp = nlp
+        self._lock = threading.Lock()
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, 'r') as f:
+                self.cache = json.load(f)
+
+    @property
+    def nlp(self):
+        if self._nlp is None:
+            self._nlp = load_model(self.model) or False
+        return self._nlp
+
+    def extract_many(self, texts):
+        """
+        Keywords for each text, in order.
+
+        Texts not seen before go through a single nlp.pipe call. Without a
+        model every text yields an empty list, which is not cached, so the
+        texts are extracted once the model is installed.
+
+        Returns:
+            list: One list of keywords per text
+        """
+        # Another model extracts other keywords
+        keys = [f"{self.model}:{text_key(text)}" for text in texts]
+        with self._lock:
+            missing = {key: text for key, text in zip(keys, texts) if key not in self.cache}
+            self.stats['hits'] += len(keys) - len(missing)
+            self.stats['misses'] += len(missing)
+        if missing and self.nlp:
+            docs = self.nlp.pipe(missing.values(), batch_size=self.batch_size, n_process=self.n_process)
+            results = {key: doc_keywords(doc) for key, doc in zip(missing, docs)}
+            with self._lock:
+                self.cache.update(results)
+                # One write per batch of new texts
+                self.save()
+        return [list(self.cache.get(key, [])) for key in keys]
+
+    def extract(self, text):
+        """Keywords of one text"""
+        return self.extract_many([text])[0]
+
+    def queries_for(self, scenes):
+        """One search query per scene; a scene without keywords is its own query"""
+        return [' '.join(keywords[:self.max_terms]) or scene
+                for scene, keywords in zip(scenes, self.extract_many(scenes))]
+
+    def queries(self, script, words_per_scene=10):
+        """Search queries for a script split into scenes of words_per_scene words"""
+        return self.queries_for(chunk_script(script, words_per_scene))
+
+    def save(self):
+        if not self.cache_path:
+            return
+        write_json(self.cache_path, self.cache)
@@ -0,0 +1,182 @@
+"""
+Preparing upcoming jobs while the current one renders.
+
+A batch worker alternates between network-bound stages (narration, image
+and clip downloads) and the CPU-bound render, so its cores idle during
+downloads and its network idles during encodes. A JobPrefetcher claims the
+next jobs and runs everything up to their render on a background thread,
+keeping up to lookahead prepared jobs ready; the worker takes them one by
+one and only renders.
+
+Prepared jobs hold their narration, assets and pre-encoded audio on disk, so
+preparing stops while the ready jobs exceed max_bytes or the host runs low
+on free disk or memory. Those limits never hold back a job the worker is
+waiting for: preparing it then is what the worker would have done anyway.
+Jobs are prepared one at a time and in claim order.
+"""
+import collections
+import logging
+import shutil
+import threading
+import time
+from resource_scheduler import host_memory
+
+logger = logging.getLogger(__name__)
+
+
+class JobPrefetcher:
+    """
+    Background claiming and preparing of a worker's next jobs.
+
+    Example:
+        prefetcher = JobPrefetcher(lambda: store.claim(worker), prepare, lookahead=2).start()
+        job, prepared, error = prefetcher.get()
+        ...
+        for job, prepared, error in prefetcher.stop():
+            store.release(job['id'])
+    """
+
+    def __init__(self, claim, prepare, lookahead=1, measure=None, max_bytes=None, min_free_disk=0,
+                 min_free_memory=0, disk_path='.', poll_interval=2.0):
+        """
+        Args:
+            claim: Returns the next job, or None when there is none.
+            prepare: Prepares a job for rendering and returns the prepared job.
+            lookahead: Prepared jobs kept ready.
+            measure: Bytes a prepared job holds on disk, for max_bytes.
+            max_bytes: Cap on the bytes held by ready jobs (None for no cap).
+            min_free_disk: Bytes of free disk at disk_path to leave for renders.
+            min_free_memory: Bytes of available memory to leave for renders.
+            disk_path: Path on the filesystem prepared jobs are written to.
+            poll_interval: Seconds between claims while there are no jobs, and
+                between checks while a limit holds preparing back.
+        """
+        self.claim = claim
+        self.prepare = prepare
+        self.lookahead = max(lookahead, 1)
+        self.measure = measure
+        self.max_bytes = max_bytes
+        self.min_free_disk = min_free_disk
+        self.min_free_memory = min_free_memory
+        self.disk_path = disk_path
+        self.poll_interval = poll_interval
+        # Set by stop(); prepare functions can hand it on as their cancelled event
+        self.stopping = threading.Event()
+        self._ready = collections.deque()
+        self._preparing = False
+        self._waiting = 0
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.stats = {'prepared': 0, 'failed': 0, 'held_back': 0, 'waited_seconds': 0.0}
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    @property
+    def idle(self):
+        """True when no job is ready or being prepared"""
+        with self._condition:
+            return not self._ready and not self._preparing
+
+    def get(self, timeout=None):
+        """
+        Next prepared job.
+
+        Returns:
+            tuple: (job, prepared job, exception raised while preparing or None),
+                or None if no job was ready within timeout
+        """
+        started = time.monotonic()
+        with self._condition:
+            self._waiting += 1
+            self._condition.notify_all()
+            try:
+                if not self._condition.wait_for(lambda: self._ready, timeout):
+                    return None
+                return self._ready.popleft()
+            finally:
+                self._waiting -= 1
+                self.stats['waited_seconds'] += time.monotonic() - started
+                self._condition.notify_all()
+
+    def stop(self):
+        """
+        Stop preparing, wait for the job in progress and hand back the jobs never taken.
+
+        Returns:
+            list: (job, prepared job, exception) tuples, for the caller to release and discard
+        """
+        self.stopping.set()
+        with self._condition:
+            self._condition.notify_all()
+        self._thread.join()
+        with self._condition:
+            leftovers = list(self._ready)
+            self._ready.clear()
+        return leftovers
+
+    def report(self):
+        """One-line summary for logs"""
+        return (f"Prefetch: {self.stats['prepared']} jobs prepared ahead ({self.stats['failed']} failed), "
+                f"held back {self.stats['held_back']} times, worker waited {self.stats['waited_seconds']:.1f}s")
+
+    def _ready_bytes(self):
+        if self.measure is None:
+            return 0
+        return sum(self.measure(prepared) for _, prepared, _ in list(self._ready) if prepared is not None)
+
+    def _limit_reached(self):
+        """Why another job should not be prepared yet, or None"""
+        if self.max_bytes is not None and self._ready_bytes() >= self.max_bytes:
+            return f"prepared jobs hold more than {self.max_bytes} bytes"
+        if self.min_free_disk and shutil.disk_usage(self.disk_path).free < self.min_free_disk:
+            return f"less than {self.min_free_disk} bytes free at {self.disk_path}"
+        if self.min_free_memory and host_memory() < self.min_free_memory:
+            return f"less than {self.min_free_memory} bytes of memory available"
+        return None
+
+    def _run(self):
+        held_back = False
+        while not self.stopping.is_set():
+            with self._condition:
+                self._condition.wait_for(lambda: self.stopping.is_set() or len(self._ready) < self.lookahead)
+                if self.stopping.is_set():
+                    break
+                waiting = self._waiting and not self._ready
+            reason = None if waiting else self._limit_reached()
+            if reason is not None:
+                if not held_back:
+                    self.stats['held_back'] += 1
+                    logger.info(f"Not preparing the next job: {reason}")
+                held_back = True
+                # A worker starting to wait lifts the limits, so wake up for that too
+                with self._condition:
+                    self._condition.wait_for(lambda: self.stopping.is_set() or self._waiting, self.poll_interval)
+                continue
+            held_back = False
+
+            with self._condition:
+                self._preparing = True
+            try:
+                job = self.claim()
+            except Exception as e:
+                logger.error(f"Claiming the next job failed: {e}")
+                job = None
+            if job is None:
+                with self._condition:
+                    self._preparing = False
+                self.stopping.wait(self.poll_interval)
+                continue
+
+            prepared, error = None, None
+            try:
+                prepared = self.prepare(job)
+                self.stats['prepared'] += 1
+            except Exception as e:
+                error = e
+                self.stats['failed'] += 1
+            with self._condition:
+                self._ready.append((job, prepared, error))
+                self._preparing = False
+                self._condition.notify_all()
@@ -0,0 +1,408 @@
+"""
+Long-running render daemon with a local HTTP job API.
+
+ScriptToVideo is created once, so the TTS engine, spaCy model and
+downloaders stay loaded between jobs.
+
+    POST   /jobs              {"script": ..., "method": "video", "topic": ..., "voice": "male", "language": "en"}
+    GET    /jobs/<id>         job status, with its predicted seconds and ETA
+    GET    /jobs/<id>/events  server-sent events: state changes and per-stage progress
+    DELETE /jobs/<id>         cancel a queued or running job
+    GET    /health            queue length and jobs per state
+
+Submissions identical to a queued, running or rendered job return that job
+instead of rendering again. When the queue is full, POST answers 429.
+
+With --workers auto, a ResourceScheduler decides how many jobs render at
+once and how many threads each gets.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from cost_model import queue_etas
+from resource_scheduler import GIB, JobPlan, ResourceScheduler, apply_thread_limits, limit_process_threads
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+RENDERED = 'rendered'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+TERMINAL_STATES = (RENDERED, FAILED, CANCELLED)
+
+JOB_FIELDS = {'script': None, 'method': 'video', 'topic': '', 'voice': 'male', 'language': 'en'}
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, params, key):
+        self.id = uuid.uuid4().hex[:12]
+        self.params = params
+        self.key = key
+        self.state = QUEUED
+        self.events = []
+        self.output = None
+        self.error = None
+        self.cancelled = threading.Event()
+        self.created = time.time()
+        self.started = None
+        # Cost-model prediction of the job's stages, None until the model has timings
+        self.prediction = None
+
+    @property
+    def predicted_seconds(self):
+        return self.prediction['total'] if self.prediction else None
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'state': self.state,
+            'topic': self.params['topic'],
+            'method': self.params['method'],
+            'output': self.output,
+            'error': self.error,
+            'created': self.created,
+            'predicted_seconds': self.predicted_seconds,
+        }
+
+
+def job_key(params):
+    """Identity of a submission, used to coalesce identical ones"""
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class RenderDaemon:
+    """
+    Bounded job queue in front of one ScriptToVideo instance.
+
+    Jobs run on worker threads, one at a time by default; the queue lets
+    clients submit while jobs are rendering. Concurrent workers each render
+    with their own ScriptToVideo from creator_factory, since a creator holds
+    per-job state (thread counts, the current video of the asset indexes). With a scheduler, a worker that has taken a job waits for a
+    slot, and renders it with the slot's thread counts. Each job works in
+    its own workspace, so several daemons or render workers can share a host.
+    """
+
+    def __init__(self, creator, max_queue=8, history=200, workers=1, scheduler=None, creator_factory=None):
+        """
+        Args:
+            creator: ScriptToVideo (or anything with the same create_video),
+                used by the first worker.
+            max_queue: Jobs that may wait behind the running ones.
+            history: Finished jobs kept for status queries.
+            workers: Jobs that may run at once (the scheduler's max_jobs when it is given).
+            scheduler: ResourceScheduler sizing concurrency and threads to the host.
+            creator_factory: Builds the creator of each further worker; required
+                when more than one job may run at once.
+        """
+        self.creator = creator
+        self.creator_factory = creator_factory
+        self.max_queue = max_queue
+        # Cancelled jobs stay in the queue until a worker skips them, so admission counts queued jobs instead
+        self.queue = queue.Queue()
+        self.history = history
+        self.jobs = OrderedDict()
+        self.condition = threading.Condition()
+        self.scheduler = scheduler
+        self.workers = scheduler.max_jobs if scheduler is not None else workers
+        if self.workers > 1 and creator_factory is None:
+            raise ValueError("Concurrent workers need a creator_factory, one creator per worker")
+        self.threads = []
+
+    def start(self):
+        creators = [self.creator] + [self.creator_factory() for _ in range(self.workers - 1)]
+        if self.scheduler is not None and self.workers > 1:
+            # OpenMP/BLAS pools are shared by the process, so they get the share of the most jobs at once
+            limit_process_threads(JobPlan(self.workers, self.scheduler.cores).compute_threads)
+        for creator in creators:
+            worker = threading.Thread(target=self._run, args=(creator,), daemon=True)
+            worker.start()
+            self.threads.append(worker)
+
+    def submit(self, params):
+        """
+        Queue a job, or return the existing job for an identical submission.
+
+        Returns:
+            tuple: (job, created)
+
+        Raises:
+            QueueFull: No room in the queue
+        """
+        params = {field: params.get(field, default) for field, default in JOB_FIELDS.items()}
+        if not params['script']:
+            raise ValueError("'script' is required")
+        key = job_key(params)
+        with self.condition:
+            for job in self.jobs.values():
+                if job.key == key and job.state in (QUEUED, RUNNING, RENDERED):
+                    return job, False
+            if sum(job.state == QUEUED for job in self.jobs.values()) >= self.max_queue:
+                raise QueueFull(f"{self.max_queue} jobs already waiting")
+            job = Job(params, key)
+            predict = getattr(self.creator, 'predict_job', None)
+            if predict is not None:
+                job.prediction = predict(params['script'], params['method'])
+            self.queue.put(job)
+            self.jobs[job.id] = job
+            self._record(job, 'state', {'state': QUEUED})
+            self._trim()
+        return job, True
+
+    def get(self, job_id):
+        with self.condition:
+            return self.jobs.get(job_id)
+
+    def status(self, job):
+        """
+        The job as a dict, with 'eta': when it is expected to finish (epoch
+        seconds), from the predicted times of the running jobs and the jobs
+        queued ahead of it; None while unknown or once finished.
+        """
+        with self.condition:
+            eta = None
+            if job.state == RUNNING and job.predicted_seconds is not None:
+                eta = job.started + job.predicted_seconds
+            elif job.state == QUEUED:
+                running = [other for other in self.jobs.values() if other.state == RUNNING]
+                queued = [other for other in self.jobs.values() if other.state == QUEUED]
+                etas = queue_etas(
+                    [{'id': other.id, 'job': other} for other in queued],
+                    lambda entry: entry['job'].predicted_seconds,
+                    workers=self.workers,
+                    busy_until=[other.started + (other.predicted_seconds or 0) for other in running]
+                )
+                eta = etas[job.id]
+            return dict(job.as_dict(), eta=eta)
+
+    def cancel(self, job_id):
+        """
+        Cancel a job. A queued job never starts; a running job stops before
+        its next stage (the stage in progress runs to completion).
+        """
+        with self.condition:
+            job = self.jobs.get(job_id)
+            if job is None or job.state in TERMINAL_STATES:
+                return job
+            job.cancelled.set()
+            if job.state == QUEUED:
+                self._finish(job, CANCELLED)
+            else:
+                self._record(job, 'state', {'state': RUNNING, 'cancelling': True})
+        return job
+
+    def counts(self):
+        with self.condition:
+            counts = {state: 0 for state in (QUEUED, RUNNING) + TERMINAL_STATES}
+            for job in self.jobs.values():
+                counts[job.state] += 1
+        return counts
+
+    def events(self, job, timeout=15):
+        """
+        Yield (event, data) for a job from its first event until it finishes.
+
+        Yields (None, None) as a keep-alive when nothing happened for timeout
+        seconds.
+        """
+        position = 0
+        while True:
+            with self.condition:
+                if position >= len(job.events) and job.state not in TERMINAL_STATES:
+                    self.condition.wait(timeout)
+                pending = job.events[position:]
+                finished = job.state in TERMINAL_STATES
+            position += len(pending)
+            for event in pending:
+                yield event
+            if finished and not pending:
+                return
+            if not pending:
+                yield None, None
+
+    def _record(self, job, event, data):
+        # Callers hold self.condition
+        job.events.append((event, dict(data, job=job.id, at=time.time())))
+        self.condition.notify_all()
+
+    def _finish(self, job, state, output=None, error=None):
+        job.state = state
+        job.output = output
+        job.error = error
+        self._record(job, 'state', {'state': state, 'output': output, 'error': error})
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.state in TERMINAL_STATES]
+        for job_id in finished[:max(len(finished) - self.history, 0)]:
+            del self.jobs[job_id]
+
+    def _on_stage_event(self, job, stage, status):
+        with self.condition:
+            self._record(job, 'stage', {'stage': stage, 'status': status})
+
+    def _run(self, creator):
+        while True:
+            job = self.queue.get()
+            if job.cancelled.is_set():
+                continue
+            # Only a dequeued job takes a slot, so idle workers hold none and the
+            # plan's clock, which times the job for the scheduler, starts with the job
+            plan = self.scheduler.acquire() if self.scheduler is not None else None
+            with self.condition:
+                if job.cancelled.is_set():
+                    if plan is not None:
+                        self.scheduler.release(plan, record=False)
+                    continue
+                job.state = RUNNING
+                job.started = time.time()
+                self._record(job, 'state', {'state': RUNNING})
+            if plan is not None:
+                apply_thread_limits(plan, getattr(creator, 'video_creator', None), process_wide=self.workers == 1)
+            params = job.params
+            try:
+                output = creator.create_video(
+                    params['script'],
+                    method=params['method'],
+                    topic=params['topic'],
+                    voice_gender=params['voice'],
+                    language=params['language'],
+                    on_event=lambda stage, status: self._on_stage_event(job, stage, status),
+                    cancelled=job.cancelled
+                )
+                result = (RENDERED, output, None)
+            except Exception as e:
+                result = (CANCELLED, None, None) if job.cancelled.is_set() else (FAILED, None, str(e))
+            with self.condition:
+                self._finish(job, *result)
+            logger.info(f"Job {job.id} {job.state}")
+            if plan is not None:
+                self.scheduler.release(plan, record=job.state == RENDERED)
+                logger.info(self.scheduler.report())
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _job_from_path(self):
+        parts = self.path.strip('/').split('/')
+        if len(parts) < 2 or parts[0] != 'jobs':
+            return None, parts
+        return self.server.render_daemon.get(parts[1]), parts
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            return self._send_json(404, {'error': 'not found'})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            params = json.loads(self.rfile.read(length) or b'{}')
+            job, created = self.server.render_daemon.submit(params)
+        except QueueFull as e:
+            return self._send_json(429, {'error': str(e)}, {'Retry-After': str(self.server.retry_after)})
+        except ValueError as e:
+            return self._send_json(400, {'error': str(e)})
+        self._send_json(202 if created else 200,
+                        dict(self.server.render_daemon.status(job), coalesced=not created),
+                        {'Location': f"/jobs/{job.id}"})
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/health':
+            render_daemon = self.server.render_daemon
+            counts = render_daemon.counts()
+            return self._send_json(200, {'queued': counts[QUEUED], 'jobs': counts})
+        job, parts = self._job_from_path()
+        if job is None:
+            return self._send_json(404, {'error': 'no such job'})
+        if len(parts) == 3 and parts[2] == 'events':
+            return self._stream_events(job)
+        self._send_json(200, self.server.render_daemon.status(job))
+
+    def do_DELETE(self):
+        job, _ = self._job_from_path()
+        if job is None:
+            return self._send_json(404, {'error': 'no such job'})
+        self._send_json(200, self.server.render_daemon.cancel(job.id).as_dict())
+
+    def _stream_events(self, job):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for event, data in self.server.render_daemon.events(job):
+                if event is None:
+                    self.wfile.write(b': keep-alive\n\n')
+                else:
+                    self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class RenderServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, daemon, retry_after=30):
+        super().__init__(address, _Handler)
+        self.render_daemon = daemon
+        self.retry_after = retry_after
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve video rendering over a local HTTP API')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--config', default='config.json', help='Path to configuration file')
+    parser.add_argument('--max-queue', type=int, default=8, help='Jobs that may wait; further submissions get 429')
+    parser.add_argument('--workers', type=lambda value: value if value == 'auto' else int(value), default=1,
+                        help="Jobs rendered at once, or 'auto' to fit jobs and their threads to the host's cores "
+                             "and memory and tune their number by measured throughput")
+    parser.add_argument('--job-memory', type=float, default=1.5, help="GiB one job needs, for --workers auto")
+    args = parser.parse_args()
+
+    from app import ScriptToVideo
+    scheduler = ResourceScheduler(job_memory=args.job_memory * GIB) if args.workers == 'auto' else None
+    creator = ScriptToVideo(args.config)
+    # Every worker's creator sends segments to the first one's render farm coordinator
+    daemon = RenderDaemon(creator, max_queue=args.max_queue,
+                          workers=1 if scheduler else args.workers, scheduler=scheduler,
+                          creator_factory=lambda: ScriptToVideo(args.config, render_farm=creator.render_farm))
+    daemon.start()
+    server = RenderServer((args.host, args.port), daemon)
+    print(f"Render daemon listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+"""
+Render farm mode: a coordinator splits a timeline into segment tasks that
+worker nodes pull over TCP.
+
+Scene inputs, subtitles and encoded segments travel through a content-
+addressed store: a directory every node can reach (NFS, SMB, ...) holding
+files named by their SHA-256. Workers encode segments with the same settings
+as VideoCreator.write_segmented, so the coordinator joins them by stream copy.
+
+    # on each worker node
+    python render_farm.py worker --coordinator 10.0.0.5:8765 --store /mnt/render/cas --processes 4
+"""
+import argparse
+import collections
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+import uuid
+from frame_cache import FrameCache
+from transitions import TRANSITIONS, plan_segments
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+
+# Task states
+QUEUED = 'queued'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentStore:
+    """Files keyed by SHA-256 in a directory shared by every node"""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def has(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put(self, file_path):
+        """Add a file; returns its digest. Writing an existing digest is a no-op."""
+        digest = file_digest(file_path)
+        target = self.path(digest)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # Copy under a unique name and rename, so readers never see a partial file
+            partial = f"{target}.{uuid.uuid4().hex}.partial"
+            shutil.copyfile(file_path, partial)
+            os.replace(partial, target)
+        return digest
+
+    def fetch(self, digest, directory, suffix=''):
+        """Copy a stored file into a local directory once; returns the local path"""
+        local_path = os.path.join(directory, digest + suffix)
+        if not os.path.exists(local_path):
+            os.makedirs(directory, exist_ok=True)
+            partial = f"{local_path}.{uuid.uuid4().hex}.partial"
+            shutil.copyfile(self.path(digest), partial)
+            os.replace(partial, local_path)
+        return local_path
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port or DEFAULT_PORT)
+
+
+def send_request(address, message, timeout=30):
+    """Send one JSON message to the coordinator and return its JSON reply"""
+    with socket.create_connection(address, timeout=timeout) as sock:
+        sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        with sock.makefile('r', encoding='utf-8') as reply:
+            return json.loads(reply.readline())
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            response = self.server.coordinator.handle(json.loads(line))
+        except Exception as e:
+            response = {'error': str(e)}
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class RenderCoordinator:
+    """
+    Work queue of segment tasks served to worker nodes over TCP.
+
+    A task handed to a worker is leased; workers renew the lease with
+    heartbeats while they encode. Tasks whose lease runs out (the worker was
+    lost) or that fail are queued again until max_attempts is reached.
+    """
+
+    def __init__(self, store, host='0.0.0.0', port=DEFAULT_PORT, lease_seconds=120, max_attempts=3):
+        self.store = store
+        self.host = host
+        self.port = port
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.tasks = {}
+        self.jobs = {}
+        self.queue = collections.deque()
+        self.condition = threading.Condition()
+        self.server = None
+        self.stopped = threading.Event()
+
+    @property
+    def address(self):
+        return self.server.server_address if self.server else (self.host, self.port)
+
+    def start(self):
+        """Start serving workers in background threads; returns the bound address"""
+        self.server = _Server((self.host, self.port), _RequestHandler)
+        self.server.coordinator = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        threading.Thread(target=self._reap_expired, daemon=True).start()
+        logger.info(f"Render farm coordinator listening on {self.address[0]}:{self.address[1]}")
+        return self.address
+
+    def stop(self):
+        self.stopped.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def handle(self, message):
+        """Dispatch one worker request"""
+        op = message.get('op')
+        with self.condition:
+            if op == 'get':
+                return {'task': self._lease(message.get('worker'))}
+            if op == 'heartbeat':
+                state = self.tasks.get(message['task_id'])
+                owned = state is not None and state['state'] == LEASED and state['worker'] == message.get('worker')
+                if owned:
+                    state['deadline'] = time.monotonic() + self.lease_seconds
+                return {'ok': owned}
+            if op == 'done':
+                state = self.tasks.get(message['task_id'])
+                # A late result from a worker presumed lost is as good as any other
+                if state is not None and state['state'] != DONE:
+                    state.update(state=DONE, result=message['result'], worker=message.get('worker'))
+                    self.condition.notify_all()
+                return {'ok': True}
+            if op == 'fail':
+                self._retry(message['task_id'], message.get('error', 'unknown error'))
+                return {'ok': True}
+        raise ValueError(f"Unknown op '{op}'")
+
+    def _lease(self, worker):
+        while self.queue:
+            task_id = self.queue.popleft()
+            state = self.tasks.get(task_id)
+            if state is None or state['state'] != QUEUED:
+                continue
+            state.update(state=LEASED, worker=worker, deadline=time.monotonic() + self.lease_seconds)
+            state['attempts'] += 1
+            return state['task']
+        return None
+
+    def _retry(self, task_id, error):
+        state = self.tasks.get(task_id)
+        if state is None or state['state'] in (DONE, FAILED):
+            return
+        state['error'] = error
+        if state['attempts'] >= self.max_attempts:
+            state['state'] = FAILED
+            logger.error(f"Segment task {task_id} failed after {state['attempts']} attempts: {error}")
+            self.condition.notify_all()
+        else:
+            logger.warning(f"Retrying segment task {task_id}: {error}")
+            state['state'] = QUEUED
+            state['worker'] = None
+            self.queue.append(task_id)
+
+    def _reap_expired(self):
+        interval = min(self.lease_seconds / 4, 1.0)
+        while not self.stopped.wait(interval):
+            now = time.monotonic()
+            with self.condition:
+                expired = [task_id for task_id, state in self.tasks.items()
+                           if state['state'] == LEASED and state['deadline'] < now]
+                for task_id in expired:
+                    self._retry(task_id, f"lease expired on worker {self.tasks[task_id]['worker']}")
+
+    def submit(self, job_id, tasks):
+        """Queue the segment tasks of one job; each task needs a unique 'id'"""
+        with self.condition:
+            self.jobs[job_id] = [task['id'] for task in tasks]
+            for task in tasks:
+                self.tasks[task['id']] = {'task': task, 'state': QUEUED, 'attempts': 0,
+                                          'worker': None, 'result': None, 'error': None}
+                self.queue.append(task['id'])
+
+    def wait(self, job_id, timeout=None):
+        """
+        Block until every task of a job is done.
+
+        Returns:
+            list: Result digests in task order
+
+        Raises:
+            RuntimeError: A task ran out of attempts, or timeout passed
+        """
+        task_ids = self.jobs[job_id]
+        with self.condition:
+            finished = self.condition.wait_for(
+                lambda: all(self.tasks[t]['state'] in (DONE, FAILED) for t in task_ids), timeout)
+            states = [self.tasks[t] for t in task_ids]
+            for task_id in task_ids:
+                del self.tasks[task_id]
+            del self.jobs[job_id]
+        if not finished:
+            raise RuntimeError(f"Render farm job {job_id} timed out")
+        failed = [state for state in states if state['state'] == FAILED]
+        if failed:
+            raise RuntimeError(f"Segment {failed[0]['task']['id']} failed: {failed[0]['error']}")
+        return [state['result'] for state in states]
+
+    def render(self, creator, scene_paths, scene_durations, transition_duration, transition_effect,
+               subtitles_path, audio_path, audio_duration, output_path, resolution, fps, bitrate,
+               audio_codec='aac'):
+        """
+        Render a timeline on the farm and assemble it into output_path.
+
+        The timeline is planned here only to count segments; workers rebuild
+        the same plan from the task, so both sides agree on segment bounds.
+        Without subtitles_path the segments carry no overlays, and without
+        audio_path the output is video only.
+        """
+        if transition_effect is not None and transition_effect not in TRANSITIONS:
+            transition_effect = None
+        segments, _ = plan_segments(scene_durations, transition_duration, transition_effect, fps)
+        job_id = uuid.uuid4().hex[:12]
+        spec = {
+            'job': job_id,
+            'scenes': [[self.store.put(path), os.path.splitext(path)[1]] for path in scene_paths],
+            'scene_durations': list(scene_durations),
+            'transition_duration': transition_duration,
+            'transition_effect': transition_effect,
+            'zoom_rate': creator.zoom_rate,
+            # The full extension (.srt or .words.json) tells the creator how to read the captions
+            'subtitles': [self.store.put(subtitles_path), '.' + os.path.basename(subtitles_path).partition('.')[2]]
+            if subtitles_path else None,
+            'audio_duration': audio_duration,
+            'resolution': list(resolution),
+            'fps': fps,
+            'bitrate': bitrate,
+        }
+        tasks = [dict(spec, id=f"{job_id}:{number:03d}", segment=number) for number in range(len(segments))]
+        logger.info(f"Render farm job {job_id}: {len(tasks)} segments")
+        self.submit(job_id, tasks)
+        results = self.wait(job_id)
+        creator.concat_segments([self.store.path(digest) for digest in results], output_path,
+                                audio_path=audio_path, duration=audio_duration, audio_codec=audio_codec)
+        return output_path
+
+
+class RenderWorker:
+    """Pulls segment tasks from a coordinator, encodes them and uploads the results"""
+
+    def __init__(self, coordinator, store, workdir=None, render=None, poll_interval=1.0,
+                 heartbeat_interval=10.0, worker_id=None, frame_cache=None):
+        """
+        Args:
+            coordinator: (host, port) of the RenderCoordinator.
+            store: ContentStore shared with the coordinator.
+            workdir: Local directory for fetched inputs and encoded segments.
+            render: Optional callable(task, workdir) -> encoded file path,
+                replacing the VideoCreator based render_segment.
+            frame_cache: Optional FrameCache shared by the worker processes of a node.
+        """
+        self.coordinator = coordinator
+        self.store = store
+        self.workdir = workdir or tempfile.mkdtemp(prefix='render_worker_')
+        os.makedirs(self.workdir, exist_ok=True)
+        self.render = render or self.render_segment
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.frame_cache = frame_cache
+        self.creator = None
+        self._timeline = None
+
+    def run(self, idle_timeout=None):
+        """Process tasks until no task arrives for idle_timeout seconds (None: forever)"""
+        idle_since = time.monotonic()
+        while True:
+            try:
+                task = send_request(self.coordinator, {'op': 'get', 'worker': self.worker_id})['task']
+            except OSError as e:
+                logger.warning(f"Coordinator unreachable: {e}")
+                task = None
+            if task is None:
+                if idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout:
+                    return
+                time.sleep(self.poll_interval)
+                continue
+            self.process(task)
+            idle_since = time.monotonic()
+
+    def process(self, task):
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(task['id'], stop), daemon=True)
+        heartbeat.start()
+        try:
+            result_path = self.render(task, self.workdir)
+            digest = self.store.put(result_path)
+            os.remove(result_path)
+            message = {'op': 'done', 'task_id': task['id'], 'result': digest}
+        except Exception as e:
+            logger.error(f"Segment task {task['id']} failed: {e}")
+            message = {'op': 'fail', 'task_id': task['id'], 'error': str(e)}
+        finally:
+            stop.set()
+            heartbeat.join()
+        message['worker'] = self.worker_id
+        send_request(self.coordinator, message)
+
+    def _heartbeat(self, task_id, stop):
+        while not stop.wait(self.heartbeat_interval):
+            try:
+                send_request(self.coordinator, {'op': 'heartbeat', 'task_id': task_id, 'worker': self.worker_id})
+            except OSError as e:
+                logger.warning(f"Heartbeat for {task_id} failed: {e}")
+
+    def _pieces(self, task):
+        """Timeline pieces and overlays for a task's job, reused across its segments"""
+        if self._timeline is not None and self._timeline[0] == task['job']:
+            return self._timeline[1:]
+        if self.creator is None:
+            from video_creator import VideoCreator
+            self.creator = VideoCreator(frame_cache=self.frame_cache)
+        self.creator.zoom_rate = task.get('zoom_rate', self.creator.zoom_rate)
+        inputs = os.path.join(self.workdir, 'inputs')
+        resolution = tuple(task['resolution'])
+        transition_duration = task['transition_duration']
+        clips = [
+            self.creator.scene_clip(self.store.fetch(digest, inputs, suffix), duration + transition_duration, resolution)
+            for (digest, suffix), duration in zip(task['scenes'], task['scene_durations'])
+        ]
+        overlays = []
+        if task['subtitles']:
+            digest, suffix = task['subtitles']
+            subtitles_path = self.store.fetch(digest, inputs, suffix)
+            overlays = self.creator.create_overlays(subtitles_path, resolution, task['audio_duration'])
+        pieces = self.creator.compose_scenes(clips, task['scene_durations'], resolution,
+                                             task['transition_effect'], transition_duration, task['fps'])
+        self._timeline = (task['job'], pieces, overlays)
+        return pieces, overlays
+
+    def render_segment(self, task, workdir):
+        pieces, overlays = self._pieces(task)
+        segment, clip = pieces[task['segment']]
+        segment_path = os.path.join(workdir, f"segment_{task['job']}_{task['segment']:03d}.mp4")
+        self.creator.write_segment(clip, segment.start, segment.end, overlays, segment_path,
+                                   tuple(task['resolution']), task['fps'], task['bitrate'])
+        return segment_path
+
+
+def _run_worker(coordinator, store_root, workdir, idle_timeout, frame_cache_dir=None):
+    frame_cache = FrameCache(frame_cache_dir) if frame_cache_dir else None
+    RenderWorker(coordinator, ContentStore(store_root), workdir, frame_cache=frame_cache).run(idle_timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render farm worker node')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    worker = subparsers.add_parser('worker', help='Pull and encode segment tasks')
+    worker.add_argument('--coordinator', required=True, help='host:port of the coordinator (render_farm in config.json)')
+    worker.add_argument('--store', required=True, help='Shared content-addressed store directory')
+    worker.add_argument('--workdir', default=None, help='Local scratch directory')
+    worker.add_argument('--processes', type=int, default=1, help='Worker processes on this node')
+    worker.add_argument('--idle-timeout', type=float, default=None, help='Exit after this many idle seconds')
+    worker.add_argument('--frame-cache', default=None, help='Decoded-frame cache directory shared by the processes')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    coordinator = parse_address(args.coordinator)
+    if args.processes == 1:
+        _run_worker(coordinator, args.store, args.workdir, args.idle_timeout, args.frame_cache)
+        return
+    processes = []
+    for number in range(args.processes):
+        workdir = os.path.join(args.workdir, str(number)) if args.workdir else None
+        process = multiprocessing.Process(
+            target=_run_worker,
+            args=(coordinator, args.store, workdir, args.idle_timeout, args.frame_cache)
+        )
+        process.start()
+        processes.append(process)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Sizing concurrent jobs and their thread pools to the host.
+
+Left alone, every job's libx264 encoder, ffmpeg readers and NumPy/BLAS pool
+start a thread per core, so a few concurrent jobs run several times more
+threads than there are cores and spend their time contending. A
+ResourceScheduler knows the cores and memory the host gives this process
+and hands out job slots: how many jobs may run at once and, for each job,
+how many encoder, decoder and compute threads it gets (the cores divided
+among the running jobs).
+
+Concurrency then follows measured throughput. Every finished job reports
+its wall time, and throughput at a concurrency level is estimated as
+level / average job time: jobs per second while every slot is busy, which
+idle gaps in the queue do not distort. Once a level has enough samples the
+scheduler moves to a faster neighbouring level, and stays where neither
+neighbour is faster. The state lives in shared memory, so the batch's
+worker processes and the daemon's worker threads share one scheduler.
+"""
+import logging
+import math
+import multiprocessing
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+GIB = 1 << 30
+# Thread-pool sizes read by OpenMP, BLAS builds and numexpr when they start
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMEXPR_NUM_THREADS',
+                   'VECLIB_MAXIMUM_THREADS')
+
+
+def host_cores():
+    """Cores this process may use: its CPU affinity, capped by a cgroup CPU quota"""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cores = min(cores, max(math.floor(int(quota) / int(period)), 1))
+    except (OSError, ValueError):
+        pass
+    return cores
+
+
+def host_memory():
+    """Bytes of memory available to new jobs"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+
+
+class JobPlan:
+    """Threads one job may use, and the concurrency level it was started at"""
+
+    def __init__(self, level, cores):
+        self.level = level
+        self.encoder_threads = max(cores // level, 1)
+        # Decoding stock clips is cheaper than encoding the output
+        self.decode_threads = max(self.encoder_threads // 2, 1)
+        self.compute_threads = self.encoder_threads
+        self.started = time.monotonic()
+
+    def __repr__(self):
+        return (f"JobPlan(level={self.level}, encoder_threads={self.encoder_threads}, "
+                f"decode_threads={self.decode_threads}, compute_threads={self.compute_threads})")
+
+
+def limit_process_threads(threads):
+    """
+    Pin this process's OpenMP/BLAS pools: through the environment for pools
+    started from now on, and through threadpoolctl when it is installed for
+    pools already running.
+    """
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads)
+    except ImportError:
+        pass
+
+
+def apply_thread_limits(plan, video_creator=None, process_wide=True):
+    """
+    Pin the thread pools of the libraries a job uses to the plan.
+
+    ffmpeg (encoders, readers and filters) gets its counts through
+    video_creator. OpenMP/BLAS pools belong to the whole process, so they
+    follow the plan only with process_wide; threads running several jobs at
+    once size them once instead (see limit_process_threads). Pillow's
+    resizes run on the calling thread.
+    """
+    if process_wide:
+        limit_process_threads(plan.compute_threads)
+    if video_creator is not None:
+        video_creator.threads = plan.encoder_threads
+        video_creator.decode_threads = plan.decode_threads
+        if video_creator.clip_analyzer is not None:
+            video_creator.clip_analyzer.threads = plan.decode_threads
+
+
+class ResourceScheduler:
+    """
+    Job slots sized to the host, with concurrency tuned by measured throughput.
+
+    Example:
+        scheduler = ResourceScheduler()
+        plan = scheduler.acquire()
+        try:
+            apply_thread_limits(plan, creator.video_creator)
+            creator.create_video(...)
+        finally:
+            scheduler.release(plan)
+    """
+
+    def __init__(self, cores=None, memory=None, job_memory=1.5 * GIB, max_jobs=None, initial_threads=4,
+                 samples=3, reprobe_after=20, smoothing=0.3):
+        """
+        Args:
+            cores: Cores to divide among jobs (detected when None).
+            memory: Bytes of memory jobs may use (detected when None).
+            job_memory: Bytes one rendering job needs at its peak.
+            max_jobs: Cap on concurrent jobs; by default every job keeps at
+                least two cores (compositing plus its encoder) and fits in memory.
+            initial_threads: Threads per job the first concurrency level gives.
+            samples: Finished jobs a level needs before its throughput is trusted.
+            reprobe_after: Jobs finished at a settled level before its
+                neighbours are measured again, so the choice follows the job mix.
+            smoothing: Weight of each new job time in a level's moving average.
+        """
+        self.cores = cores or host_cores()
+        memory = memory or host_memory()
+        memory_jobs = max(int(memory // job_memory), 1)
+        if max_jobs is None:
+            max_jobs = min(max(self.cores // 2, 1), memory_jobs)
+        self.max_jobs = max(max_jobs, 1)
+        self.samples = samples
+        self.reprobe_after = reprobe_after
+        self.smoothing = smoothing
+        # Shared between processes: level limit, jobs running, jobs finished at the settled level,
+        # and per level the finished job count and moving average job seconds
+        self._condition = multiprocessing.Condition()
+        self._level = multiprocessing.RawValue('i', min(max(self.cores // initial_threads, 1), self.max_jobs))
+        self._running = multiprocessing.RawValue('i', 0)
+        self._settled = multiprocessing.RawValue('i', 0)
+        self._counts = multiprocessing.RawArray('i', self.max_jobs + 2)
+        self._seconds = multiprocessing.RawArray('d', self.max_jobs + 2)
+
+    @property
+    def level(self):
+        """Jobs allowed to run at once"""
+        return self._level.value
+
+    def acquire(self, timeout=None):
+        """
+        Wait for a job slot.
+
+        Returns:
+            JobPlan: Threads for the job, or None if no slot freed up within timeout
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._running.value < self._level.value, timeout):
+                return None
+            self._running.value += 1
+            return JobPlan(self._level.value, self.cores)
+
+    def release(self, plan, seconds=None, record=True):
+        """
+        Free a job's slot.
+
+        Args:
+            plan: The JobPlan acquire() returned.
+            seconds: Wall time of the job; the time since acquire() when None.
+            record: Count the time toward the plan's level; pass False when no
+                job ran or it failed early, so the level's estimate stays meaningful.
+        """
+        seconds = time.monotonic() - plan.started if seconds is None else seconds
+        with self._condition:
+            self._running.value -= 1
+            self._condition.notify_all()
+            if not record:
+                return
+            level = plan.level
+            count = self._counts[level]
+            self._seconds[level] = seconds if count == 0 else (
+                self.smoothing * seconds + (1 - self.smoothing) * self._seconds[level])
+            self._counts[level] = count + 1
+            self._adjust()
+
+    def throughput(self, level):
+        """Estimated jobs per hour at a level, or None until it has enough samples"""
+        if level < 1 or level > self.max_jobs or self._counts[level] < self.samples:
+            return None
+        return 3600.0 * level / self._seconds[level]
+
+    def report(self):
+        """One-line summary of the measured levels for logs"""
+        measured = ', '.join(f"{level} jobs: {self.throughput(level):.1f}/h"
+                             for level in range(1, self.max_jobs + 1) if self.throughput(level) is not None)
+        return (f"Scheduler: {self.level} of at most {self.max_jobs} jobs on {self.cores} cores"
+                f"{' (' + measured + ')' if measured else ''}")
+
+    def _adjust(self):
+        # Callers hold self._condition
+        level = self._level.value
+        current = self.throughput(level)
+        if current is None:
+            return
+        up, down = self.throughput(level + 1), self.throughput(level - 1)
+        if up is None and level < self.max_jobs and (down is None or current >= down):
+            target = level + 1  # still improving: try one more job
+        elif down is None and level > 1 and (up is None or current >= up):
+            target = level - 1  # one more job was slower: try one fewer
+        elif up is not None and up > current and (down is None or up >= down):
+            target = level + 1
+        elif down is not None and down > current:
+            target = level - 1
+        else:
+            # Neither neighbour is faster: stay, and measure them again now and then
+            self._settled.value += 1
+            if self._settled.value >= self.reprobe_after:
+                self._settled.value = 0
+                for neighbour in (level - 1, level + 1):
+                    if 1 <= neighbour <= self.max_jobs:
+                        self._counts[neighbour] = 0
+            return
+        self._settled.value = 0
+        self._level.value = target
+        logger.info(f"{self.report()}; moving to {target} concurrent jobs")
@@ -0,0 +1,83 @@
+"""
+JSON files shared by every process on a host.
+
+Indexes like asset_hashes.json and the asset library's index.json are read
+and rewritten by concurrent jobs: render worker processes, and the daemon's
+workers, each with its own copy in memory. A writer takes an exclusive lock
+on a sidecar .lock file, reloads the file if another writer changed it, makes
+its change and writes the result under a unique name renamed over the
+original. No writer drops another's entries, and readers never see a
+partial file.
+
+Example:
+    with locked(path):
+        if version(path) != loaded_version:
+            entries = read_json(path, [])
+        entries.append(entry)
+        loaded_version = write_json(path, entries)
+"""
+import contextlib
+import json
+import os
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextlib.contextmanager
+def locked(path):
+    """Hold the exclusive lock of path, across threads and processes"""
+    with open(path + '.lock', 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def version(path):
+    """Changes whenever path is rewritten; None while it does not exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_json(path, data, **kwargs):
+    """
+    Replace path with data in one rename.
+
+    Returns:
+        The version of the written file, to compare with version() later
+    """
+    # Write under a unique name and rename, so readers never load a partial file
+    partial = f"{path}.{uuid.uuid4().hex}.partial"
+    try:
+        with open(partial, 'w', encoding='utf-8') as f:
+            json.dump(data, f, **kwargs)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return version(path)
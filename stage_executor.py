@@ -0,0 +1,178 @@
+"""
+Small dependency-graph executor for the stages of one video job.
+
+Stages are plain callables that receive a dict of their dependencies'
+results. Each stage starts as soon as all of its dependencies finished, so
+independent stages (TTS, per-asset downloads, preprocessing) overlap. A
+running stage may add further stages, which lets a keyword stage fan out one
+fetch stage per asset it discovers.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+
+class StageError(Exception):
+    """Raised when a stage fails; the original exception is the __cause__"""
+
+    def __init__(self, stage, error):
+        super().__init__(f"Stage '{stage}' failed: {error}")
+        self.stage = stage
+
+
+class Stage:
+    def __init__(self, name, fn, deps):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.result = None
+        self.started = None
+        self.finished = None
+
+    @property
+    def duration(self):
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+
+class StageGraph:
+    """
+    Dependency graph of stages run by a thread pool.
+
+    Example:
+        graph = StageGraph()
+        graph.add('tts', generate_audio)
+        graph.add('keywords', extract_keywords)
+        graph.add('render', render, deps=['tts', 'keywords'])
+        results = graph.run()
+    """
+
+    def __init__(self, max_workers=8, on_event=None, cancelled=None):
+        """
+        Args:
+            max_workers: Threads available to stages.
+            on_event: Optional callback(stage_name, status) with status one of
+                'started', 'finished' or 'failed'.
+            cancelled: Optional threading.Event shared with whoever may cancel
+                the job; setting it has the same effect as cancel().
+        """
+        self.max_workers = max_workers
+        self.on_event = on_event
+        self.stages = {}
+        self.lock = threading.Lock()
+        self.started = None
+        self.cancelled = cancelled or threading.Event()
+
+    def add(self, name, fn, deps=()):
+        """Add a stage. May be called from inside a running stage."""
+        with self.lock:
+            if name in self.stages:
+                raise ValueError(f"Duplicate stage '{name}'")
+            self.stages[name] = Stage(name, fn, deps)
+        return name
+
+    def cancel(self):
+        """Stop launching stages; stages already running finish on their own"""
+        self.cancelled.set()
+
+    def _emit(self, name, status):
+        if self.on_event:
+            try:
+                self.on_event(name, status)
+            except Exception as e:
+                logger.warning(f"Stage event callback failed for {name}: {e}")
+
+    def _run_stage(self, stage):
+        stage.started = time.monotonic()
+        self._emit(stage.name, 'started')
+        try:
+            stage.result = stage.fn({dep: self.stages[dep].result for dep in stage.deps})
+        finally:
+            stage.finished = time.monotonic()
+        return stage.result
+
+    def run(self):
+        """
+        Run every stage once its dependencies are done.
+
+        Returns:
+            dict: stage name -> result
+
+        Raises:
+            StageError: The first stage that failed, after running stages drain.
+        """
+        self.started = time.monotonic()
+        done = set()
+        running = {}
+        failure = None
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while True:
+                if failure is None and not self.cancelled.is_set():
+                    with self.lock:
+                        ready = [stage for name, stage in self.stages.items()
+                                 if name not in done and name not in running.values()
+                                 and all(dep in done for dep in stage.deps)]
+                    for stage in ready:
+                        running[pool.submit(self._run_stage, stage)] = stage.name
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        self._emit(name, 'failed')
+                        if failure is None:
+                            failure = (name, error)
+                    else:
+                        done.add(name)
+                        self._emit(name, 'finished')
+
+        if failure is not None:
+            raise StageError(*failure) from failure[1]
+        if self.cancelled.is_set():
+            raise StageError('cancelled', 'job was cancelled')
+        missing = [name for name in self.stages if name not in done]
+        if missing:
+            unresolved = {name: [d for d in self.stages[name].deps if d not in done] for name in missing}
+            raise StageError(missing[0], f"unresolved dependencies {unresolved}")
+        return {name: stage.result for name, stage in self.stages.items()}
+
+    def critical_path(self):
+        """
+        Chain of stages that determined the job's wall time.
+
+        Walks back from the stage that finished last, each time following the
+        dependency that finished last.
+
+        Returns:
+            list: (stage name, duration in seconds) from first to last
+        """
+        finished = [stage for stage in self.stages.values() if stage.finished is not None]
+        if not finished:
+            return []
+        stage = max(finished, key=lambda s: s.finished)
+        path = []
+        while stage is not None:
+            path.append((stage.name, stage.duration))
+            deps = [self.stages[dep] for dep in stage.deps if self.stages[dep].finished is not None]
+            stage = max(deps, key=lambda s: s.finished) if deps else None
+        return list(reversed(path))
+
+    def timings(self):
+        """stage name -> (start offset, duration) relative to the start of run()"""
+        return {
+            name: (stage.started - self.started, stage.duration)
+            for name, stage in self.stages.items() if stage.started is not None
+        }
+
+    def report(self):
+        """One-line summary of the critical path for logs"""
+        path = self.critical_path()
+        total = sum(duration for _, duration in path)
+        steps = ' -> '.join(f"{name} ({duration:.1f}s)" for name, duration in path)
+        return f"Critical path {total:.1f}s: {steps}"
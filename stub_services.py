@@ -0,0 +1,353 @@
+"""
+Local stand-ins for the upstream services the pipeline fetches from.
+
+One HTTP server answers with the response shapes of Pollinations, Google
+Images, the Pexels video search, the Groq chat-completions API and the files
+they link to, so ImageDownloader, VideoDownloader and AsyncGroqClient can be
+pointed at it through their base URLs. edge-tts is a command rather than a
+URL, so its stand-in is this module run as `python stub_services.py tts ...`
+with the same arguments.
+
+Every service can inject latency, jitter, 5xx errors, 429s with Retry-After
+and bodies cut off mid-transfer:
+
+    python stub_services.py serve --port 9000 --latency 0.2 --jitter 0.3 --error-rate 0.05
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+CHAT_PATH = '/openai/v1/chat/completions'
+STUB_SCRIPT = ("Honey never spoils. Archaeologists have found pots of honey in ancient Egyptian tombs "
+               "that are over three thousand years old and still edible. Thanks for watching, and "
+               "subscribe for more facts!")
+TTS_SECONDS_PER_WORD = 0.35
+TTS_WORDS_PER_CUE = 5
+
+
+class Faults:
+    """
+    Misbehaviour injected into one service.
+
+    Args:
+        latency: Seconds before every response.
+        jitter: Up to this many extra seconds, drawn uniformly per request.
+        error_rate: Share of requests answered with 500.
+        rate_limit_rate: Share of requests answered with 429 and Retry-After.
+        truncate_rate: Share of responses whose body stops halfway.
+        retry_after: Retry-After seconds sent with 429s.
+        stall_rate: Share of requests that hang for stall extra seconds (the long tail).
+        stall: Extra seconds of a stalled request.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0, truncate_rate=0.0,
+                 retry_after=1, stall_rate=0.0, stall=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.truncate_rate = truncate_rate
+        self.retry_after = retry_after
+        self.stall_rate = stall_rate
+        self.stall = stall
+
+    def draw(self, rng):
+        """Pick (delay, outcome) for one request"""
+        delay = self.latency + rng.uniform(0, self.jitter)
+        if self.stall_rate and rng.random() < self.stall_rate:
+            delay += self.stall
+        roll = rng.random()
+        for outcome, rate in (('error', self.error_rate), ('rate_limited', self.rate_limit_rate),
+                              ('truncated', self.truncate_rate)):
+            if roll < rate:
+                return delay, outcome
+            roll -= rate
+        return delay, 'ok'
+
+
+def stub_jpeg(size=(1080, 1920), color=(40, 90, 160)):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG', quality=60)
+    return buffer.getvalue()
+
+
+def stub_mp4(size=(1080, 1920), duration=1):
+    """A short solid-colour H.264 clip, encoded once with ffmpeg"""
+    from moviepy.config import FFMPEG_BINARY
+    width, height = size
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'stub.mp4')
+        subprocess.run([FFMPEG_BINARY, '-y', '-v', 'error', '-f', 'lavfi',
+                        '-i', f"color=c=green:s={width}x{height}:d={duration}:r=10",
+                        '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', path],
+                       capture_output=True, check=True)
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def route(self):
+        path = urlparse(self.path).path
+        if self.command == 'POST':
+            return 'groq' if path == CHAT_PATH else None
+        if path.startswith('/prompt/'):
+            return 'pollinations'
+        if path == '/search':
+            return 'google'
+        if path.startswith('/images/'):
+            return 'images'
+        if path == '/videos/search':
+            return 'pexels'
+        if path.startswith('/videos/files/'):
+            return 'videos'
+        return None
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        self.handle_request()
+
+    def handle_request(self):
+        server = self.server
+        service = self.route()
+        if service is None:
+            return self.send_body(404, b'not found', 'text/plain')
+        delay, outcome = server.draw(service)
+        time.sleep(delay)
+        server.record(service, outcome)
+        if outcome == 'error':
+            return self.send_body(500, b'upstream error', 'text/plain')
+        if outcome == 'rate_limited':
+            return self.send_body(429, b'rate limited', 'text/plain',
+                                  {'Retry-After': str(server.faults_for(service).retry_after)})
+        status, body, content_type = getattr(self, f"respond_{service}")()
+        self.send_body(status, body, content_type, truncate=outcome == 'truncated')
+
+    def send_body(self, status, body, content_type, headers=None, truncate=False):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        # A truncated body still announces its full length, like a dropped transfer
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if truncate:
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+        else:
+            self.wfile.write(body)
+
+    def respond_pollinations(self):
+        return 200, self.server.jpeg, 'image/jpeg'
+
+    def respond_google(self):
+        links = ''.join(f'<img data-src="{self.server.url}/images/{n:02d}.jpg">'
+                        for n in range(self.server.results_per_search))
+        return 200, f"<html><body>{links}</body></html>".encode('utf-8'), 'text/html'
+
+    def respond_images(self):
+        body = self.server.jpeg
+        status = 200
+        byte_range = self.headers.get('Range', '')
+        if byte_range.startswith('bytes=0-'):
+            body = body[:int(byte_range[len('bytes=0-'):]) + 1]
+            status = 206
+        return status, body, 'image/jpeg'
+
+    def respond_pexels(self):
+        query = parse_qs(urlparse(self.path).query)
+        per_page = int(query.get('per_page', ['1'])[0])
+        width, height = self.server.video_size
+        videos = [{'id': n, 'width': width, 'height': height, 'duration': 1,
+                   'video_files': [{'id': n, 'quality': 'hd', 'file_type': 'video/mp4', 'width': width,
+                                    'height': height, 'link': f"{self.server.url}/videos/files/{n:02d}.mp4"}]}
+                  for n in range(per_page)]
+        return 200, json.dumps({'page': 1, 'per_page': per_page, 'videos': videos}).encode('utf-8'), \
+            'application/json'
+
+    def respond_videos(self):
+        return 200, self.server.mp4(), 'video/mp4'
+
+    def respond_groq(self):
+        body = {'id': 'stub', 'object': 'chat.completion',
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': STUB_SCRIPT},
+                             'finish_reason': 'stop'}]}
+        return 200, json.dumps(body).encode('utf-8'), 'application/json'
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    All stub services on one port.
+
+    Example:
+        server = StubServer(faults={'*': Faults(latency=0.1), 'pexels': Faults(error_rate=0.2)})
+        server.start()
+        downloader = ImageDownloader(pollinations_url=server.url, google_url=server.url)
+    """
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), faults=None, seed=0, results_per_search=10,
+                 video_size=(1080, 1920)):
+        """
+        Args:
+            faults: {service: Faults}; '*' applies to services without their own entry.
+            seed: Seed of the fault draws, so a run can be repeated.
+        """
+        super().__init__(address, _Handler)
+        self.faults = faults or {}
+        self.rng = random.Random(seed)
+        self.results_per_search = results_per_search
+        self.video_size = video_size
+        self.jpeg = stub_jpeg()
+        self.stats = defaultdict(lambda: defaultdict(int))
+        self._mp4 = None
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def pexels_url(self):
+        return f"{self.url}/videos/search"
+
+    @property
+    def groq_url(self):
+        return f"{self.url}{CHAT_PATH}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def faults_for(self, service):
+        return self.faults.get(service) or self.faults.get('*') or Faults()
+
+    def draw(self, service):
+        with self._lock:
+            return self.faults_for(service).draw(self.rng)
+
+    def record(self, service, outcome):
+        with self._lock:
+            self.stats[service]['requests'] += 1
+            self.stats[service][outcome] += 1
+
+    def mp4(self):
+        with self._lock:
+            if self._mp4 is None:
+                self._mp4 = stub_mp4(self.video_size)
+            return self._mp4
+
+
+def tts_command(faults=None, seed=None):
+    """Command line that runs the edge-tts stand-in, for TextToSpeechGenerator(command=...)"""
+    faults = faults or Faults()
+    command = [sys.executable, os.path.abspath(__file__), 'tts',
+               '--latency', str(faults.latency), '--jitter', str(faults.jitter),
+               '--error-rate', str(faults.error_rate)]
+    if seed is not None:
+        command += ['--seed', str(seed)]
+    return command + ['--']
+
+
+def format_srt_time(seconds):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+
+
+def fake_tts(text, media_path, subtitles_path=None, sample_rate=16000):
+    """Write silent narration timed like speech, and its subtitles"""
+    words = text.split()
+    with wave.open(media_path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(b'\0\0' * int(max(len(words), 1) * TTS_SECONDS_PER_WORD * sample_rate))
+    if subtitles_path:
+        with open(subtitles_path, 'w') as f:
+            for number, start in enumerate(range(0, len(words), TTS_WORDS_PER_CUE), 1):
+                end = min(start + TTS_WORDS_PER_CUE, len(words))
+                f.write(f"{number}\n{format_srt_time(start * TTS_SECONDS_PER_WORD)} --> "
+                        f"{format_srt_time(end * TTS_SECONDS_PER_WORD)}\n{' '.join(words[start:end])}\n\n")
+
+
+def run_tts(args, edge_args):
+    parser = argparse.ArgumentParser(prog='edge-tts')
+    parser.add_argument('--text', required=True)
+    parser.add_argument('--write-media', required=True)
+    parser.add_argument('--write-subtitles')
+    known, _ = parser.parse_known_args(edge_args)
+    rng = random.Random(args.seed)
+    time.sleep(args.latency + rng.uniform(0, args.jitter))
+    if rng.random() < args.error_rate:
+        print("NoAudioReceived: injected failure", file=sys.stderr)
+        sys.exit(1)
+    fake_tts(known.text, known.write_media, known.write_subtitles)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-ins for upstream services')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name in ('serve', 'tts'):
+        subparser = subparsers.add_parser(name)
+        subparser.add_argument('--latency', type=float, default=0.0, help='Seconds before every response')
+        subparser.add_argument('--jitter', type=float, default=0.0, help='Up to this many extra seconds')
+        subparser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests that fail')
+        subparser.add_argument('--seed', type=int, default=None)
+    serve = subparsers.choices['serve']
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=9000)
+    serve.add_argument('--rate-limit-rate', type=float, default=0.0, help='Share of requests answered with 429')
+    serve.add_argument('--truncate-rate', type=float, default=0.0, help='Share of bodies cut off halfway')
+    serve.add_argument('--retry-after', type=int, default=1)
+    serve.add_argument('--stall-rate', type=float, default=0.0, help='Share of requests that hang')
+    serve.add_argument('--stall', type=float, default=0.0, help='Extra seconds of a hanging request')
+    args, extra = parser.parse_known_args()
+
+    if args.command == 'tts':
+        return run_tts(args, [arg for arg in extra if arg != '--'])
+    faults = Faults(args.latency, args.jitter, args.error_rate, args.rate_limit_rate, args.truncate_rate,
+                    args.retry_after, args.stall_rate, args.stall)
+    server = StubServer((args.host, args.port), faults={'*': faults}, seed=args.seed)
+    print(f"Stub services on {server.url}: pollinations_url/google_url={server.url}, "
+          f"api_url={server.pexels_url}, --api-url {server.groq_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+import numpy as np
+from PIL import Image
+from asset_hash import AssetHashIndex, dhash, hamming, phash
+
+def textured(seed, size=(120, 200)):
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, (size[1] // 10, size[0] // 10, 3), dtype=np.uint8)
+    return Image.fromarray(small).resize(size, Image.NEAREST)
+
+class TestAssetHashIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def save(self, image, name):
+        path = os.path.join(self.folder, name)
+        image.save(path)
+        return path
+
+    def test_hashes_survive_rescale_and_recompression(self):
+        image = textured(1)
+        resized = image.resize((240, 400), Image.BILINEAR)
+        self.assertLessEqual(int(hamming(dhash(image), [dhash(resized)])[0]), 6)
+        self.assertLessEqual(int(hamming(phash(image), [phash(resized)])[0]), 6)
+        self.assertGreater(int(hamming(phash(image), [phash(textured(2))])[0]), 10)
+
+    def test_rejects_near_duplicates_within_and_across_videos(self):
+        index_path = os.path.join(self.folder, 'hashes.json')
+        index = AssetHashIndex(index_path)
+        index.begin_video('first')
+        self.assertEqual(index.check_asset(self.save(textured(1), '01.png')), (True, 'accepted'))
+        accepted, reason = index.check_asset(self.save(textured(1).resize((240, 400)), '02.jpg'))
+        self.assertFalse(accepted)
+        self.assertIn('this video', reason)
+        self.assertTrue(index.check_asset(self.save(textured(3), '03.png'))[0])
+
+        # A later job in the batch reloads the index from disk
+        batch = AssetHashIndex(index_path)
+        batch.begin_video('second')
+        accepted, reason = batch.check_asset(self.save(textured(3), '01.png'))
+        self.assertFalse(accepted)
+        self.assertIn('video first', reason)
+
+    def test_jobs_sharing_the_file_keep_each_others_assets(self):
+        index_path = os.path.join(self.folder, 'hashes.json')
+        # Both loaded before either accepted anything, like two workers of one batch
+        first, second = AssetHashIndex(index_path), AssetHashIndex(index_path)
+        first.begin_video('first')
+        second.begin_video('second')
+        self.assertTrue(first.check_asset(self.save(textured(1), '01.png'))[0])
+        accepted, reason = second.check_asset(self.save(textured(1), '02.png'))
+        self.assertFalse(accepted)
+        self.assertIn('video first', reason)
+
+        paths = [self.save(textured(10 + n), f"{10 + n}.png") for n in range(8)]
+        threads = [threading.Thread(target=index.check_asset, args=(path,))
+                   for index, path in zip([first, second] * 4, paths)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with open(index_path) as f:
+            self.assertEqual(len(json.load(f)), 9)
+
+    def test_assets_are_forgotten_after_the_retention(self):
+        index_path = os.path.join(self.folder, 'hashes.json')
+        AssetHashIndex(index_path).check_asset(self.save(textured(1), '01.png'))
+        with open(index_path) as f:
+            entries = json.load(f)
+        entries[0]['added_at'] = time.time() - 7200
+        with open(index_path, 'w') as f:
+            json.dump(entries, f)
+        self.assertFalse(AssetHashIndex(index_path, retention=86400).check_asset(self.save(textured(1), '02.png'))[0])
+        self.assertTrue(AssetHashIndex(index_path, retention=3600).check_asset(self.save(textured(1), '03.png'))[0])
+
+    def test_rejects_blank_images(self):
+        index = AssetHashIndex()
+        accepted, reason = index.check_asset(self.save(Image.new('RGB', (100, 100), 'white'), 'blank.png'))
+        self.assertFalse(accepted)
+        self.assertIn('low detail', reason)
+
+if __name__ == '__main__':
+    unittest.main()
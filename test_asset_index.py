@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+from asset_index import AssetReuseIndex
+from image_downloader import ImageDownloader
+from stub_services import StubServer
+from workspace import Workspace
+
+class TestAssetReuseIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.library = os.path.join(self.folder, 'library')
+
+    def asset(self, name, content=b'jpeg'):
+        path = os.path.join(self.folder, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_similar_queries_reuse_and_others_miss(self):
+        index = AssetReuseIndex(self.library, threshold=0.5)
+        index.begin_video('first')
+        index.add(self.asset('temple.jpg', b'temple'), 'ancient temple at sunrise', 'image')
+        index.add(self.asset('waves.jpg', b'waves'), 'ocean waves', 'image', tags=['surf breaking on rocks'])
+
+        index.begin_video('second')
+        destination = os.path.join(self.folder, '01.jpg')
+        self.assertEqual(index.find('sunrise over an old temple', 'image', destination), destination)
+        with open(destination, 'rb') as f:
+            self.assertEqual(f.read(), b'temple')
+        # Tags are searched as well as the query
+        self.assertIsNotNone(index.find('rocks and breaking surf', 'image', destination))
+        self.assertIsNone(index.find('dog running in a park', 'image', destination))
+        self.assertIsNone(index.find('ancient temple at sunrise', 'video 1080x1920', destination))
+        self.assertEqual(index.stats, {'hits': 2, 'misses': 2, 'added': 2})
+        self.assertEqual(index.hit_rate(), 0.5)
+
+    def test_an_asset_is_used_once_per_video(self):
+        index = AssetReuseIndex(self.library, threshold=0.5)
+        index.begin_video('first')
+        index.add(self.asset('temple.jpg'), 'ancient temple at sunrise', 'image')
+        destination = os.path.join(self.folder, '02.jpg')
+        self.assertIsNone(index.find('ancient temple at sunrise', 'image', destination))
+
+        # A later job reloads the library and may use it once
+        batch = AssetReuseIndex(self.library, threshold=0.5)
+        batch.begin_video('second')
+        self.assertIsNotNone(batch.find('ancient temples', 'image', destination))
+        self.assertIsNone(batch.find('ancient temples', 'image', destination))
+
+    def test_concurrent_jobs_keep_each_others_entries(self):
+        # Both loaded before either added anything, like two workers of one batch
+        first, second = AssetReuseIndex(self.library, threshold=0.5), AssetReuseIndex(self.library, threshold=0.5)
+        first.begin_video('first')
+        second.begin_video('second')
+        first.add(self.asset('temple.jpg', b'temple'), 'ancient temple at sunrise', 'image')
+        second.add(self.asset('waves.jpg', b'waves'), 'ocean waves', 'image')
+
+        third = AssetReuseIndex(self.library, threshold=0.5)
+        self.assertEqual(sorted(entry['query'] for entry in third.entries), ['ancient temple at sunrise', 'ocean waves'])
+        # second sees the temple first added, and marks it used by its video for everyone
+        self.assertIsNotNone(second.find('sunrise over an old temple', 'image', os.path.join(self.folder, '01.jpg')))
+        first.begin_video('second')
+        self.assertIsNone(first.find('sunrise over an old temple', 'image', os.path.join(self.folder, '02.jpg')))
+
+    def test_downloader_skips_the_network_on_a_hit(self):
+        server = StubServer().start()
+        self.addCleanup(server.stop)
+        index = AssetReuseIndex(self.library)
+        downloader = ImageDownloader(pollinations_url=server.url, asset_index=index)
+
+        index.begin_video('first')
+        downloader.create_image(1, 'ancient temple at sunrise', 'history', workspace=Workspace(self.folder, 'first'))
+        index.begin_video('second')
+        path = downloader.create_image(1, 'sunrise over an ancient temple', 'history',
+                                       workspace=Workspace(self.folder, 'second'))
+
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(server.stats['pollinations']['requests'], 1)
+        self.assertIn('1/2 lookups', index.report())
+
+if __name__ == '__main__':
+    unittest.main()
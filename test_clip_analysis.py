@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+from moviepy import VideoClip, VideoFileClip
+import clip_analysis
+from clip_analysis import ClipAnalyzer, best_window
+
+def moving_square(t):
+    """Black for three seconds, then a square sweeping across"""
+    frame = np.zeros((64, 36, 3), dtype=np.uint8)
+    if t > 3:
+        x = int((t * 40) % 30)
+        frame[20:30, x:x + 6] = 255
+    return frame
+
+class TestBestWindow(unittest.TestCase):
+
+    def test_prefers_motion(self):
+        profile = {'duration': 5.0, 'sample_fps': 2, 'motion': [0, 0, 0, 0.1, 0.1, 0.1, 0.1, 0, 0]}
+        self.assertEqual(best_window(profile, 2.0), 1.5)
+
+    def test_avoids_scene_changes(self):
+        profile = {'duration': 5.0, 'sample_fps': 2, 'motion': [0.05, 0.05, 0.05, 0.9, 0.1, 0.1, 0.1, 0.1, 0.1]}
+        self.assertEqual(best_window(profile, 2.0), 2.0)
+
+    def test_short_clip_starts_at_zero(self):
+        self.assertEqual(best_window({'duration': 1.0, 'sample_fps': 4, 'motion': [0.1] * 3}, 2.0), 0.0)
+
+class TestClipAnalyzer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.clip_path = os.path.join(cls.directory, 'clip.mp4')
+        VideoClip(frame_function=moving_square, duration=6).write_videofile(cls.clip_path, fps=24, logger=None)
+
+    def test_trim_picks_moving_window(self):
+        analyzer = ClipAnalyzer()
+        self.assertAlmostEqual(best_window(analyzer.profile(self.clip_path), 2.0), 3.0, delta=0.5)
+        trimmed = VideoFileClip(analyzer.trim(self.clip_path, 2.0, os.path.join(self.directory, 'out')))
+        self.assertAlmostEqual(trimmed.duration, 2.0, delta=0.1)
+        self.assertGreater(trimmed.get_frame(0.5).max(), 200)
+        trimmed.close()
+
+    def test_short_clips_are_slowed_or_looped(self):
+        analyzer = ClipAnalyzer(max_slowdown=1.5)
+        for duration in (8.0, 15.0):
+            trimmed = VideoFileClip(analyzer.trim(self.clip_path, duration, os.path.join(self.directory, 'long')))
+            self.assertAlmostEqual(trimmed.duration, duration, delta=0.1)
+            trimmed.close()
+
+    def test_profiles_are_cached(self):
+        cache_path = os.path.join(self.directory, 'scores.json')
+        ClipAnalyzer(cache_path).profile(self.clip_path)
+        with patch.object(clip_analysis, 'motion_profile') as motion_profile:
+            ClipAnalyzer(cache_path).profile(self.clip_path)
+        motion_profile.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
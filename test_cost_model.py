@@ -0,0 +1,99 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from cost_model import CostModel, job_features, order_jobs, queue_etas, stage_seconds
+from job_store import JobStore
+from render_daemon import QUEUED, RenderDaemon
+
+def features(words, resolution=(1080, 1920)):
+    return job_features(' '.join(['word'] * words), resolution)
+
+def true_seconds(f):
+    return {'tts': 1 + 0.05 * f['words'], 'assets': 2 + 1.5 * f['scenes'], 'render': 5 + 0.02 * f['megapixel_frames']}
+
+class TestCostModel(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'stage_timings.jsonl')
+
+    def test_fitted_stages_predict_unseen_jobs(self):
+        model = CostModel(self.path)
+        self.assertIsNone(model.predict('video/single', features(100)))
+        for words, resolution in ((40, (1080, 1920)), (90, (720, 1280)), (150, (1080, 1920)), (210, (480, 854)),
+                                  (260, (720, 1280)), (330, (1080, 1920))):
+            model.record('video/single', features(words, resolution), true_seconds(features(words, resolution)))
+
+        # A second process reads the same timings
+        prediction = CostModel(self.path).predict('video/single', features(500))
+        expected = true_seconds(features(500))
+        for stage in ('tts', 'assets', 'render'):
+            self.assertAlmostEqual(prediction[stage], expected[stage], delta=0.02 * expected[stage])
+        self.assertAlmostEqual(prediction['total'], max(prediction['tts'], prediction['assets']) + prediction['render'])
+
+        # One sample of a group scales with the stage's main feature; groups without any borrow every group's
+        model.record('image/segmented', features(100), {'tts': 10.0, 'assets': 4.0, 'render': 30.0})
+        self.assertAlmostEqual(model.predict('image/segmented', features(200))['render'], 60.0)
+        self.assertIsNotNone(model.predict('AIimage/single', features(200)))
+
+    def test_stage_seconds_from_graph_timings(self):
+        timings = {'tts': (0.0, 4.0), 'audio_encode': (4.0, 0.5), 'keywords': (0.0, 1.0), 'fetch_01': (1.0, 6.0),
+                   'assets': (7.0, 0.0), 'render': (7.0, 20.0)}
+        self.assertEqual(stage_seconds(timings), {'tts': 4.5, 'assets': 7.0, 'render': 20.0})
+        del timings['render']
+        self.assertNotIn('render', stage_seconds(timings))
+
+class TestOrdering(unittest.TestCase):
+
+    def test_shortest_and_deadline_orders(self):
+        seconds = {1: 300, 2: 60, 3: 120, 4: None}
+        jobs = [{'id': 1, 'deadline': None}, {'id': 2, 'deadline': None}, {'id': 3, 'deadline': 1000 + 200},
+                {'id': 4, 'deadline': None}]
+        predict = lambda job: seconds[job['id']]
+        order = lambda policy: [job['id'] for job in order_jobs(jobs, policy, predict, now=1000)]
+        self.assertEqual(order('fifo'), [1, 2, 3, 4])
+        # Unknown predictions count as nothing, so they keep their place among the short ones
+        self.assertEqual(order('shortest'), [4, 2, 3, 1])
+        self.assertEqual(order('deadline'), [3, 4, 2, 1])
+
+        etas = queue_etas([{'id': 2}, {'id': 3}, {'id': 1}], predict, workers=2, now=0, busy_until=[100])
+        self.assertEqual(etas, {2: 60, 3: 180, 1: 400})
+
+    def test_store_claims_in_the_given_order(self):
+        path = os.path.join(tempfile.mkdtemp(), 'jobs.db')
+        # A store from before deadlines existed gains the column
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, topic TEXT NOT NULL UNIQUE, '
+                     'script TEXT, state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, claimed_by TEXT, '
+                     'claimed_at REAL, output TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)')
+        conn.close()
+        store = JobStore(path)
+        for topic, words in (('long', 300), ('short', 20), ('due', 100)):
+            store.add_script(topic, ' '.join(['word'] * words))
+        self.assertTrue(store.set_deadline('due', 5000))
+        self.assertFalse(store.set_deadline('unknown', 5000))
+        predict = lambda job: len(job['script'].split())
+        claim = lambda policy: store.claim('w1', order=lambda jobs: order_jobs(jobs, policy, predict, now=0))['topic']
+        self.assertEqual(claim('deadline'), 'due')
+        self.assertEqual(claim('shortest'), 'short')
+        self.assertEqual(store.claim('w1')['topic'], 'long')
+        self.assertIsNone(store.claim('w1', order=lambda jobs: jobs))
+        store.close()
+
+class PredictingCreator:
+    def predict_job(self, script, method):
+        seconds = 10.0 * len(script.split())
+        return {'tts': 0.0, 'assets': 0.0, 'render': seconds, 'total': seconds}
+
+class TestDaemonEta(unittest.TestCase):
+
+    def test_queued_jobs_get_etas_behind_the_jobs_ahead(self):
+        daemon = RenderDaemon(PredictingCreator(), max_queue=4, workers=1)
+        first, _ = daemon.submit({'script': 'one two'})
+        second, _ = daemon.submit({'script': 'three four five'})
+        self.assertEqual(daemon.status(first)['predicted_seconds'], 20.0)
+        self.assertEqual(first.state, QUEUED)
+        self.assertAlmostEqual(daemon.status(second)['eta'] - daemon.status(first)['eta'], 30.0, delta=0.5)
+
+if __name__ == '__main__':
+    unittest.main()
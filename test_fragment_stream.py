@@ -0,0 +1,101 @@
+import json
+import os
+import struct
+import tempfile
+import unittest
+import wave
+import numpy as np
+from moviepy import ColorClip, VideoFileClip
+from fragment_stream import DirectorySink, FileSink, FragmentTailer
+from video_creator import VideoCreator
+
+def box(box_type, payload=b''):
+    return struct.pack('>I4s', 8 + len(payload), box_type.encode()) + payload
+
+class FailingSink:
+    def write(self, kind, data):
+        raise IOError('upload refused')
+
+    def close(self):
+        pass
+
+class TestFragmentTailer(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'out.mp4')
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_fragmented_render_reaches_sinks_byte_for_byte(self):
+        audio_path = os.path.join(self.directory, 'narration.wav')
+        with wave.open(audio_path, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(8000)
+            f.writeframes(np.zeros(8000 * 3, dtype=np.int16).tobytes())
+        base_path = os.path.join(self.directory, 'base.mp4')
+        video_creator = VideoCreator(fragment_seconds=1)
+        scenes = [ColorClip((32, 32), color=color, duration=1) for color in ((255, 0, 0), (0, 0, 255))]
+        pieces = video_creator.compose_scenes(scenes, [1, 1], (32, 32), None, 0)
+        video_creator.write_looped(pieces, [], audio_path, 2.0, base_path, (32, 32), 10, '200k')
+
+        copy_path = os.path.join(self.directory, 'copy.mp4')
+        publish = os.path.join(self.directory, 'publish')
+        tailer = FragmentTailer(self.path, [FileSink(copy_path), DirectorySink(publish), FailingSink()]).start()
+        video_creator.create_variant(base_path, 2.0, audio_path, None, self.path, (32, 32), 10, '200k')
+        stats = tailer.finish()
+
+        output = self.read(self.path)
+        self.assertEqual(self.read(copy_path), output)
+        with open(os.path.join(publish, 'manifest.json')) as f:
+            manifest = json.load(f)
+        self.assertTrue(manifest['complete'])
+        self.assertEqual(manifest['files'][:2], ['init.mp4', 'fragment_00001.m4s'])
+        self.assertEqual(b''.join(self.read(os.path.join(publish, name)) for name in manifest['files']), output)
+        # One fragment per second of narration, each starting on a forced keyframe
+        self.assertGreaterEqual(stats['fragments'], 3)
+        self.assertEqual(stats['bytes'], len(output))
+        # Fragmented files carry no edit list, so the audio priming adds a little to the reported duration
+        clip = VideoFileClip(self.path)
+        self.assertAlmostEqual(clip.duration, 3.0, delta=0.25)
+        clip.close()
+
+    def test_fragments_are_passed_on_only_once_complete(self):
+        received = []
+        class ListSink:
+            def write(self, kind, data):
+                received.append((kind, data))
+            def close(self):
+                received.append(('closed', b''))
+
+        init = box('ftyp', b'isom') + box('moov')
+        fragment = box('moof', b'x' * 16) + box('mdat', b'y' * 32)
+        with open(self.path, 'wb') as f:
+            f.write(init + fragment[:-4])
+        tailer = FragmentTailer(self.path, [ListSink()], poll_interval=0.01)
+        with open(tailer.path, 'rb') as f:
+            tailer._scan(f, len(init + fragment) - 4)
+        # The moof proves the init segment is complete; the half-written mdat is held back
+        self.assertEqual(received, [('init', init)])
+
+        with open(self.path, 'ab') as f:
+            f.write(fragment[-4:] + box('mfra'))
+        tailer.start()
+        stats = tailer.finish()
+        self.assertEqual(received[1:], [('fragment', fragment), ('tail', box('mfra')), ('closed', b'')])
+        self.assertEqual(stats['fragments'], 1)
+
+    def test_unfragmented_file_is_passed_on_whole_at_the_end(self):
+        content = box('ftyp', b'isom') + box('mdat', b'z' * 64) + box('moov')
+        with open(self.path, 'wb') as f:
+            f.write(content)
+        copy_path = os.path.join(self.directory, 'copy.mp4')
+        stats = FragmentTailer(self.path, [FileSink(copy_path)]).start().finish()
+        self.assertEqual(self.read(copy_path), content)
+        self.assertEqual(stats['fragments'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import time
+import unittest
+import numpy as np
+from PIL import Image
+from frame_cache import FrameCache, resize_frame
+
+class TestFrameCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.images = []
+        for number in range(3):
+            path = os.path.join(self.directory, f"{number}.png")
+            Image.new('RGB', (40, 20), (number * 80, 0, 0)).save(path)
+            self.images.append(path)
+
+    def test_second_request_maps_cached_frame(self):
+        cache = FrameCache(os.path.join(self.directory, 'cache'))
+        first = cache.image(self.images[0], (10, 20))
+        second = cache.image(self.images[0], (10, 20))
+        self.assertIsInstance(second, np.memmap)
+        self.assertEqual(second.shape, (20, 10, 3))
+        np.testing.assert_array_equal(first, second)
+        self.assertEqual((cache.stats['hits'], cache.stats['misses']), (1, 1))
+        # Other resolutions and crops are separate entries
+        cache.image(self.images[0], (10, 20), crop='cover')
+        self.assertEqual(cache.stats['misses'], 2)
+
+    def test_cover_crops_centre(self):
+        image = Image.new('RGB', (40, 20), (255, 0, 0))
+        image.paste((0, 0, 255), (0, 0, 10, 20))
+        frame = resize_frame(image, (20, 20), crop='cover')
+        self.assertEqual(frame.shape, (20, 20, 3))
+        self.assertEqual(tuple(frame[10, 0]), (255, 0, 0))
+
+    def test_evicts_least_recently_used(self):
+        entry_bytes = 20 * 10 * 3 + 128
+        cache = FrameCache(os.path.join(self.directory, 'cache'), budget_bytes=2 * entry_bytes)
+        cache.image(self.images[0], (10, 20))
+        time.sleep(0.01)
+        cache.image(self.images[1], (10, 20))
+        time.sleep(0.01)
+        cache.image(self.images[0], (10, 20))  # refreshes image 0
+        time.sleep(0.01)
+        cache.image(self.images[2], (10, 20))
+        self.assertEqual(cache.stats['evicted'], 1)
+        self.assertLessEqual(cache.size(), 2 * entry_bytes)
+        cache.image(self.images[0], (10, 20))
+        self.assertEqual(cache.stats['misses'], 3)
+
+if __name__ == '__main__':
+    unittest.main()
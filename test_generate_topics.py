@@ -0,0 +1,60 @@
+import asyncio
+import unittest
+from contextlib import asynccontextmanager
+from generate_topics import TopicDeduper, generate_topics, normalize_topic
+
+class FakeClient:
+    """Stands in for AsyncGroqClient, returning canned topic lists"""
+
+    def __init__(self, responses, concurrency=3):
+        self.responses = list(responses)
+        self.concurrency = concurrency
+        self.calls = 0
+
+    @asynccontextmanager
+    async def session(self):
+        yield None
+
+    async def complete(self, session, payload):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return self.responses.pop(0) if self.responses else ''
+
+class TestGenerateTopics(unittest.TestCase):
+
+    def test_normalize_strips_list_markup(self):
+        self.assertEqual(normalize_topic('1. "Why Cats Purr at Night"'), 'Why Cats Purr at Night')
+        self.assertEqual(normalize_topic('- **Five  Kitchen Hacks You Missed**'), 'Five Kitchen Hacks You Missed')
+        self.assertIsNone(normalize_topic('Here are your topics:'))
+        self.assertIsNone(normalize_topic(''))
+
+    def test_deduper_rejects_near_duplicates(self):
+        deduper = TopicDeduper()
+        self.assertTrue(deduper.add('Why Cats Purr at Night'))
+        self.assertFalse(deduper.add('why cats purr at night!'))
+        self.assertFalse(deduper.add('Why Cats Purr At Night Time'))
+        self.assertTrue(deduper.add('The Science of Dog Dreams'))
+        self.assertEqual(len(deduper), 2)
+
+    def test_deduper_handles_non_latin_topics(self):
+        deduper = TopicDeduper()
+        self.assertTrue(deduper.add('बिल्लियाँ रात में क्यों गुर्राती हैं'))
+        self.assertFalse(deduper.add('बिल्लियाँ रात में क्यों गुर्राती हैं?'))
+        self.assertTrue(deduper.add('कुत्तों के सपनों का विज्ञान'))
+        self.assertTrue(deduper.add('Почему кошки мурлычут ночью'))
+        self.assertEqual(len(deduper), 3)
+
+    def test_stops_launching_once_count_is_met(self):
+        ideas = ['Why cats purr when happy', 'The hidden life of stray kittens', 'Ancient Egypt worshipped felines',
+                 'Ten toys your tabby secretly hates', 'How whiskers measure tight gaps', 'Lions versus house cats',
+                 'Best budget scratching posts', 'What your kitten dreams about', 'Famous internet cat legends',
+                 'Do indoor cats get bored', 'Secret meaning of slow blinks', 'Rare breeds nobody has heard of']
+        batch = lambda start: '\n'.join(f'{i}. {idea}' for i, idea in enumerate(ideas[start:start + 5], 1))
+        client = FakeClient([batch(0), batch(0), batch(5), batch(7)])
+        topics = asyncio.run(generate_topics('Cats', 8, client, per_request=5))
+        self.assertEqual(topics, ideas[:8])
+        # Requests stop once the yield in flight could reach the target
+        self.assertEqual(client.calls, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import time
+import unittest
+from asset_index import AssetReuseIndex
+from hedged_fetch import DeadlineExceeded, FetchBudget, HedgedFetcher
+from image_downloader import ImageDownloader
+from stub_services import Faults, StubServer, stub_jpeg
+from workspace import Workspace
+
+class FakeResponse:
+    """Streams b'<url>' after delay seconds, in small slices so cancellation is noticed"""
+
+    def __init__(self, url, delay):
+        self.url = url
+        self.delay = delay
+        self.status_code = 200
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, chunk_size):
+        end = time.monotonic() + self.delay
+        while time.monotonic() < end:
+            time.sleep(0.01)
+            yield b''
+        yield self.url.encode()
+
+class FakeSession:
+    def __init__(self, delays):
+        self.delays = delays
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        return FakeResponse(url, self.delays[url])
+
+class TestHedgedFetcher(unittest.TestCase):
+
+    def test_slow_request_is_hedged_and_the_duplicate_wins(self):
+        fetcher = HedgedFetcher(FakeSession({'slow': 5, 'fast': 0}), hedge_after=0.1)
+        start = time.monotonic()
+        content = fetcher.fetch('pollinations', lambda attempt: ['slow', 'fast'][attempt])
+        self.assertEqual(content, b'fast')
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(fetcher.stats, {'fetches': 1, 'hedges': 1, 'hedge_wins': 1, 'deadline_exceeded': 0})
+        self.assertEqual(dict(fetcher.recorder.outcomes['pollinations']), {'hedged': 1})
+
+    def test_fetch_gives_up_at_its_deadline(self):
+        fetcher = HedgedFetcher(FakeSession({'slow': 5}), hedge_after=0.05, max_hedges=2)
+        with self.assertRaises(DeadlineExceeded):
+            fetcher.fetch('pollinations', lambda attempt: 'slow', deadline=time.monotonic() + 0.3)
+        self.assertEqual(fetcher.stats['hedges'], 2)
+        self.assertEqual(dict(fetcher.recorder.outcomes['pollinations']), {'deadline': 1})
+        p50, _, _ = fetcher.recorder.percentiles('pollinations')
+        self.assertAlmostEqual(p50, 0.3, delta=0.1)
+
+    def test_budget_is_split_across_waves(self):
+        now = [0.0]
+        budget = FetchBudget(100, parallelism=2, clock=lambda: now[0])
+        budget.add(4)
+        self.assertEqual(budget.start(), 50)
+        budget.done()
+        budget.done()
+        now[0] = 40
+        self.assertEqual(budget.start(), 100)
+
+    def test_library_asset_stands_in_when_time_runs_out(self):
+        server = StubServer(faults={'*': Faults(latency=2)}).start()
+        self.addCleanup(server.stop)
+        folder = tempfile.mkdtemp()
+        index = AssetReuseIndex(os.path.join(folder, 'library'), threshold=0.9)
+        source = os.path.join(folder, 'temple.jpg')
+        with open(source, 'wb') as f:
+            f.write(stub_jpeg((10, 10)))
+        index.begin_video('first')
+        index.add(source, 'old temple', 'image')
+        index.begin_video('second')
+        # By default a stand-in must be as similar as any reused asset
+        downloader = ImageDownloader(pollinations_url=server.url, asset_index=index)
+        self.assertIsNone(downloader.create_image(1, 'ancient temple at sunrise', '',
+                                                  workspace=Workspace(folder, 'second'),
+                                                  deadline=time.monotonic() + 0.3))
+
+        downloader = ImageDownloader(pollinations_url=server.url, asset_index=index, fallback_threshold=0.2)
+        path = downloader.create_image(1, 'ancient temple at sunrise', '', workspace=Workspace(folder, 'second'),
+                                       deadline=time.monotonic() + 0.3)
+        self.assertIsNotNone(path)
+        with open(path, 'rb') as f, open(source, 'rb') as original:
+            self.assertEqual(f.read(), original.read())
+        self.assertEqual(downloader.fetcher.stats['deadline_exceeded'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import io
+import unittest
+from unittest.mock import MagicMock
+from PIL import Image
+from image_downloader import ImageDownloader, image_fit_score, sniff_image_size
+
+def encode_image(size, format):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (10, 20, 30)).save(buffer, format=format)
+    return buffer.getvalue()
+
+def fake_response(data, content_type='image/jpeg'):
+    response = MagicMock()
+    response.status_code = 206
+    response.headers = {'content-type': content_type}
+    response.iter_content.return_value = [data[i:i + 4096] for i in range(0, len(data), 4096)]
+    response.__enter__.return_value = response
+    return response
+
+class TestImageDownloader(unittest.TestCase):
+
+    def test_sniff_image_size_formats(self):
+        for format in ('PNG', 'JPEG', 'GIF', 'BMP', 'WEBP'):
+            data = encode_image((36, 64), format)
+            self.assertEqual(sniff_image_size(data[:512]), (36, 64), format)
+        self.assertIsNone(sniff_image_size(b'<html>not an image'))
+        self.assertIsNone(sniff_image_size(b'\x89PNG\r\n\x1a\n'))
+
+    def test_sniff_lossless_webp(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (33, 65)).save(buffer, format='WEBP', lossless=True)
+        self.assertEqual(sniff_image_size(buffer.getvalue()), (33, 65))
+
+    def test_fit_score_prefers_large_portrait(self):
+        target = (1080, 1920)
+        ranked = sorted([(800, 600), (1080, 1920), (540, 960), (2000, 1000)],
+                        key=lambda size: image_fit_score(size, target), reverse=True)
+        self.assertEqual(ranked[:2], [(1080, 1920), (540, 960)])
+
+    def test_verify_ranks_candidates_by_fit(self):
+        downloader = ImageDownloader()
+        bodies = {
+            'http://a/small.png': fake_response(encode_image((100, 200), 'PNG'), 'image/png'),
+            'http://a/page.html': fake_response(b'<html></html>', 'text/html'),
+            'http://a/wide.jpg': fake_response(encode_image((400, 200), 'JPEG')),
+        }
+        downloader.session = MagicMock()
+        downloader.session.get.side_effect = lambda url, **kwargs: bodies[url]
+        verified = downloader.verify_image_urls(list(bodies), target_size=(1080, 1920))
+        self.assertEqual(verified, ['http://a/small.png', 'http://a/wide.jpg'])
+        _, kwargs = downloader.session.get.call_args
+        self.assertTrue(kwargs['headers']['Range'].startswith('bytes=0-'))
+
+if __name__ == '__main__':
+    unittest.main()
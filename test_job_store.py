@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from job_store import JobStore, FAILED, RENDERED, SCRIPTED, TOPIC, VOICED
+
+class TestJobStore(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'jobs.db')
+        self.store = JobStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_scripts_become_claimable_as_they_arrive(self):
+        self.assertEqual(self.store.add_topics(['a', 'b', 'a']), 2)
+        self.assertIsNone(self.store.claim('w1'))
+        self.store.add_script('b', 'script b')
+        job = self.store.claim('w1')
+        self.assertEqual((job['topic'], job['script'], job['attempts']), ('b', 'script b', 1))
+        self.assertIsNone(self.store.claim('w2'))
+
+        self.store.advance(job['id'], VOICED, worker='w1')
+        self.store.advance(job['id'], RENDERED, output='out.mp4', worker='w1')
+        self.assertEqual(self.store.counts()[RENDERED], 1)
+        self.assertEqual(self.store.counts()[TOPIC], 1)
+        states = [event['state'] for event in self.store.history(job['id'])]
+        self.assertEqual(states, [TOPIC, SCRIPTED, SCRIPTED, VOICED, RENDERED])
+
+    def test_concurrent_workers_claim_each_job_once(self):
+        for i in range(30):
+            self.store.add_script(f"topic {i}", f"script {i}")
+
+        def drain(worker):
+            store = JobStore(self.path)
+            claimed = []
+            while True:
+                job = store.claim(worker)
+                if job is None:
+                    return claimed
+                claimed.append(job['id'])
+                store.advance(job['id'], RENDERED, worker=worker)
+
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(drain, ['w1', 'w2', 'w3', 'w4']))
+        claimed = [job_id for result in results for job_id in result]
+        self.assertEqual(sorted(claimed), list(range(1, 31)))
+
+    def test_failures_retry_then_fail_and_stale_claims_are_released(self):
+        self.store.add_script('a', 'script')
+        for attempt in range(3):
+            job = self.store.claim('w1')
+            self.store.fail(job['id'], 'boom', max_attempts=3)
+        self.assertEqual(self.store.jobs(FAILED)[0]['error'], 'boom')
+
+        self.store.add_script('b', 'script')
+        job = self.store.claim('w1')
+        self.store.advance(job['id'], VOICED)
+        self.assertEqual(self.store.reclaim_stale(lease_seconds=-1), 1)
+        self.assertEqual(self.store.claim('w2')['id'], job['id'])
+
+if __name__ == '__main__':
+    unittest.main()
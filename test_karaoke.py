@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from moviepy import ColorClip, CompositeVideoClip
+from PIL import ImageFont
+import karaoke
+from video_creator import VideoCreator
+
+FONT = "HussarBoldCondensed-mmrV.otf"
+WORDS = [('Honey', 0.0, 0.4), ('never', 0.4, 0.8), ('spoils', 0.8, 1.2),
+         ('Bees', 2.0, 2.3), ('make', 2.3, 2.6), ('it', 2.6, 2.8)]
+
+class TestKaraoke(unittest.TestCase):
+
+    def test_words_are_grouped_at_sentences_pauses_and_length(self):
+        cues = karaoke.group_words(WORDS, max_words=2, text="Honey never spoils. Bees make it!")
+        self.assertEqual([text for _, _, text, _ in cues], ['Honey never', 'spoils', 'Bees make', 'it'])
+        cues = karaoke.group_words(WORDS)
+        self.assertEqual([text for _, _, text, _ in cues], ['Honey never spoils', 'Bees make it'])
+        self.assertEqual(cues[1][:2], (2.0, 2.8))
+
+    def test_word_timings_round_trip(self):
+        directory = tempfile.mkdtemp()
+        cues = karaoke.group_words(WORDS)
+        words_path = os.path.join(directory, 'subtitles' + karaoke.WORDS_SUFFIX)
+        srt_path = os.path.join(directory, 'subtitles.srt')
+        karaoke.save_words(cues, words_path)
+        karaoke.save_srt(cues, srt_path)
+
+        creator = VideoCreator()
+        self.assertEqual(creator.load_captions(words_path), cues)
+        self.assertEqual(creator.load_captions(srt_path), [(0.0, 1.2, 'Honey never spoils'), (2.0, 2.8, 'Bees make it')])
+
+    def test_only_the_spoken_word_is_highlighted(self):
+        size = (400, 200)
+        cue = karaoke.group_words(WORDS)[0]
+        clips = karaoke.cue_clips(cue, size, FONT, font_size=40, top=50)
+        self.assertEqual(len(clips), 1 + len(cue[3]))
+        boxes, _ = karaoke.layout_cue([word for word, _, _ in cue[3]], ImageFont.truetype(FONT, 40), size[0])
+
+        background = ColorClip(size, color=(0, 0, 0)).with_duration(1.2)
+        frame = CompositeVideoClip([background] + clips, size=size).get_frame(0.5)
+
+        def yellow_pixels(box):
+            left, top, right, bottom = box
+            region = frame[50 + top:50 + bottom, left:right].astype(int)
+            return np.sum((region[..., 0] > 200) & (region[..., 1] > 200) & (region[..., 2] < 100))
+
+        self.assertEqual(yellow_pixels(boxes[0]), 0)
+        self.assertGreater(yellow_pixels(boxes[1]), 50)
+        self.assertEqual(yellow_pixels(boxes[2]), 0)
+
+if __name__ == '__main__':
+    unittest.main()
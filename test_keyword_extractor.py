@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+import spacy
+from keyword_extractor import KeywordExtractor, chunk_script
+
+def make_nlp():
+    nlp = spacy.blank('en')
+    ruler = nlp.add_pipe('entity_ruler')
+    ruler.add_patterns([
+        {"label": "GPE", "pattern": "China"},
+        {"label": "FAC", "pattern": "Great Wall"},
+        {"label": "CARDINAL", "pattern": "three"},
+    ])
+    return nlp
+
+class CountingNlp:
+    """Wraps a pipeline and records the batches passed to pipe()"""
+
+    def __init__(self, nlp):
+        self.nlp = nlp
+        self.batches = []
+
+    def pipe(self, texts, **kwargs):
+        texts = list(texts)
+        self.batches.append(texts)
+        return self.nlp.pipe(texts, **kwargs)
+
+class TestKeywordExtractor(unittest.TestCase):
+
+    def test_chunk_script(self):
+        self.assertEqual(chunk_script('a b c d e', words_per_scene=2), ['a b', 'c d', 'e'])
+
+    def test_queries_from_entities_with_fallback(self):
+        extractor = KeywordExtractor(nlp=make_nlp())
+        queries = extractor.queries_for(['The Great Wall of China has three layers', 'nothing to see here'])
+        self.assertEqual(queries, ['Great Wall China', 'nothing to see here'])
+
+    def test_batches_and_memoizes(self):
+        nlp = CountingNlp(make_nlp())
+        extractor = KeywordExtractor(nlp=nlp)
+        extractor.extract_many(['China one', 'China two', 'China one'])
+        extractor.extract_many(['China two', 'China three'])
+        self.assertEqual(nlp.batches, [['China one', 'China two'], ['China three']])
+        self.assertEqual(extractor.stats, {'hits': 2, 'misses': 3})
+
+    def test_cache_persists(self):
+        path = os.path.join(tempfile.mkdtemp(), 'keywords.json')
+        KeywordExtractor(nlp=make_nlp(), cache_path=path).extract('Great Wall')
+        extractor = KeywordExtractor(nlp=False, cache_path=path)
+        self.assertEqual(extractor.extract('Great Wall'), ['Great Wall'])
+        self.assertEqual(extractor.extract('China'), [])
+
+    def test_results_without_a_model_are_not_kept(self):
+        path = os.path.join(tempfile.mkdtemp(), 'keywords.json')
+        self.assertEqual(KeywordExtractor(nlp=False, cache_path=path).extract('Great Wall'), [])
+        self.assertFalse(os.path.exists(path))
+        # Installed later, the model extracts the text after all
+        self.assertEqual(KeywordExtractor(nlp=make_nlp(), cache_path=path).extract('Great Wall'), ['Great Wall'])
+
+        # Another model does not see the first one's keywords
+        nlp = CountingNlp(make_nlp())
+        KeywordExtractor(model='en_core_web_lg', nlp=nlp, cache_path=path).extract('Great Wall')
+        self.assertEqual(nlp.batches, [['Great Wall']])
+
+if __name__ == '__main__':
+    unittest.main()
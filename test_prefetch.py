@@ -0,0 +1,178 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+import unittest
+from app import ScriptToVideo
+from automate_scripts_to_video import prefetch_worker
+from job_store import JobStore, FAILED, RENDERED, SCRIPTED
+from prefetch import JobPrefetcher
+from stage_executor import StageError
+from workspace import WorkspaceCleaner
+
+class FakeCreator:
+    def __init__(self, failing=()):
+        self.config = {'temp_folder': tempfile.mkdtemp()}
+        self.video_creator = None
+        self.failing = failing
+        self.events = []
+
+    def prepare_video(self, script, method, topic, voice_gender, language, on_stage, cancelled):
+        self.events.append(('prepare', topic))
+        time.sleep(0.05)
+        if topic in self.failing:
+            raise Exception("No assets were downloaded successfully")
+        return {'topic': topic}
+
+    def render_prepared(self, prepared):
+        self.events.append(('render', prepared['topic']))
+        time.sleep(0.1)
+        self.events.append(('rendered', prepared['topic']))
+        return f"output/{prepared['topic']}.mp4"
+
+class StubSpeech:
+    def __init__(self, block_until=None, failing=False):
+        self.started = threading.Event()
+        self.block_until = block_until
+        self.failing = failing
+
+    def generate_speech(self, script, voice_gender, output_path, subtitles_path, force_language, words_path):
+        self.started.set()
+        if self.block_until is not None:
+            self.block_until.wait(5)
+        if self.failing:
+            return False, "voice unavailable"
+        for path in (output_path, subtitles_path):
+            with open(path, 'w') as f:
+                f.write(script)
+        return True, output_path
+
+class StubVideoCreator:
+    def encode_audio(self, audio_path, output_path):
+        return output_path
+
+    def preprocess_image(self, image_path, resolution, workspace):
+        return image_path
+
+def stub_app(speech):
+    """ScriptToVideo with its services replaced, running the real job graph"""
+    creator = ScriptToVideo.__new__(ScriptToVideo)
+    root = tempfile.mkdtemp()
+    creator.config = {'temp_folder': os.path.join(root, 'temp'), 'output_folder': os.path.join(root, 'output'),
+                      'video_resolution': [108, 192], 'transition_duration': 0.5}
+    creator.logger = logging.getLogger(__name__)
+    creator.setup_workspace()
+    with open(os.path.join(creator.folders['images'], '01.jpg'), 'wb') as f:
+        f.write(b'jpeg')
+    creator.hash_index = creator.asset_index = creator.cost_model = None
+    creator.speech_generator = speech
+    creator.video_creator = StubVideoCreator()
+    return creator
+
+class TestPrepareVideo(unittest.TestCase):
+
+    def test_prepared_job_stops_before_the_render(self):
+        creator = stub_app(StubSpeech())
+        graphs = []
+        build_job_graph = creator.build_job_graph
+        creator.build_job_graph = lambda *args, **kwargs: graphs.append(build_job_graph(*args, **kwargs)) or graphs[-1]
+        creator.render_video = lambda *args: self.fail("prepare_video rendered")
+        prepared = creator.prepare_video('one two three', method='image')
+        self.assertNotIn('render', graphs[0].stages)
+        self.assertIn('assets', graphs[0].stages)
+        self.assertTrue(os.path.exists(prepared['audio']))
+        self.assertFalse(os.path.exists(prepared['output']))
+
+    def test_stopping_the_prefetcher_cancels_the_job_being_prepared(self):
+        release = threading.Event()
+        speech = StubSpeech(block_until=release)
+        creator = stub_app(speech)
+        creator.workspace_cleaner = WorkspaceCleaner()
+        jobs = iter(['one two three'])
+        # Wired the way prefetch_worker wires it: the stop event is the job's cancelled event
+        prefetcher = JobPrefetcher(lambda: next(jobs, None),
+                                   lambda script: creator.prepare_video(script, cancelled=prefetcher.stopping),
+                                   poll_interval=0.01)
+        prefetcher.start()
+        self.assertTrue(speech.started.wait(5))
+        threading.Timer(0.05, release.set).start()
+        (job, prepared, error), = prefetcher.stop()
+        self.assertIsNone(prepared)
+        self.assertIsInstance(error, StageError)
+        self.assertEqual(error.stage, 'cancelled')
+        creator.workspace_cleaner.drain()
+        self.assertEqual(os.listdir(creator.config['temp_folder']), ['images'])
+
+    def test_failed_jobs_leave_no_workspace(self):
+        creator = stub_app(StubSpeech(failing=True))
+        with self.assertRaises(Exception):
+            creator.create_video('one two three', method='image')
+        with self.assertRaises(Exception):
+            creator.prepare_video('one two three', method='image')
+        with self.assertRaises(Exception):
+            creator.create_variants('one two three', ['en'], method='image')
+        creator.workspace_cleaner.drain()
+        self.assertEqual(os.listdir(creator.config['temp_folder']), ['images'])
+
+class TestJobPrefetcher(unittest.TestCase):
+
+    def test_jobs_are_prepared_in_order_up_to_the_lookahead(self):
+        jobs = iter(range(5))
+        prefetcher = JobPrefetcher(lambda: next(jobs, None), lambda job: f"prepared {job}", lookahead=2,
+                                   poll_interval=0.01).start()
+        deadline = time.monotonic() + 5
+        while prefetcher.stats['prepared'] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        # Two ready jobs fill the window, so the third is not claimed yet
+        self.assertEqual(prefetcher.stats['prepared'], 2)
+        self.assertEqual(prefetcher.get(timeout=5), (0, 'prepared 0', None))
+        self.assertEqual(prefetcher.get(timeout=5), (1, 'prepared 1', None))
+        self.assertEqual(prefetcher.get(timeout=5), (2, 'prepared 2', None))
+        while prefetcher.stats['prepared'] < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual([job for job, _, _ in prefetcher.stop()], [3, 4])
+
+    def test_limits_hold_back_preparing_until_the_worker_waits(self):
+        jobs = iter(range(3))
+        prefetcher = JobPrefetcher(lambda: next(jobs, None), lambda job: job, lookahead=3, measure=lambda job: 100,
+                                   max_bytes=100, poll_interval=0.01).start()
+        self.assertEqual(prefetcher.get(timeout=5), (0, 0, None))
+        time.sleep(0.05)
+        # One ready job reaches max_bytes
+        self.assertEqual(prefetcher.stats['prepared'], 2)
+        self.assertGreaterEqual(prefetcher.stats['held_back'], 1)
+        self.assertEqual([job for job, _, _ in prefetcher.stop()], [1])
+
+        # Too little memory: nothing is prepared ahead, but a waiting worker still gets its job
+        jobs = iter(range(3))
+        prefetcher = JobPrefetcher(lambda: next(jobs, None), lambda job: job, min_free_memory=1 << 60,
+                                   poll_interval=0.01).start()
+        time.sleep(0.05)
+        self.assertEqual(prefetcher.stats['prepared'], 0)
+        self.assertEqual(prefetcher.get(timeout=5), (0, 0, None))
+        self.assertEqual(prefetcher.stop(), [])
+
+class TestPrefetchWorker(unittest.TestCase):
+
+    def test_next_job_is_prepared_while_the_current_one_renders(self):
+        store = JobStore(os.path.join(tempfile.mkdtemp(), 'jobs.db'))
+        for topic in ('a', 'b', 'c'):
+            store.add_script(topic, f"script {topic}")
+        creator = FakeCreator(failing=('b',))
+        prefetch_worker(store, creator, 'w1', 'image', 'male', 'en', idle_timeout=0, poll_interval=0.02,
+                        scheduler=None, prefetch={'lookahead': 1})
+
+        events = creator.events
+        self.assertLess(events.index(('prepare', 'b')), events.index(('rendered', 'a')))
+        self.assertEqual([event for event in events if event[0] == 'render'], [('render', 'a'), ('render', 'c')])
+        jobs = {job['topic']: job for job in store.jobs()}
+        self.assertEqual((jobs['a']['state'], jobs['c']['state']), (RENDERED, RENDERED))
+        # A failed preparation is retried like any failed job, until its attempts run out
+        self.assertEqual((jobs['b']['state'], jobs['b']['attempts']), (FAILED, 3))
+        self.assertEqual(store.counts()[SCRIPTED], 0)
+        store.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from render_daemon import RenderDaemon, RenderServer
+
+class FakeCreator:
+    """Stands in for ScriptToVideo; each job runs until release is set"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.calls = []
+
+    def create_video(self, script, method, topic, voice_gender, language, on_event, cancelled):
+        self.calls.append(script)
+        on_event('tts', 'started')
+        self.started.set()
+        self.release.wait(5)
+        on_event('tts', 'finished')
+        if cancelled.is_set():
+            raise RuntimeError('cancelled')
+        return f"output/{script}.mp4"
+
+class TestRenderDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.creator = FakeCreator()
+        self.daemon = RenderDaemon(self.creator, max_queue=1)
+        self.daemon.start()
+        self.server = RenderServer(('127.0.0.1', 0), self.daemon)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(self.creator.release.set)
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base + path, data=data, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_coalesces_and_applies_backpressure(self):
+        status, running = self.request('POST', '/jobs', {'script': 'one'})
+        self.assertEqual(status, 202)
+        self.assertTrue(self.creator.started.wait(5))
+        status, same = self.request('POST', '/jobs', {'script': 'one'})
+        self.assertEqual((status, same['id'], same['coalesced']), (200, running['id'], True))
+        self.assertEqual(self.request('POST', '/jobs', {'script': 'two'})[0], 202)
+        self.assertEqual(self.request('POST', '/jobs', {'script': 'three'})[0], 429)
+        self.assertEqual(self.request('POST', '/jobs', {})[0], 400)
+
+    def test_streams_progress_until_rendered(self):
+        _, job = self.request('POST', '/jobs', {'script': 'one'})
+        self.creator.release.set()
+        with urllib.request.urlopen(f"{self.base}/jobs/{job['id']}/events", timeout=5) as response:
+            stream = response.read().decode()
+        events = [json.loads(line[len('data: '):]) for line in stream.splitlines() if line.startswith('data: ')]
+        self.assertEqual([e.get('state') or f"{e['stage']}:{e['status']}" for e in events],
+                         ['queued', 'running', 'tts:started', 'tts:finished', 'rendered'])
+        self.assertEqual(events[-1]['output'], 'output/one.mp4')
+
+    def test_cancel_queued_and_running_jobs(self):
+        _, running = self.request('POST', '/jobs', {'script': 'one'})
+        self.assertTrue(self.creator.started.wait(5))
+        _, queued = self.request('POST', '/jobs', {'script': 'two'})
+        self.assertEqual(self.request('DELETE', f"/jobs/{queued['id']}")[1]['state'], 'cancelled')
+        # The cancelled job no longer takes up the one queue place
+        status, waiting = self.request('POST', '/jobs', {'script': 'three'})
+        self.assertEqual(status, 202)
+        self.request('DELETE', f"/jobs/{waiting['id']}")
+        self.request('DELETE', f"/jobs/{running['id']}")
+        self.creator.release.set()
+        list(self.daemon.events(self.daemon.get(running['id'])))
+        self.assertEqual(self.request('GET', f"/jobs/{running['id']}")[1]['state'], 'cancelled')
+        self.assertEqual(self.creator.calls, ['one'])
+
+if __name__ == '__main__':
+    unittest.main()
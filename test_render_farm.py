@@ -0,0 +1,71 @@
+import os
+import tempfile
+import threading
+import unittest
+from render_farm import ContentStore, RenderCoordinator, RenderWorker, send_request
+
+def write_file(directory, name, data):
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+class TestRenderFarm(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = ContentStore(os.path.join(self.tmp, 'cas'))
+        self.coordinator = RenderCoordinator(self.store, host='127.0.0.1', port=0, lease_seconds=0.5, max_attempts=2)
+        self.address = self.coordinator.start()
+        self.addCleanup(self.coordinator.stop)
+
+    def start_worker(self, render, worker_id):
+        def render_to_file(task, workdir):
+            return write_file(workdir, f"{task['segment']}.bin", render(task))
+        worker = RenderWorker(self.address, self.store, os.path.join(self.tmp, worker_id), render_to_file,
+                              poll_interval=0.05, heartbeat_interval=0.1, worker_id=worker_id)
+        thread = threading.Thread(target=worker.run, args=(1.5,), daemon=True)
+        thread.start()
+        return thread
+
+    def submit(self, count):
+        self.coordinator.submit('job', [{'id': f"job:{n}", 'job': 'job', 'segment': n} for n in range(count)])
+
+    def test_content_store_deduplicates(self):
+        first = self.store.put(write_file(self.tmp, 'a', b'same'))
+        second = self.store.put(write_file(self.tmp, 'b', b'same'))
+        self.assertEqual(first, second)
+        local = self.store.fetch(first, os.path.join(self.tmp, 'local'), '.bin')
+        with open(local, 'rb') as f:
+            self.assertEqual(f.read(), b'same')
+
+    def test_workers_share_tasks_and_results_keep_order(self):
+        self.submit(6)
+        threads = [self.start_worker(lambda task: str(task['segment']).encode(), f"w{n}") for n in range(3)]
+        results = self.coordinator.wait('job', timeout=10)
+        contents = []
+        for digest in results:
+            with open(self.store.path(digest), 'rb') as f:
+                contents.append(f.read())
+        self.assertEqual(contents, [str(n).encode() for n in range(6)])
+        for thread in threads:
+            thread.join()
+
+    def test_lost_worker_task_is_retried(self):
+        self.submit(1)
+        # A worker that leases the task and disappears
+        send_request(self.address, {'op': 'get', 'worker': 'lost'})
+        self.start_worker(lambda task: b'rendered', 'healthy')
+        results = self.coordinator.wait('job', timeout=10)
+        self.assertEqual(len(results), 1)
+
+    def test_task_fails_after_max_attempts(self):
+        self.submit(1)
+        def broken(task):
+            raise ValueError('encoder crashed')
+        self.start_worker(broken, 'broken')
+        with self.assertRaisesRegex(RuntimeError, 'encoder crashed'):
+            self.coordinator.wait('job', timeout=10)
+
+if __name__ == '__main__':
+    unittest.main()
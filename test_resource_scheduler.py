@@ -0,0 +1,100 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from render_daemon import RenderDaemon
+from resource_scheduler import GIB, ResourceScheduler
+
+class TestResourceScheduler(unittest.TestCase):
+
+    def test_slots_and_threads_follow_cores_and_memory(self):
+        scheduler = ResourceScheduler(cores=16, memory=64 * GIB)
+        self.assertEqual((scheduler.max_jobs, scheduler.level), (8, 4))
+        plan = scheduler.acquire()
+        self.assertEqual((plan.encoder_threads, plan.decode_threads, plan.compute_threads), (4, 2, 4))
+        # Memory for three jobs caps them however many cores there are
+        self.assertEqual(ResourceScheduler(cores=16, memory=5 * GIB, job_memory=1.5 * GIB).max_jobs, 3)
+
+    def test_acquire_waits_for_a_free_slot(self):
+        scheduler = ResourceScheduler(cores=4, memory=64 * GIB, max_jobs=1)
+        plan = scheduler.acquire()
+        self.assertIsNone(scheduler.acquire(timeout=0.05))
+        threading.Timer(0.05, scheduler.release, args=(plan,), kwargs={'record': False}).start()
+        self.assertIsNotNone(scheduler.acquire(timeout=5))
+
+    def test_concurrency_climbs_to_the_best_measured_level(self):
+        # Jobs speed up until 3 run at once, then contention wins: 3 gives the most videos per hour
+        job_seconds = {1: 100, 2: 110, 3: 130, 4: 240, 5: 400, 6: 600}
+        scheduler = ResourceScheduler(cores=12, memory=64 * GIB, max_jobs=6, initial_threads=12, samples=2,
+                                      reprobe_after=1000)
+        self.assertEqual(scheduler.level, 1)
+        for _ in range(40):
+            plan = scheduler.acquire()
+            scheduler.release(plan, seconds=job_seconds[plan.level])
+        self.assertEqual(scheduler.level, 3)
+        self.assertAlmostEqual(scheduler.throughput(3), 3600 * 3 / 130)
+        self.assertIsNone(scheduler.throughput(5))
+        self.assertIn('3 of at most 6 jobs', scheduler.report())
+
+class Concurrency:
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+class SlowCreator:
+    def __init__(self, concurrency=None):
+        self.concurrency = concurrency or Concurrency()
+        self.video_creator = SimpleNamespace(threads=None, decode_threads=None, clip_analyzer=None)
+        self.jobs = 0
+
+    def create_video(self, script, method, topic, voice_gender, language, on_event, cancelled):
+        concurrency = self.concurrency
+        with concurrency.lock:
+            concurrency.running += 1
+            concurrency.peak = max(concurrency.peak, concurrency.running)
+        self.jobs += 1
+        time.sleep(0.1)
+        with concurrency.lock:
+            concurrency.running -= 1
+        return f"output/{script}.mp4"
+
+class TestScheduledDaemon(unittest.TestCase):
+
+    def test_daemon_runs_as_many_jobs_as_the_scheduler_allows(self):
+        concurrency = Concurrency()
+        creators = []
+        def creator_factory():
+            creators.append(SlowCreator(concurrency))
+            return creators[-1]
+        scheduler = ResourceScheduler(cores=8, memory=64 * GIB, initial_threads=4, samples=100)
+        with self.assertRaises(ValueError):
+            RenderDaemon(SlowCreator(), scheduler=scheduler)
+        daemon = RenderDaemon(creator_factory(), max_queue=8, scheduler=scheduler, creator_factory=creator_factory)
+        daemon.start()
+        jobs = [daemon.submit({'script': f"script {number}"})[0] for number in range(6)]
+        deadline = time.monotonic() + 5
+        while any(job.state != 'rendered' for job in jobs) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertTrue(all(job.state == 'rendered' for job in jobs))
+        self.assertEqual(concurrency.peak, 2)
+        # One creator per worker, each pinned to its own job's plan
+        self.assertEqual(len(creators), scheduler.max_jobs)
+        self.assertEqual({creator.video_creator.threads for creator in creators if creator.jobs}, {4})
+
+    def test_idle_workers_hold_no_slot_and_idle_time_is_not_job_time(self):
+        scheduler = ResourceScheduler(cores=4, memory=64 * GIB, max_jobs=1, samples=1)
+        daemon = RenderDaemon(SlowCreator(), scheduler=scheduler)
+        daemon.start()
+        time.sleep(0.3)
+        self.assertEqual(scheduler._running.value, 0)
+        job, _ = daemon.submit({'script': 'script'})
+        deadline = time.monotonic() + 5
+        while scheduler.throughput(1) is None and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(job.state, 'rendered')
+        # The 0.1s job, without the 0.3s the worker waited for it
+        self.assertLess(3600 / scheduler.throughput(1), 0.25)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+from shared_file import locked, read_json, version, write_json
+
+def append_numbers(path, numbers):
+    for number in numbers:
+        with locked(path):
+            entries = read_json(path, [])
+            entries.append(number)
+            write_json(path, entries)
+
+class TestSharedFile(unittest.TestCase):
+
+    def test_processes_appending_under_the_lock_lose_nothing(self):
+        path = os.path.join(tempfile.mkdtemp(), 'index.json')
+        processes = [multiprocessing.Process(target=append_numbers, args=(path, range(n * 50, n * 50 + 50)))
+                     for n in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(sorted(read_json(path, [])), list(range(200)))
+        # Only the file and its lock are left
+        self.assertEqual(sorted(os.listdir(os.path.dirname(path))), ['index.json', 'index.json.lock'])
+
+    def test_version_changes_with_every_write(self):
+        path = os.path.join(tempfile.mkdtemp(), 'index.json')
+        self.assertIsNone(version(path))
+        first = write_json(path, [1])
+        self.assertEqual(version(path), first)
+        self.assertNotEqual(write_json(path, [1]), first)
+
+if __name__ == '__main__':
+    unittest.main()
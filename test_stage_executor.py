@@ -0,0 +1,56 @@
+import time
+import unittest
+from stage_executor import StageGraph, StageError
+
+class TestStageGraph(unittest.TestCase):
+
+    def test_independent_stages_overlap(self):
+        graph = StageGraph(max_workers=4)
+        graph.add('a', lambda inputs: time.sleep(0.2) or 'a')
+        graph.add('b', lambda inputs: time.sleep(0.2) or 'b')
+        graph.add('join', lambda inputs: inputs['a'] + inputs['b'], deps=['a', 'b'])
+        start = time.monotonic()
+        results = graph.run()
+        self.assertLess(time.monotonic() - start, 0.35)
+        self.assertEqual(results['join'], 'ab')
+
+    def test_stage_can_add_stages(self):
+        graph = StageGraph()
+        def fan_out(inputs):
+            names = [graph.add(f"item_{i}", lambda inputs, i=i: i * i) for i in range(3)]
+            graph.add('barrier', lambda inputs: sorted(inputs.values()), deps=names)
+        graph.add('fan_out', fan_out)
+        graph.add('final', lambda inputs: inputs['barrier'], deps=['fan_out', 'barrier'])
+        self.assertEqual(graph.run()['final'], [0, 1, 4])
+
+    def test_critical_path_follows_slowest_dependency(self):
+        graph = StageGraph()
+        graph.add('fast', lambda inputs: None)
+        graph.add('slow', lambda inputs: time.sleep(0.1))
+        graph.add('render', lambda inputs: None, deps=['fast', 'slow'])
+        graph.run()
+        self.assertEqual([name for name, _ in graph.critical_path()], ['slow', 'render'])
+        self.assertIn('slow', graph.report())
+
+    def test_failure_stops_dependents(self):
+        events = []
+        graph = StageGraph(on_event=lambda name, status: events.append((name, status)))
+        graph.add('tts', lambda inputs: 1 / 0)
+        graph.add('render', lambda inputs: None, deps=['tts'])
+        with self.assertRaises(StageError) as cm:
+            graph.run()
+        self.assertEqual(cm.exception.stage, 'tts')
+        self.assertIsInstance(cm.exception.__cause__, ZeroDivisionError)
+        self.assertIn(('tts', 'failed'), events)
+        self.assertNotIn(('render', 'started'), events)
+
+    def test_cancel_stops_launching(self):
+        graph = StageGraph()
+        graph.add('first', lambda inputs: graph.cancel())
+        graph.add('second', lambda inputs: None, deps=['first'])
+        with self.assertRaises(StageError):
+            graph.run()
+        self.assertIsNone(graph.stages['second'].started)
+
+if __name__ == '__main__':
+    unittest.main()
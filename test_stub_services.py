@@ -0,0 +1,70 @@
+import asyncio
+import os
+import tempfile
+import unittest
+import wave
+import requests
+from image_downloader import ImageDownloader, sniff_image_size
+from stub_services import Faults, StubServer, tts_command
+from text_to_speech import TextToSpeechGenerator
+from topics_to_scripts import AsyncGroqClient, build_script_payload
+from workspace import Workspace
+
+class TestStubServices(unittest.TestCase):
+
+    def start(self, faults=None):
+        server = StubServer(faults=faults).start()
+        self.addCleanup(server.stop)
+        return server
+
+    def test_google_search_results_are_probed_and_downloaded(self):
+        server = self.start()
+        downloader = ImageDownloader(google_url=server.url)
+        workspace = Workspace(tempfile.mkdtemp(), 'job')
+
+        path = downloader.download_image(1, 'honey', workspace=workspace)
+
+        self.assertEqual(os.path.dirname(path), workspace.folder('images'))
+        with open(path, 'rb') as f:
+            self.assertEqual(sniff_image_size(f.read()), (1080, 1920))
+        self.assertEqual(server.stats['google']['requests'], 1)
+
+    def test_truncated_body_fails_the_transfer(self):
+        server = self.start({'*': Faults(truncate_rate=1.0)})
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            requests.get(f"{server.url}/prompt/honey", timeout=5).content
+        self.assertEqual(server.stats['pollinations']['truncated'], 1)
+
+    def test_script_client_retries_through_errors_and_429s(self):
+        server = self.start({'groq': Faults(error_rate=0.3, rate_limit_rate=0.3, retry_after=0)})
+        client = AsyncGroqClient('stub', api_url=server.groq_url, rate=100, burst=10, backoff=0.01, max_retries=20)
+
+        async def run():
+            async with client.session() as session:
+                return await asyncio.gather(*(client.complete(session, build_script_payload(str(n)))
+                                              for n in range(10)))
+
+        self.assertTrue(all(asyncio.run(run())))
+        stats = server.stats['groq']
+        self.assertEqual(stats['ok'], 10)
+        self.assertEqual(client.stats['retries'], stats['error'] + stats['rate_limited'])
+
+    def test_tts_stand_in_writes_narration_and_subtitles(self):
+        directory = tempfile.mkdtemp()
+        audio_path = os.path.join(directory, 'speech.wav')
+        subtitles_path = os.path.join(directory, 'speech.srt')
+
+        success, _ = TextToSpeechGenerator(command=tts_command()).generate_speech(
+            'one two three four five six', output_path=audio_path, subtitles_path=subtitles_path)
+
+        self.assertTrue(success)
+        with wave.open(audio_path) as f:
+            self.assertAlmostEqual(f.getnframes() / f.getframerate(), 6 * 0.35, places=2)
+        with open(subtitles_path) as f:
+            self.assertIn('00:00:01,750 --> 00:00:02,100\nsix', f.read())
+        failed, _ = TextToSpeechGenerator(command=tts_command(Faults(error_rate=1.0))).generate_speech(
+            'one', output_path=audio_path, subtitles_path=subtitles_path)
+        self.assertFalse(failed)
+
+if __name__ == '__main__':
+    unittest.main()
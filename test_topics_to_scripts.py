@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from aiohttp import web
+from topics_to_scripts import AsyncGroqClient, generate_scripts, load_completed
+
+class StubChatCompletions:
+    """Local stand-in for the chat-completions endpoint"""
+
+    def __init__(self, rate_limit_first=0, fail_topics=()):
+        self.rate_limit_first = rate_limit_first
+        self.fail_topics = fail_topics
+        self.calls = []
+
+    async def handle(self, request):
+        body = await request.json()
+        content = body["messages"][0]["content"]
+        self.calls.append((time.monotonic(), content))
+        if len(self.calls) <= self.rate_limit_first:
+            return web.Response(status=429, headers={'Retry-After': '0.3'})
+        if any(topic in content for topic in self.fail_topics):
+            return web.Response(status=500)
+        topic = content.split("viral video about: ")[1].split(".")[0]
+        return web.json_response({"choices": [{"message": {"content": f"Script for {topic}"}}]})
+
+class TestAsyncScriptGeneration(unittest.IsolatedAsyncioTestCase):
+
+    async def start_stub(self, stub):
+        app = web.Application()
+        app.router.add_post('/openai/v1/chat/completions', stub.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        self.addAsyncCleanup(runner.cleanup)
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/openai/v1/chat/completions"
+
+    def setUp(self):
+        self.output = os.path.join(tempfile.mkdtemp(), 'scripts.jsonl')
+
+    async def test_results_persist_incrementally_and_resume(self):
+        stub = StubChatCompletions(fail_topics=('topic 3',))
+        url = await self.start_stub(stub)
+        topics = [f"topic {i}" for i in range(5)]
+        client = AsyncGroqClient('key', api_url=url, concurrency=3, rate=100, burst=5, max_retries=1, backoff=0.01)
+        completed = await generate_scripts(topics, client, self.output)
+        self.assertEqual(sorted(completed), ['topic 0', 'topic 1', 'topic 2', 'topic 4'])
+        self.assertEqual(load_completed(self.output)['topic 4'], 'Script for topic 4')
+
+        # A second run only asks for the topic that failed
+        stub.fail_topics = ()
+        stub.calls.clear()
+        completed = await generate_scripts(topics, client, self.output)
+        self.assertEqual(len(stub.calls), 1)
+        self.assertIn('topic 3', stub.calls[0][1])
+        self.assertEqual(len(completed), 5)
+        with open(self.output) as f:
+            self.assertEqual(len([json.loads(line) for line in f]), 5)
+
+    async def test_retry_after_pauses_all_requests(self):
+        stub = StubChatCompletions(rate_limit_first=1)
+        url = await self.start_stub(stub)
+        client = AsyncGroqClient('key', api_url=url, concurrency=2, rate=20, burst=1, backoff=0.01)
+        completed = await generate_scripts(['a', 'b'], client, self.output)
+        self.assertEqual(len(completed), 2)
+        self.assertEqual(client.stats['rate_limited'], 1)
+        # Every request after the 429 waited for Retry-After
+        first_429 = stub.calls[0][0]
+        self.assertTrue(all(t - first_429 >= 0.28 for t, _ in stub.calls[1:]))
+
+if __name__ == '__main__':
+    unittest.main()
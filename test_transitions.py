@@ -0,0 +1,64 @@
+import unittest
+import numpy as np
+from transitions import TRANSITIONS, crossfade, fit_frame, plan_segments, slide_left, wipe_right
+
+class TestTransitions(unittest.TestCase):
+
+    def setUp(self):
+        self.a = np.zeros((8, 4, 3), dtype=np.uint8)
+        self.b = np.full((8, 4, 3), 200, dtype=np.uint8)
+
+    def test_blends_keep_shape_and_endpoints(self):
+        for name, blend in TRANSITIONS.items():
+            start = blend(self.a, self.b, 0.0)
+            end = blend(self.a, self.b, 1.0)
+            self.assertEqual(blend(self.a, self.b, 0.5).shape, self.a.shape, name)
+            np.testing.assert_array_equal(start, self.a, err_msg=name)
+            np.testing.assert_array_equal(end, self.b, err_msg=name)
+
+    def test_crossfade_midpoint(self):
+        self.assertEqual(int(crossfade(self.a, self.b, 0.5)[0, 0, 0]), 100)
+
+    def test_slide_and_wipe_split_columns(self):
+        slid = slide_left(self.a, self.b, 0.5)
+        self.assertTrue((slid[:, :2] == 0).all() and (slid[:, 2:] == 200).all())
+        wiped = wipe_right(self.a, self.b, 0.25)
+        self.assertTrue((wiped[:, :1] == 200).all() and (wiped[:, 1:] == 0).all())
+
+    def test_fit_frame_crops_and_pads(self):
+        big = np.ones((10, 6, 3), dtype=np.uint8)
+        self.assertEqual(fit_frame(big, (4, 8)).shape, (8, 4, 3))
+        small = np.ones((4, 2, 3), dtype=np.uint8)
+        padded = fit_frame(small, (4, 8))
+        self.assertEqual(padded.shape, (8, 4, 3))
+        self.assertEqual(int(padded.sum()), small.size)
+
+    def test_plan_segments_only_blends_overlap_windows(self):
+        segments, starts = plan_segments([4, 4, 4], transition_duration=1, effect='crossfade')
+        kinds = [s.kind for s in segments]
+        self.assertEqual(kinds, ['hold', 'transition', 'hold', 'transition', 'hold'])
+        self.assertEqual((segments[1].start, segments[1].end), (3.5, 4.5))
+        self.assertEqual(starts, [0.0, 3.5, 7.5])
+        self.assertAlmostEqual(sum(s.duration for s in segments), 12)
+
+    def test_plan_segments_clamps_and_hard_cuts(self):
+        segments, _ = plan_segments([1, 1], transition_duration=5, effect='zoom_in')
+        self.assertEqual([(s.kind, s.start, s.end) for s in segments],
+                         [('hold', 0.0, 0.5), ('transition', 0.5, 1.5), ('hold', 1.5, 2.0)])
+        segments, starts = plan_segments([2, 3], transition_duration=1, effect=None)
+        self.assertEqual([s.kind for s in segments], ['hold', 'hold'])
+        self.assertEqual(starts, [0.0, 2.0])
+        with self.assertRaises(ValueError):
+            plan_segments([1, 1], effect='spin')
+
+    def test_plan_segments_snaps_bounds_to_frames(self):
+        fps = 30
+        segments, starts = plan_segments([57.13 / 9] * 9, transition_duration=1, effect='crossfade', fps=fps)
+        for t in [s.start for s in segments] + [s.end for s in segments] + starts:
+            self.assertAlmostEqual(t * fps, round(t * fps), places=6)
+        # Whole frames per segment, adding up to the timeline's
+        self.assertEqual(sum(round(s.duration * fps) for s in segments), round(57.13 * fps))
+        self.assertEqual([s.kind for s in segments].count('transition'), 8)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from translation import ScriptTranslator, pack_requests, split_sentences
+
+class FakeTranslator:
+    """Upper-cases text and records every request"""
+    requests = []
+
+    def __init__(self, source='auto', target='en'):
+        self.target = target
+
+    def translate(self, text):
+        FakeTranslator.requests.append(text)
+        return text.upper()
+
+    def translate_batch(self, batch):
+        return [self.translate(text) for text in batch]
+
+@patch('translation.GoogleTranslator', FakeTranslator)
+class TestScriptTranslator(unittest.TestCase):
+
+    def setUp(self):
+        FakeTranslator.requests = []
+
+    def test_split_and_pack(self):
+        self.assertEqual(split_sentences('One. Two! Three? शहद। Four'), ['One.', 'Two!', 'Three?', 'शहद।', 'Four'])
+        self.assertEqual(pack_requests(['aaaa', 'bbbb', 'cc'], max_chars=10), [['aaaa', 'bbbb'], ['cc']])
+
+    def test_sentences_are_batched_and_memoized(self):
+        translator = ScriptTranslator()
+        self.assertEqual(translator.translate('Honey never spoils. It lasts.', 'hi'), 'HONEY NEVER SPOILS. IT LASTS.')
+        self.assertEqual(FakeTranslator.requests, ['Honey never spoils.\nIt lasts.'])
+        translator.translate('Honey never spoils. Bees made it.', 'hi')
+        self.assertEqual(FakeTranslator.requests[1:], ['Bees made it.'])
+        self.assertEqual(translator.stats, {'hits': 1, 'misses': 3, 'requests': 2})
+        translator.translate('It lasts.', 'es')
+        self.assertEqual(FakeTranslator.requests[2:], ['It lasts.'])
+
+    def test_cache_persists(self):
+        path = os.path.join(tempfile.mkdtemp(), 'translations.json')
+        ScriptTranslator(cache_path=path).translate('Honey never spoils.', 'hi')
+        self.assertEqual(ScriptTranslator(cache_path=path).translate('Honey never spoils.', 'hi'),
+                         'HONEY NEVER SPOILS.')
+        self.assertEqual(len(FakeTranslator.requests), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,20 @@ import unittest
 from video_creator import VideoCreator
 from unittest.mock import patch, MagicMock
 import os
+import tempfile
+import wave
+import imageio_ffmpeg
+import numpy as np
+from PIL import Image
+from moviepy import ColorClip, CompositeVideoClip, VideoFileClip, concatenate_videoclips
+
+def write_silence(path, seconds):
+    """Silent mono WAV narration of the given length"""
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(np.zeros(8000 * seconds, dtype=np.int16).tobytes())
 
 class TestVideoCreator(unittest.TestCase):
 
@@ -42,5 +56,121 @@ class TestVideoCreator(unittest.TestCase):
         if os.path.exists(temp_output_path):
             os.remove(temp_output_path)
 
+class TestLoopedRender(unittest.TestCase):
+
+    def test_short_timeline_is_encoded_once_and_looped(self):
+        directory = tempfile.mkdtemp()
+        audio_path = os.path.join(directory, 'narration.wav')
+        write_silence(audio_path, 3)
+        output_path = os.path.join(directory, 'out.mp4')
+
+        video_creator = VideoCreator()
+        scenes = [ColorClip((32, 32), color=color, duration=1) for color in ((255, 0, 0), (0, 0, 255))]
+        pieces = video_creator.compose_scenes(scenes, [0.5, 0.5], (32, 32), None, 0)
+        # White box shown only during the last second of the narration
+        overlay = ColorClip((8, 8), color=(255, 255, 255)).with_start(2).with_duration(1).with_position((4, 4))
+        video_creator.write_looped(pieces, [overlay], audio_path, 3.0, output_path, (32, 32), 10, '200k')
+
+        clip = VideoFileClip(output_path)
+        self.assertAlmostEqual(clip.duration, 3.0, delta=0.15)
+        # The red/blue base repeats every second
+        self.assertGreater(clip.get_frame(1.2)[20, 20, 0], 200)
+        self.assertGreater(clip.get_frame(1.7)[20, 20, 2], 200)
+        # The overlay follows narration time, not the looped base
+        self.assertLess(clip.get_frame(1.2)[8, 8, 1], 100)
+        self.assertGreater(clip.get_frame(2.2)[8, 8, 1], 200)
+        clip.close()
+
+class TestSegmentedRender(unittest.TestCase):
+
+    def test_segments_add_up_to_the_timeline_frame_for_frame(self):
+        directory = tempfile.mkdtemp()
+        output_path = os.path.join(directory, 'out.mp4')
+        fps = 24
+        video_creator = VideoCreator()
+        scenes = [ColorClip((32, 32), color=(30 * n, 0, 0), duration=1.2) for n in range(7)]
+        pieces = video_creator.compose_scenes(scenes, [4.19 / 7] * 7, (32, 32), 'crossfade', 0.3, fps)
+        video_creator.write_segmented(pieces, [], None, None, output_path, (32, 32), fps, '200k')
+        frames, _ = imageio_ffmpeg.count_frames_and_secs(output_path)
+        self.assertEqual(frames, round(4.19 * fps))
+
+class TestFrameMemo(unittest.TestCase):
+
+    def test_still_scenes_composite_once_per_caption_change(self):
+        directory = tempfile.mkdtemp()
+        image_paths = []
+        for number, color in enumerate(((255, 0, 0), (0, 0, 255))):
+            image_paths.append(os.path.join(directory, f"{number}.png"))
+            Image.new('RGB', (32, 32), color).save(image_paths[-1])
+        overlay = ColorClip((8, 8), color=(255, 255, 255)).with_start(0.5).with_duration(0.5).with_position((4, 4))
+
+        for zoom_rate, composited in ((0, 3), (0.5, 20)):
+            video_creator = VideoCreator(zoom_rate=zoom_rate)
+            scenes = [video_creator.scene_clip(path, 1, (32, 32)) for path in image_paths]
+            pieces = video_creator.compose_scenes(scenes, [1, 1], (32, 32), None, 0)
+            clips = [clip for _, clip in pieces]
+            clip, frames = video_creator.composite(clips, [overlay], 2.0)
+            reference = CompositeVideoClip([concatenate_videoclips(clips), overlay])
+            for number in range(20):
+                np.testing.assert_array_equal(clip.get_frame(number / 10), reference.get_frame(number / 10))
+            # Red, red with the box, blue; with zoom every frame differs
+            self.assertEqual(frames.stats, {'frames': 20, 'composited': composited})
+
+class TestVariants(unittest.TestCase):
+
+    def test_base_is_stretched_to_the_narration(self):
+        directory = tempfile.mkdtemp()
+        audio_path = os.path.join(directory, 'narration.wav')
+        write_silence(audio_path, 3)
+        base_path = os.path.join(directory, 'base.mp4')
+        output_path = os.path.join(directory, 'out.mp4')
+
+        video_creator = VideoCreator()
+        scenes = [ColorClip((32, 32), color=color, duration=1) for color in ((255, 0, 0), (0, 0, 255))]
+        pieces = video_creator.compose_scenes(scenes, [1, 1], (32, 32), None, 0)
+        video_creator.write_looped(pieces, [], audio_path, 2.0, base_path, (32, 32), 10, '200k')
+        video_creator.create_variant(base_path, 2.0, audio_path, None, output_path, (32, 32), 10, '200k')
+
+        clip = VideoFileClip(output_path)
+        self.assertAlmostEqual(clip.duration, 3.0, delta=0.15)
+        # Each scene keeps half of the longer narration
+        self.assertGreater(clip.get_frame(1.3)[16, 16, 0], 200)
+        self.assertGreater(clip.get_frame(1.7)[16, 16, 2], 200)
+        self.assertGreater(clip.get_frame(2.8)[16, 16, 2], 200)
+        clip.close()
+
+    def test_caption_font_follows_script(self):
+        video_creator = VideoCreator()
+        self.assertEqual(video_creator.caption_font('शहद कभी खराब नहीं होता'), 'TiroDevanagariHindi-Regular.ttf')
+        self.assertEqual(video_creator.caption_font('العسل لا يفسد'), 'Arial.ttf')
+        self.assertEqual(video_creator.caption_font('La miel nunca se echa a perder'), 'HussarBoldCondensed-mmrV.otf')
+
+class TestContactSheet(unittest.TestCase):
+
+    def test_samples_only_requested_frames(self):
+        directory = tempfile.mkdtemp()
+        image_folder = os.path.join(directory, 'images')
+        os.makedirs(image_folder)
+        for index, color in enumerate(('red', 'blue')):
+            Image.new('RGB', (32, 32), color).save(os.path.join(image_folder, f"{index:02d}.png"))
+        audio_path = os.path.join(directory, 'narration.wav')
+        write_silence(audio_path, 2)
+        subtitles_path = os.path.join(directory, 'subtitles.srt')
+        with open(subtitles_path, 'w') as f:
+            f.write("1\n00:00:00,000 --> 00:00:01,000\nHello\n\n")
+
+        output_dir = os.path.join(directory, 'preview')
+        sheet_path = VideoCreator().create_contact_sheet(
+            image_folder, audio_path, subtitles_path, output_dir, timestamps=[0.25, 1.75],
+            transition_duration=0, transition_effect=None, resolution=(32, 32), thumbnail_width=16)
+
+        frames = sorted(name for name in os.listdir(output_dir) if name.startswith('frame_'))
+        self.assertEqual(len(frames), 2)
+        with Image.open(os.path.join(output_dir, frames[0])) as first, Image.open(os.path.join(output_dir, frames[1])) as second:
+            self.assertGreater(first.getpixel((2, 2))[0], 200)
+            self.assertGreater(second.getpixel((2, 2))[2], 200)
+        with Image.open(sheet_path) as sheet:
+            self.assertEqual(sheet.size, (32, 16))
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from workspace import Workspace, WorkspaceCleaner, new_job_id
+
+class TestWorkspace(unittest.TestCase):
+
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+
+    def test_jobs_get_separate_folders(self):
+        first = Workspace(self.temp, new_job_id()).create()
+        second = Workspace(self.temp, new_job_id()).create()
+        self.assertNotEqual(first.path('images', '01.jpg'), second.path('images', '01.jpg'))
+        self.assertTrue(os.path.isdir(first.folder('scratch')))
+        self.assertEqual(first.directories(), [first.root])
+
+    def test_shared_layout_without_job_id(self):
+        workspace = Workspace(self.temp)
+        self.assertEqual(workspace.path('videos', '01.mp4'), os.path.join(self.temp, 'videos', '01.mp4'))
+
+    def test_scratch_root_is_removed_with_the_job(self):
+        scratch_root = tempfile.mkdtemp()
+        workspace = Workspace(self.temp, 'job', scratch_root=scratch_root).create()
+        segments = workspace.scratch_dir('segments_')
+        self.assertTrue(segments.startswith(scratch_root))
+
+        cleaner = WorkspaceCleaner()
+        cleaner.remove(workspace)
+        cleaner.drain()
+        self.assertFalse(os.path.exists(workspace.root))
+        self.assertFalse(os.path.exists(workspace.scratch))
+        with self.assertRaises(ValueError):
+            cleaner.remove(Workspace(self.temp))
+
+    def test_queued_removals_finish_before_the_process_exits(self):
+        workspace = Workspace(self.temp, 'job').create()
+        subprocess.run([sys.executable, '-c', f"from workspace import Workspace, WorkspaceCleaner; "
+                        f"WorkspaceCleaner().remove(Workspace({self.temp!r}, 'job'))"],
+                       cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+        self.assertFalse(os.path.exists(workspace.root))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,8 +3,31 @@ import edge_tts
 import asyncio
 import subprocess
 from datetime import datetime
+from karaoke import group_words, save_srt, save_words
+
+VOICE = "en-US-AndrewMultilingualNeural"
+RATE = "+5%"
+PITCH = "+10Hz"
+TICKS_PER_SECOND = 10_000_000  # edge-tts offsets are in 100 ns units
+# Native voices per language; other languages are read by the multilingual VOICE
+VOICES = {
+    'en': {'male': VOICE, 'female': "en-US-AvaMultilingualNeural"},
+    'hi': {'male': "hi-IN-MadhurNeural", 'female': "hi-IN-SwaraNeural"},
+    'es': {'male': "es-ES-AlvaroNeural", 'female': "es-ES-ElviraNeural"},
+    'fr': {'male': "fr-FR-HenriNeural", 'female': "fr-FR-DeniseNeural"},
+    'de': {'male': "de-DE-ConradNeural", 'female': "de-DE-KatjaNeural"},
+    'pt': {'male': "pt-BR-AntonioNeural", 'female': "pt-BR-FranciscaNeural"},
+}
+
+def voice_for(language, voice_gender='male'):
+    voices = VOICES.get(language, {})
+    return voices.get(voice_gender, voices.get('male', VOICE))
 
 class TextToSpeechGenerator:
+
+  def __init__(self, command='edge-tts'):
+        # Executable (or argument list) that speaks edge-tts's command line
+        self.command = [command] if isinstance(command, str) else list(command)
     
   def detect_language(self, text):
         """Detect the language of input text"""
@@ -14,7 +37,8 @@ class TextToSpeechGenerator:
             # Default to English if detection fails
             return 'en'          
 
-  def generate_speech(self, text, voice_gender='male', output_path=None,subtitles_path=None, force_language=None):
+  def generate_speech(self, text, voice_gender='male', output_path=None,subtitles_path=None, force_language=None,
+                      words_path=None, voice=None):
       """
       Main function to generate speech from text
       
@@ -23,6 +47,9 @@ class TextToSpeechGenerator:
       voice_gender (str): 'male' or 'female'
       output_path (str): Custom output path (optional)
       force_language (str): Force specific language ('en' or 'hi')
+      words_path (str): Also write per-word timings here (karaoke.save_words format); the
+          subtitles are then cues grouped from the words
+      voice (str): edge-tts voice name (e.g. from voice_for); VOICE when None
       
       Returns:
       tuple: (success (bool), message (str))
@@ -33,14 +60,16 @@ class TextToSpeechGenerator:
               output_path = f"speech_output_{timestamp}.wav"
       
       story = text
+      voice = voice or VOICE
+      if words_path:
+          return self.generate_speech_with_words(story, output_path, subtitles_path, words_path, voice)
 
       # Define the edge-tts command
-      command = [
-          "edge-tts",
+      command = self.command + [
           #"--voice", "hi-IN-MadhurNeural",
-          "--voice", "en-US-AndrewMultilingualNeural",
-          "--rate", "+5%",
-          "--pitch", "+10Hz",
+          "--voice", voice,
+          "--rate", RATE,
+          "--pitch", PITCH,
           "--text", story,
           "--write-media", output_path,
           "--write-subtitles", subtitles_path
@@ -54,8 +83,34 @@ class TextToSpeechGenerator:
       print(result.stdout)
       print("Errors:")
       print(result.stderr)
-      return True , result.stdout+" "+result.stderr
-      
-      #if no error return true and stdout else return false and stderr
+      return result.returncode == 0, result.stdout+" "+result.stderr
           
 
+  def generate_speech_with_words(self, text, output_path, subtitles_path, words_path, voice=VOICE):
+      """
+      Synthesize with edge-tts's Python API, which reports word boundaries
+      (the command line only writes sentence-level subtitles).
+      """
+      async def synthesize():
+          communicate = edge_tts.Communicate(text, voice, rate=RATE, pitch=PITCH, boundary="WordBoundary")
+          words = []
+          with open(output_path, 'wb') as audio:
+              async for chunk in communicate.stream():
+                  if chunk["type"] == "audio":
+                      audio.write(chunk["data"])
+                  elif chunk["type"] == "WordBoundary":
+                      start = chunk["offset"] / TICKS_PER_SECOND
+                      words.append((chunk["text"], start, start + chunk["duration"] / TICKS_PER_SECOND))
+          return words
+
+      try:
+          words = asyncio.run(synthesize())
+      except Exception as e:
+          return False, f"edge-tts failed: {e}"
+      if not words:
+          return False, "edge-tts returned no word boundaries"
+      cues = group_words(words, text=text)
+      save_words(cues, words_path)
+      if subtitles_path:
+          save_srt(cues, subtitles_path)
+      return True, f"{len(words)} words in {len(cues)} cues"
@@ -2,22 +2,26 @@ import requests
 import pandas as pd
 import os
 import time
+import json
+import random
+import asyncio
+import argparse
+import aiohttp
+from job_store import JobStore
 
 # Configuration
 API_KEY = ""  # Replace with your Groq API key
+API_URL = "https://api.groq.com/openai/v1/chat/completions"
 TOPICS_FILE = "topics.txt"  # File containing 100 topics (one per line)
+OUTPUT_JSONL = "viral_scripts.jsonl"  # Results are appended here as they arrive
 OUTPUT_EXCEL = "viral_scripts.xlsx"
+JOB_STORE = "jobs.db"  # Render workers in automate_scripts_to_video.py claim scripts from here
 
-def get_groq_script(prompt, api_key):
+def build_script_payload(prompt):
     """
-    Generate a 140-word script using Groq API.
+    Chat-completions request body asking for a 140-word script about prompt.
     """
-    headers = {
-        'Authorization': f'Bearer {api_key}',
-        'Content-Type': 'application/json'
-    }
-
-    data = {
+    return {
         "model": "mixtral-8x7b-32768",
         "messages": [
             {
@@ -29,10 +33,19 @@ def get_groq_script(prompt, api_key):
         "max_tokens": 400
     }
 
+def get_groq_script(prompt, api_key, api_url=API_URL):
+    """
+    Generate a 140-word script using Groq API.
+    """
+    headers = {
+        'Authorization': f'Bearer {api_key}',
+        'Content-Type': 'application/json'
+    }
+
     response = requests.post(
-        "https://api.groq.com/openai/v1/chat/completions",
+        api_url,
         headers=headers,
-        json=data
+        json=build_script_payload(prompt)
     )
 
     if response.status_code == 200:
@@ -41,26 +54,205 @@ def get_groq_script(prompt, api_key):
     else:
         return None
 
-def main():
-    # Read topics from file
-    with open(TOPICS_FILE, 'r') as f:
-        topics = [line.strip() for line in f.readlines()]
+class TokenBucket:
+    """
+    Async token bucket shared by all requests to one API.
+
+    Tokens refill at rate per second up to capacity. pause() empties the
+    bucket until a given time, which is how a 429 Retry-After is honoured
+    by every worker, not only the one that received it.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        now = time.monotonic()
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0
+        self.updated = now
 
-    # Generate scripts
-    data = []
-    for topic in topics:
+def parse_retry_after(value, default):
+    """Seconds to wait from a Retry-After header (delta-seconds form)"""
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+class AsyncGroqClient:
+    """
+    Rate-limited async client for an OpenAI-compatible chat-completions endpoint.
+
+    Concurrency is bounded by a semaphore, request starts by a TokenBucket.
+    429 responses pause the bucket for Retry-After seconds; 5xx responses and
+    network errors are retried with exponential backoff.
+    """
+
+    def __init__(self, api_key, api_url=API_URL, concurrency=4, rate=0.5, burst=2,
+                 max_retries=5, backoff=1.0, timeout=60):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.concurrency = concurrency
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.stats = {'requests': 0, 'retries': 0, 'rate_limited': 0, 'failed': 0}
+
+    def session(self):
+        headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+        return aiohttp.ClientSession(headers=headers, timeout=self.timeout)
+
+    async def complete(self, session, payload):
+        """
+        Send one chat-completions request with retries.
+
+        Returns:
+            str: The message content, or None if every attempt failed
+        """
+        async with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    self.stats['retries'] += 1
+                await self.bucket.acquire()
+                self.stats['requests'] += 1
+                delay = self.backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+                try:
+                    async with session.post(self.api_url, json=payload) as response:
+                        if response.status == 200:
+                            data = await response.json()
+                            return data["choices"][0]["message"]["content"]
+                        if response.status == 429:
+                            self.stats['rate_limited'] += 1
+                            self.bucket.pause(parse_retry_after(response.headers.get('Retry-After'), delay))
+                            continue
+                        if response.status < 500:
+                            print(f"Request rejected with status {response.status}: {await response.text()}")
+                            break
+                except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError) as e:
+                    print(f"Request failed ({type(e).__name__}): {e}")
+                await asyncio.sleep(delay)
+            self.stats['failed'] += 1
+            return None
+
+def load_completed(output_path):
+    """Topics already scripted by an earlier run, read from the JSONL output"""
+    completed = {}
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+            if record.get("Script"):
+                completed[record["Topic"]] = record["Script"]
+    return completed
+
+def append_result(output_path, record):
+    """Append one result and flush it so a crash cannot lose it"""
+    with open(output_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+async def generate_scripts(topics, client, output_path=OUTPUT_JSONL, on_result=None):
+    """
+    Generate scripts for every topic not already in output_path.
+
+    Args:
+        topics: Topics in the order they should appear in the export.
+        client: AsyncGroqClient used for the requests.
+        output_path: JSONL file results are appended to as they arrive.
+        on_result: Optional callback(topic, script) run for each new script.
+
+    Returns:
+        dict: topic -> script for every completed topic, including earlier runs
+    """
+    completed = load_completed(output_path)
+    pending = [topic for topic in dict.fromkeys(topics) if topic and topic not in completed]
+    print(f"{len(completed)} topics already scripted, {len(pending)} to go")
+
+    async def worker(session, topic):
         print(f"Generating script for: {topic}")
-        script = get_groq_script(topic, API_KEY)
+        script = await client.complete(session, build_script_payload(topic))
         if script:
-            data.append({"Topic": topic, "Script": script})
+            append_result(output_path, {"Topic": topic, "Script": script})
+            completed[topic] = script
+            if on_result:
+                on_result(topic, script)
         else:
             print(f"Failed to generate script for: {topic}")
-        # Add a 3-second wait between API calls
-        time.sleep(3)
-    # Create DataFrame and save to Excel
+
+    async with client.session() as session:
+        await asyncio.gather(*(worker(session, topic) for topic in pending))
+    return completed
+
+def export_excel(topics, completed, excel_path=OUTPUT_EXCEL):
+    """Write completed scripts to Excel in topic order"""
+    data = [{"Topic": topic, "Script": completed[topic]} for topic in dict.fromkeys(topics) if topic in completed]
     df = pd.DataFrame(data)
-    df.to_excel(OUTPUT_EXCEL, index=False)
-    print("Scripts generated and saved to:", OUTPUT_EXCEL)
+    df.to_excel(excel_path, index=False)
+    print("Scripts generated and saved to:", excel_path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate video scripts for a list of topics')
+    parser.add_argument('--topics', default=TOPICS_FILE, help='File with one topic per line')
+    parser.add_argument('--output', default=OUTPUT_JSONL, help='JSONL file results are appended to')
+    parser.add_argument('--store', default=JOB_STORE, help='Job store render workers read from (empty to skip)')
+    parser.add_argument('--excel', default='', help=f'Optional Excel export, e.g. {OUTPUT_EXCEL}')
+    parser.add_argument('--concurrency', type=int, default=4, help='Maximum requests in flight')
+    parser.add_argument('--rate', type=float, default=0.5, help='Request starts per second')
+    args = parser.parse_args()
+
+    # Read topics from file
+    with open(args.topics, 'r') as f:
+        topics = [line.strip() for line in f.readlines()]
+
+    client = AsyncGroqClient(API_KEY or os.environ.get('GROQ_API_KEY', ''),
+                             concurrency=args.concurrency, rate=args.rate)
+    store = JobStore(args.store) if args.store else None
+    on_result = None
+    if store:
+        store.add_topics([topic for topic in topics if topic])
+        # Each script becomes claimable by render workers the moment it arrives
+        on_result = store.add_script
+    completed = asyncio.run(generate_scripts(topics, client, args.output, on_result))
+    print(f"Request stats: {client.stats}")
+    if store:
+        # Scripts resumed from an earlier run's JSONL
+        for topic, script in completed.items():
+            store.add_script(topic, script)
+        print(f"Job store {args.store}: {store.counts()}")
+    if args.excel:
+        export_excel(topics, completed, args.excel)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
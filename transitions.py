@@ -0,0 +1,239 @@
+"""
+Transition effects and timeline planning for VideoCreator.
+
+Every transition is a vectorized numpy blend of two equally sized RGB frames.
+A timeline is planned as alternating segments: 'hold' segments read frames
+from a single scene clip untouched, and 'transition' segments cover only the
+overlap window around each cut, which is the only place a blend is computed.
+"""
+import numpy as np
+
+
+def ease(p):
+    """Smoothstep easing so transitions start and end gently."""
+    p = min(max(p, 0.0), 1.0)
+    return p * p * (3.0 - 2.0 * p)
+
+
+def crossfade(a, b, p):
+    """Linear mix of frame a into frame b using 8-bit fixed point weights."""
+    w = int(round(p * 256))
+    if w <= 0:
+        return a
+    if w >= 256:
+        return b
+    mixed = a.astype(np.uint16) * (256 - w) + b.astype(np.uint16) * w
+    return (mixed >> 8).astype(np.uint8)
+
+
+def _slide(a, b, p, axis, reverse):
+    size = a.shape[axis]
+    offset = int(round(p * size))
+    if offset <= 0:
+        return a
+    if offset >= size:
+        return b
+    if reverse:
+        # b enters from the start edge and pushes a towards the end edge
+        parts = (np.take(b, range(size - offset, size), axis=axis),
+                 np.take(a, range(0, size - offset), axis=axis))
+    else:
+        # b enters from the end edge and pushes a towards the start edge
+        parts = (np.take(a, range(offset, size), axis=axis),
+                 np.take(b, range(0, offset), axis=axis))
+    return np.concatenate(parts, axis=axis)
+
+
+def slide_left(a, b, p):
+    return _slide(a, b, p, axis=1, reverse=False)
+
+
+def slide_right(a, b, p):
+    return _slide(a, b, p, axis=1, reverse=True)
+
+
+def slide_up(a, b, p):
+    return _slide(a, b, p, axis=0, reverse=False)
+
+
+def slide_down(a, b, p):
+    return _slide(a, b, p, axis=0, reverse=True)
+
+
+def _scale_center(frame, scale):
+    """Nearest-neighbour zoom around the frame centre, keeping the frame size."""
+    if scale == 1.0:
+        return frame
+    h, w = frame.shape[:2]
+    ys = ((np.arange(h) - h / 2.0) / scale + h / 2.0).astype(np.intp)
+    xs = ((np.arange(w) - w / 2.0) / scale + w / 2.0).astype(np.intp)
+    np.clip(ys, 0, h - 1, out=ys)
+    np.clip(xs, 0, w - 1, out=xs)
+    return frame[ys[:, None], xs[None, :]]
+
+
+def zoom_in(a, b, p):
+    """Push into frame a while it dissolves into frame b."""
+    return crossfade(_scale_center(a, 1.0 + 0.5 * p), b, p)
+
+
+def zoom_out(a, b, p):
+    """Frame b settles from a close-up to full view while a dissolves away."""
+    return crossfade(a, _scale_center(b, 1.5 - 0.5 * p), p)
+
+
+def _wipe(a, b, p, axis, reverse):
+    size = a.shape[axis]
+    edge = int(round(p * size))
+    if edge <= 0:
+        return a
+    if edge >= size:
+        return b
+    out = a.copy()
+    index = [slice(None)] * a.ndim
+    index[axis] = slice(size - edge, size) if reverse else slice(0, edge)
+    index = tuple(index)
+    out[index] = b[index]
+    return out
+
+
+def wipe_right(a, b, p):
+    return _wipe(a, b, p, axis=1, reverse=False)
+
+
+def wipe_left(a, b, p):
+    return _wipe(a, b, p, axis=1, reverse=True)
+
+
+def wipe_down(a, b, p):
+    return _wipe(a, b, p, axis=0, reverse=False)
+
+
+def wipe_up(a, b, p):
+    return _wipe(a, b, p, axis=0, reverse=True)
+
+
+# Available transition effects, keyed by the names accepted by VideoCreator
+TRANSITIONS = {
+    'crossfade': crossfade,
+    'fade': crossfade,
+    'slide_left': slide_left,
+    'slide_right': slide_right,
+    'slide_up': slide_up,
+    'slide_down': slide_down,
+    'zoom_in': zoom_in,
+    'zoom_out': zoom_out,
+    'wipe_left': wipe_left,
+    'wipe_right': wipe_right,
+    'wipe_up': wipe_up,
+    'wipe_down': wipe_down,
+}
+
+
+def fit_frame(frame, size):
+    """
+    Center-crop or pad a frame so it is exactly size=(width, height).
+
+    Blends need both frames to share a shape, and the zoom effect on scene
+    clips grows the frame over time.
+    """
+    width, height = size
+    h, w = frame.shape[:2]
+    if (w, h) == (width, height):
+        return frame
+    if frame.ndim == 3 and frame.shape[2] == 4:
+        frame = frame[:, :, :3]
+    top = max((h - height) // 2, 0)
+    left = max((w - width) // 2, 0)
+    frame = frame[top:top + height, left:left + width]
+    h, w = frame.shape[:2]
+    if (w, h) == (width, height):
+        return frame
+    out = np.zeros((height, width, 3), dtype=np.uint8)
+    y = (height - h) // 2
+    x = (width - w) // 2
+    out[y:y + h, x:x + w] = frame[:, :, :3]
+    return out
+
+
+class Segment:
+    """
+    One piece of a planned timeline.
+
+    kind is 'hold' (frames come straight from scenes[0]) or 'transition'
+    (frames blend scenes[0] into scenes[1]). start/end are timeline seconds.
+    """
+
+    def __init__(self, kind, start, end, scenes, effect=None):
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.scenes = tuple(scenes)
+        self.effect = effect
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def __repr__(self):
+        return (f"Segment({self.kind!r}, {self.start:.3f}, {self.end:.3f}, "
+                f"scenes={self.scenes}, effect={self.effect!r})")
+
+
+def plan_segments(durations, transition_duration=1.0, effect='crossfade', fps=None):
+    """
+    Plan hold and transition segments for scenes played back to back.
+
+    Each cut between scene i and i+1 gets a transition window centred on the
+    cut. Windows are clamped so they never overlap each other.
+
+    With fps, every bound is snapped to the nearest frame. Segments encoded
+    separately then hold a whole number of frames each and add up to the
+    timeline exactly; otherwise each would round its own length up or down.
+
+    Args:
+        durations: Slot length of each scene in seconds.
+        transition_duration: Length of each overlap window in seconds.
+        effect: Name of a transition in TRANSITIONS, or None for hard cuts.
+        fps: Frame rate to snap bounds to, or None to keep them exact.
+
+    Returns:
+        tuple: (segments, scene_starts) where scene_starts[i] is the timeline
+        time at which scene i's local clock is zero.
+    """
+    if effect is not None and effect not in TRANSITIONS:
+        raise ValueError(f"Unknown transition '{effect}'. Available: {sorted(TRANSITIONS)}")
+
+    def snap(t):
+        return round(t * fps) / fps if fps else t
+
+    cuts = []
+    position = 0.0
+    for duration in durations:
+        position += duration
+        cuts.append(position)
+    total = snap(position)
+    cuts = cuts[:-1]
+
+    if effect is None or transition_duration <= 0 or not cuts:
+        half = [0.0] * len(cuts)
+    else:
+        half = []
+        for k, cut in enumerate(cuts):
+            # Half window may not exceed half of either neighbouring slot
+            limit = min(durations[k], durations[k + 1]) / 2.0
+            half.append(min(transition_duration / 2.0, limit))
+
+    windows = [(snap(cut - h), snap(cut + h)) for cut, h in zip(cuts, half)]
+    scene_starts = [0.0] + [window_start for window_start, _ in windows]
+    segments = []
+    hold_start = 0.0
+    for k, (window_start, window_end) in enumerate(windows):
+        if window_start > hold_start:
+            segments.append(Segment('hold', hold_start, window_start, (k,)))
+        if window_end > window_start:
+            segments.append(Segment('transition', window_start, window_end, (k, k + 1), effect))
+        hold_start = window_end
+    if total > hold_start:
+        segments.append(Segment('hold', hold_start, total, (len(durations) - 1,)))
+    return segments, scene_starts
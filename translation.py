@@ -0,0 +1,117 @@
+"""
+Batched, memoized script translation for multi-language variants.
+
+A script is split into sentences and only sentences not translated before
+are sent, packed into as few requests as the service's size limit allows
+(one line per sentence). Results are memoized by language and a hash of the
+sentence, so a script edited in one place costs one sentence, not a whole
+re-translation.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from deep_translator import GoogleTranslator
+from keyword_extractor import text_key
+
+logger = logging.getLogger(__name__)
+
+MAX_REQUEST_CHARS = 4500  # Google Translate rejects requests over 5000 characters
+SENTENCE_BREAK = re.compile(r'(?<=[.!?।])\s+')
+
+
+def split_sentences(text):
+    return [sentence for sentence in SENTENCE_BREAK.split(text.strip()) if sentence]
+
+
+def pack_requests(texts, max_chars=MAX_REQUEST_CHARS):
+    """Group texts into batches whose newline-joined length stays under max_chars"""
+    batches = [[]]
+    size = 0
+    for text in texts:
+        if batches[-1] and size + len(text) + 1 > max_chars:
+            batches.append([])
+            size = 0
+        batches[-1].append(text)
+        size += len(text) + 1
+    return [batch for batch in batches if batch]
+
+
+class ScriptTranslator:
+    """
+    Translates scripts sentence by sentence, caching every sentence.
+
+    Example:
+        translator = ScriptTranslator(cache_path='translations.json')
+        hindi = translator.translate(script, 'hi')
+    """
+
+    def __init__(self, source='auto', cache_path=None, max_request_chars=MAX_REQUEST_CHARS):
+        """
+        Args:
+            source: Language of the scripts, or 'auto' to let the service detect it.
+            cache_path: JSON file to persist translations in, or None for memory only.
+            max_request_chars: Size limit of one request to the service.
+        """
+        self.source = source
+        self.cache_path = cache_path
+        self.max_request_chars = max_request_chars
+        self.cache = {}
+        self.stats = {'hits': 0, 'misses': 0, 'requests': 0}
+        self._lock = threading.Lock()
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                self.cache = json.load(f)
+
+    def translate_many(self, texts, target):
+        """
+        Translations of texts into target, in order.
+
+        Returns:
+            list: One translated string per text
+        """
+        keys = [f"{target}:{text_key(text)}" for text in texts]
+        with self._lock:
+            missing = {key: text for key, text in zip(keys, texts) if key not in self.cache}
+            self.stats['hits'] += len(keys) - len(missing)
+            self.stats['misses'] += len(missing)
+        if missing:
+            results = {}
+            translator = GoogleTranslator(source=self.source, target=target)
+            missing_keys = list(missing)
+            for batch in pack_requests(list(missing.values()), self.max_request_chars):
+                # Batches keep the order of missing, so they line up with its keys
+                batch_keys = missing_keys[len(results):len(results) + len(batch)]
+                results.update(zip(batch_keys, self._translate_batch(translator, batch)))
+            with self._lock:
+                self.cache.update(results)
+                if self.cache_path:
+                    self.save()
+        return [self.cache[key] for key in keys]
+
+    def _translate_batch(self, translator, batch):
+        """One request for the whole batch; per-sentence requests if the lines don't come back intact"""
+        with self._lock:
+            self.stats['requests'] += 1
+        translated = (translator.translate('\n'.join(batch)) or '').split('\n')
+        if len(translated) == len(batch):
+            return [line.strip() for line in translated]
+        logger.warning(f"Batched translation returned {len(translated)} lines for {len(batch)}, "
+                       f"translating them one by one")
+        with self._lock:
+            self.stats['requests'] += len(batch)
+        return translator.translate_batch(batch)
+
+    def translate(self, text, target):
+        """Translate a script; the source language itself is returned unchanged"""
+        if target == self.source:
+            return text
+        sentences = split_sentences(text)
+        return ' '.join(self.translate_many(sentences, target))
+
+    def save(self):
+        if not self.cache_path:
+            return
+        with open(self.cache_path, 'w', encoding='utf-8') as f:
+            json.dump(self.cache, f, ensure_ascii=False)
@@ -1,13 +1,25 @@
 import os
-from moviepy import ImageClip, AudioFileClip, concatenate_videoclips, CompositeVideoClip, VideoFileClip , TextClip
+from moviepy import ImageClip, AudioFileClip, concatenate_videoclips, CompositeVideoClip, VideoFileClip , TextClip, VideoClip
 #from moviepy.video.fx.transition_sequence import TransitionSequence----- no longer supported
 from moviepy.video import fx as vfx
+from moviepy.config import FFMPEG_BINARY
 import glob
-from PIL import Image
+from PIL import Image, ImageDraw
 from tqdm import tqdm
 import logging
 import traceback
 import re
+import subprocess
+import tempfile
+import math
+import shutil
+from moviepy.tools import compute_position
+from transitions import TRANSITIONS, ease, fit_frame, plan_segments
+from frame_cache import decode_image
+from clip_analysis import best_window
+from frame_memo import MemoizedFrames, keyed, shifted_key, timeline_key, video_frame_index, zoom_size
+from workspace import Workspace
+import karaoke
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -19,17 +31,29 @@ class VideoCreator:
     # Supported video formats
     SUPPORTED_VIDEO_FORMATS = ('.mp4')
     
-    # Available transition effects
-    TRANSITIONS = {
-        #'fade': lambda clip: (FadeIn(clip, 0.5), FadeOut(clip, 0.5)),
-        'slide_left': lambda clip: clip.set_position(lambda t: (max(0, 500-1000*t), 0)),
-        'slide_right': lambda clip: clip.set_position(lambda t: (min(0, -500+1000*t), 0)),
-        'zoom_in': lambda clip: clip.resize(lambda t: 1 + 0.5*t),
-        'zoom_out': lambda clip: clip.resize(lambda t: 2 - 0.5*t)
-    }
+    # Available transition effects (vectorized frame blends, see transitions.py)
+    TRANSITIONS = TRANSITIONS
     
-    def __init__(self):
+    def __init__(self, render_farm=None, clip_analyzer=None, frame_cache=None, fragment_seconds=None,
+                 zoom_rate=0.05, variable_frame_rate=False, threads=None, decode_threads=None):
         self.progress_bar = None
+        # RenderCoordinator from render_farm.py; when set, segments are encoded by worker nodes
+        self.render_farm = render_farm
+        # ClipAnalyzer from clip_analysis.py; when set, stock clips are cut to their liveliest window
+        self.clip_analyzer = clip_analyzer
+        # FrameCache from frame_cache.py; when set, images are decoded once into memory-mapped frames
+        self.frame_cache = frame_cache
+        # When set, final MP4s are fragmented into pieces of about this many seconds, so they can be
+        # streamed while being written (see fragment_stream.py)
+        self.fragment_seconds = fragment_seconds
+        # Growth of each scene per second (0 keeps scenes still, so their holds composite a single frame)
+        self.zoom_rate = zoom_rate
+        # Drop repeated frames from single-pass outputs instead of encoding them (see frame_rate_flags)
+        self.variable_frame_rate = variable_frame_rate
+        # Encoder and decoder threads of every ffmpeg this creator runs (None lets ffmpeg use all cores);
+        # set per job by resource_scheduler.apply_thread_limits
+        self.threads = threads
+        self.decode_threads = decode_threads
     
     def create_image_video(self, 
                     image_folder, 
@@ -40,7 +64,11 @@ class VideoCreator:
                     transition_effect='zoom_in',
                     resolution=(1080, 1920),
                     fps=30,
-                    bitrate="8000k"):
+                    bitrate="8000k",
+                    segmented=False,
+                    encoded_audio_path=None,
+                    max_scene_duration=None,
+                    workspace=None):
         """
         Create a video from images and audio with enhanced features.
         
@@ -48,11 +76,17 @@ class VideoCreator:
         image_folder (str): Path to folder containing images
         audio_path (str): Path to WAV audio file
         output_path (str): Path where the output MP4 will be saved
-        transition_duration (int): Duration for each image in seconds
-        transition_effect (str): Type of transition ('fade', 'slide_left', 'slide_right', 'zoom_in', 'zoom_out')
+        transition_duration (float): Length of the overlap window around each cut in seconds
+        transition_effect (str): Name of a transition in TRANSITIONS, or None for hard cuts
         resolution (tuple): Output video resolution (width, height)
         fps (int): Frames per second
         bitrate (str): Video bitrate (higher = better quality)
+        segmented (bool): Encode hold and transition segments separately and join them by stream copy
+        encoded_audio_path (str): AAC version of the audio from encode_audio, muxed by stream copy
+        max_scene_duration (float): Cap on each scene's slot; if the scenes then fall short of the
+            audio, the timeline is encoded once and looped
+        workspace (Workspace): Job workspace whose scratch folder takes the intermediates
+            (resized images, segments); None keeps them next to the output
         """
         try:
             logger.info("Starting video creation process...")
@@ -76,32 +110,20 @@ class VideoCreator:
             image_files.sort()
             logger.info(f"Found {len(image_files)} images")
             image_duration= audio_duration/len(image_files)
+            if max_scene_duration:
+                image_duration = min(image_duration, max_scene_duration)
             
             # Create progress bar for image processing
             progress_bar = tqdm(total=len(image_files), desc="Processing images")
             
-            # Create video clips from images with transitions
-            image_clips = []
+            # Verify images and resize them to the target resolution
+            resized_image_paths = []
             for image_path in image_files:
-                # Verify image and resize to target resolution
                 try:
-                    with Image.open(image_path) as img:
-                        img = img.resize(resolution, Image.LANCZOS)
-                        img = img.convert('RGB')  # Convert to RGB mode
-                        # Extract the base name of the image file
-                        base_name = os.path.basename(image_path)
-                        # Create the new path in the temp/images directory
-                        resized_image_path = os.path.join('temp/images', 'resized_' + base_name)
-                        # Save the resized image to the new path
-                        img.save(resized_image_path)
+                    resized_image_paths.append(self.preprocess_image(image_path, resolution, workspace))
                 except Exception as e:
                     logger.error(f"Error processing image {image_path}: {str(e)}")
                     continue
-                # Create video clip from image
-                logger.info("Creating video clip from image..."+resized_image_path)
-                clip = ImageClip(resized_image_path).with_duration(image_duration)  # Set duration for each image
-                zoomed_clip= clip.with_effects([vfx.Resize(lambda t : 1 + 0.05*t)]) #zoom clip over time
-                image_clips.append(zoomed_clip)
                     
                 # Update the progress bar
                 progress_bar.update(1)
@@ -109,74 +131,722 @@ class VideoCreator:
             # Close the progress bar
             progress_bar.close()
 
-            #Load Subtitles 
-            subtitles =self.parse_srt(subtitles_path) 
+            if self.render_farm is not None:
+                self.render_on_farm(resized_image_paths, image_duration, audio, audio_path, subtitles_path,
+                                    output_path, transition_duration, transition_effect, resolution, fps,
+                                    bitrate, encoded_audio_path, workspace)
+                return
+
+            # Create video clips from images. Each clip is long enough to cover
+            # its slot plus the transition windows that overlap its neighbours.
+            image_clips = []
+            for resized_image_path in resized_image_paths:
+                logger.info("Creating video clip from image..."+resized_image_path)
+                image_clips.append(self.scene_clip(resized_image_path, image_duration + transition_duration, resolution))
+
+            overlays = self.create_overlays(subtitles_path, resolution, audio_duration)
+            pieces = self.compose_scenes(
+                image_clips,
+                [image_duration] * len(image_clips),
+                resolution,
+                transition_effect,
+                transition_duration,
+                fps
+            )
+            self.write_video(pieces, overlays, audio, audio_path, output_path, resolution, fps, bitrate, segmented,
+                             encoded_audio_path, workspace)
+            
+            logger.info(f"Video successfully created at: {output_path}")
+            
+        except Exception as e:
+            logger.error(f"Video creator: An error occurred: in {traceback.extract_tb(e.__traceback__)[0]}:\n{str(e)}") 
+            raise
+
+    def scene_clip(self, path, duration, resolution=None):
+        """
+        Slowly zooming clip of one image or video file, duration seconds long.
+
+        With a resolution, images are stretched to it (through the frame cache if set).
+        The clip's frame_key tells frames apart without drawing them (see frame_memo.py).
+        """
+        if path.lower().endswith(self.SUPPORTED_IMAGE_FORMATS):
+            if resolution is None:
+                image = path
+            elif self.frame_cache is not None:
+                image = self.frame_cache.image(path, resolution)
+            else:
+                image = decode_image(path, resolution)
+            clip = ImageClip(image).with_duration(duration)  # Set duration for each image
+            source_key = lambda t: (path, 0)
+        else:
+            clip = VideoFileClip(path) #.target_resolution(width=width, height=height)  # Resize to target resolution
+            clip = clip.with_duration(duration)  # Set duration for each video clip
+            source_fps = clip.fps
+            source_key = lambda t: (path, video_frame_index(t, source_fps))
+        zoom_rate = self.zoom_rate
+        if not zoom_rate:
+            return keyed(clip, source_key)
+        size = clip.size
+        clip = clip.with_effects([vfx.Resize(lambda t : 1 + zoom_rate*t)]) #zoom clip over time
+        return keyed(clip, lambda t: (source_key(t), zoom_size(size, 1 + zoom_rate*t)))
+
+    def trim_clip(self, video_path, duration, workspace=None):
+        """Best window of a stock clip from the clip analyzer, or the clip itself if trimming fails"""
+        try:
+            output_dir = workspace.folder('scratch') if workspace is not None else None
+            return self.clip_analyzer.trim(video_path, duration, output_dir)
+        except Exception as e:
+            logger.warning(f"Could not trim {video_path}, using it from the start: {str(e)}")
+            return video_path
+
+    def render_on_farm(self, scene_paths, scene_duration, audio, audio_path, subtitles_path, output_path,
+                       transition_duration, transition_effect, resolution, fps, bitrate, encoded_audio_path=None,
+                       workspace=None):
+        """Have render farm workers encode the segments, then join them here"""
+        audio_duration = audio.duration
+        audio.close()
+        audio_codec = 'copy' if encoded_audio_path else 'aac'
+        base_duration = scene_duration * len(scene_paths)
+        if base_duration < audio_duration - 1.0 / fps:
+            # Workers encode the bare timeline once; it is looped and subtitled here
+            base_path = self.scratch_path(output_path, '.base.mp4', workspace)
+            self.render_farm.render(self, scene_paths, [scene_duration] * len(scene_paths), transition_duration,
+                                    transition_effect, None, None, base_duration, base_path, resolution, fps, bitrate)
+            try:
+                overlays = self.create_overlays(subtitles_path, resolution, audio_duration)
+                self.overlay_pass(base_path, overlays, encoded_audio_path or audio_path, audio_duration, output_path,
+                                  resolution, fps, bitrate, audio_codec, workspace)
+            finally:
+                os.remove(base_path)
+            logger.info(f"Video successfully created at: {output_path}")
+            return
+        self.render_farm.render(
+            self,
+            scene_paths,
+            [scene_duration] * len(scene_paths),
+            transition_duration,
+            transition_effect,
+            subtitles_path,
+            encoded_audio_path or audio_path,
+            audio_duration,
+            output_path,
+            resolution,
+            fps,
+            bitrate,
+            audio_codec=audio_codec
+        )
+        logger.info(f"Video successfully created at: {output_path}")
+
+    def create_contact_sheet(self,
+                    media_folder,
+                    audio_path,
+                    subtitles_path,
+                    output_dir,
+                    timestamps='scenes',
+                    transition_duration=2,
+                    transition_effect='zoom_in',
+                    resolution=(1080, 1920),
+                    max_scene_duration=None,
+                    columns=4,
+                    thumbnail_width=270):
+        """
+        Render only sampled frames of the planned video, for QA.
+
+        Evaluates the same plan as create_image_video/create_clip_video at the
+        chosen timestamps, without encoding anything. Only the scenes and
+        subtitle cues visible at those timestamps are loaded.
+        
+        Parameters:
+        media_folder (str): Folder with the images or video clips of the video
+        output_dir (str): Folder for the PNG frames and contact_sheet.png
+        timestamps: 'scenes' (scene midpoints), 'cues' (subtitle starts), an int N
+            (N evenly spaced points) or a list of seconds
+        columns (int): Thumbnails per row of the contact sheet
+        thumbnail_width (int): Width of each thumbnail in pixels
+        
+        Returns:
+        str: Path of the contact sheet
+        """
+        resolution = tuple(resolution)
+        media_files = []
+        for format in self.SUPPORTED_IMAGE_FORMATS:
+            media_files.extend(glob.glob(os.path.join(media_folder, f"*{format}")))
+        if not media_files:
+            media_files = glob.glob(os.path.join(media_folder, f"*{self.SUPPORTED_VIDEO_FORMATS}"))
+        if not media_files:
+            raise ValueError(f"No supported images or video clips found in {media_folder}")
+        media_files.sort()
+
+        audio = AudioFileClip(audio_path)
+        audio_duration = audio.duration
+        audio.close()
+        scene_duration = audio_duration / len(media_files)
+        if max_scene_duration:
+            scene_duration = min(scene_duration, max_scene_duration)
+        if transition_effect is not None and transition_effect not in self.TRANSITIONS:
+            transition_effect = None
+        segments, scene_starts = plan_segments([scene_duration] * len(media_files), transition_duration,
+                                               transition_effect)
+        base_duration = scene_duration * len(media_files)
+        cues = self.load_captions(subtitles_path)
+
+        if timestamps == 'scenes':
+            times = [scene_duration * (index + 0.5) for index in range(len(media_files))]
+        elif timestamps == 'cues':
+            times = [cue[0] for cue in cues]
+        elif isinstance(timestamps, int):
+            times = [audio_duration * (index + 0.5) / timestamps for index in range(timestamps)]
+        else:
+            times = list(timestamps)
+
+        scenes = {}
+        def scene(index):
+            # Scene clips are only built for scenes a timestamp lands in
+            if index not in scenes:
+                path = media_files[index]
+                clip = self.scene_clip(path, scene_duration + transition_duration, resolution)
+                if self.clip_analyzer is not None and not path.lower().endswith(self.SUPPORTED_IMAGE_FORMATS):
+                    # Same window trim_clip would cut, found without encoding it
+                    profile = self.clip_analyzer.profile(path)
+                    clip = clip.subclipped(best_window(profile, scene_duration + transition_duration))
+                scenes[index] = clip
+            return scenes[index]
+
+        def scene_frame(index, t):
+            return fit_frame(scene(index).get_frame(t - scene_starts[index]), resolution)
+
+        os.makedirs(output_dir, exist_ok=True)
+        watermark = self.create_overlays(None, resolution, audio_duration)
+        thumbnails = []
+        for number, t in enumerate(tqdm(times, desc="Sampling frames")):
+            t = min(max(t, 0.0), audio_duration)
+            # Looped visuals repeat the base timeline; overlays follow the narration
+            visual_t = min(t % base_duration if t >= base_duration else t, base_duration - 1e-3)
+            segment = next(s for s in segments if s.start <= visual_t < s.end or s is segments[-1])
+            if segment.kind == 'hold':
+                frame = scene_frame(segment.scenes[0], visual_t)
+            else:
+                first, second = segment.scenes
+                blend = self.TRANSITIONS[segment.effect]
+                frame = blend(scene_frame(first, visual_t), scene_frame(second, visual_t),
+                              ease((visual_t - segment.start) / segment.duration))
+            active_cues = [cue for cue in cues if cue[0] <= t < cue[1]]
+            # Karaoke cues bring one clip per word; keep those active at t, shifted to frame time 0
+            captions = [clip for clip in self.caption_clips(active_cues, resolution)
+                        if clip.start <= t < clip.end]
+            layers = [ImageClip(frame).with_duration(1)] + [overlay.with_start(overlay.start - t)
+                                                              for overlay in captions]
+            layers += [overlay.with_start(0) for overlay in watermark]
+            frame = CompositeVideoClip(layers, size=resolution).get_frame(0)
+
+            frame_path = os.path.join(output_dir, f"frame_{number:03d}_{t:07.2f}s.png")
+            image = Image.fromarray(frame.astype('uint8'))
+            image.save(frame_path)
+            thumbnail = image.resize((thumbnail_width, round(thumbnail_width * resolution[1] / resolution[0])))
+            ImageDraw.Draw(thumbnail).text((6, 6), f"{t:.2f}s", fill='yellow', stroke_width=2, stroke_fill='black')
+            thumbnails.append(thumbnail)
+
+        for clip in scenes.values():
+            clip.close()
+        sheet_path = os.path.join(output_dir, 'contact_sheet.png')
+        self.tile_thumbnails(thumbnails, columns).save(sheet_path)
+        logger.info(f"Contact sheet of {len(thumbnails)} frames written to {sheet_path}")
+        return sheet_path
+
+    def tile_thumbnails(self, thumbnails, columns):
+        """Paste equally sized thumbnails into a grid"""
+        width, height = thumbnails[0].size
+        rows = math.ceil(len(thumbnails) / columns)
+        sheet = Image.new('RGB', (width * min(columns, len(thumbnails)), height * rows), 'black')
+        for number, thumbnail in enumerate(thumbnails):
+            sheet.paste(thumbnail, ((number % columns) * width, (number // columns) * height))
+        return sheet
+
+    def preprocess_image(self, image_path, resolution, workspace=None):
+        """
+        Resize an image to the output resolution once.
+
+        The resized copy is kept in the workspace's scratch folder (a 'resized'
+        folder in the shared temp folder without one) and reused while it is
+        newer than the source, so a preprocessing stage can run ahead of the
+        render.
+
+        With a frame cache, the resized frame goes into the cache instead and
+        the original path is returned; scene_clip then maps the cached frame.
+
+        Returns:
+        str: Path of the resized RGB image
+        """
+        if self.frame_cache is not None:
+            self.frame_cache.image(image_path, resolution)
+            return image_path
+        # Extract the base name of the image file
+        base_name = os.path.basename(image_path)
+        if workspace is not None:
+            resized_folder = workspace.folder('scratch')
+        else:
+            resized_folder = os.path.join(Workspace().folder('images'), 'resized')
+            os.makedirs(resized_folder, exist_ok=True)
+        resized_image_path = os.path.join(resized_folder, f"{resolution[0]}x{resolution[1]}_{base_name}")
+        if (os.path.exists(resized_image_path) and
+                os.path.getmtime(resized_image_path) >= os.path.getmtime(image_path)):
+            return resized_image_path
+        with Image.open(image_path) as img:
+            img = img.resize(tuple(resolution), Image.LANCZOS)
+            img = img.convert('RGB')  # Convert to RGB mode
+            # Save the resized image to the new path
+            img.save(resized_image_path)
+        return resized_image_path
+
+    def encode_audio(self, audio_path, output_path, bitrate='192k'):
+        """Pre-encode narration to AAC so the final mux can stream-copy it"""
+        command = [FFMPEG_BINARY, '-y', '-v', 'error', '-i', audio_path, '-vn', '-c:a', 'aac', '-b:a', bitrate, output_path]
+        try:
+            subprocess.run(command, capture_output=True, text=True, check=True)
+        except subprocess.CalledProcessError as e:
+            logger.error(f"ffmpeg audio encode failed: {e.stderr}")
+            raise
+        return output_path
+
+    def create_overlays(self, subtitles_path, resolution, audio_duration):
+        """Build the subtitle clips (none without subtitles_path) and the fixed watermark laid over the scenes"""
+        subtitle_clips = []
+        if subtitles_path:
+            #Load Subtitles
+            subtitles = self.load_captions(subtitles_path)
             # Create text clips from subtitles
-            subtitle_clips = self.create_text_clips(subtitles, video_size=resolution)
+            subtitle_clips = self.caption_clips(subtitles, resolution)
 
-            #add Fixed watermark Textclip
-            watermark_clip = TextClip(font ="Arial.ttf", text="MakeAIvideo.in", font_size=70, color='black',bg_color='rgb(255, 179, 255)', stroke_color='black', stroke_width=2, size=(500, None), method='caption', vertical_align='bottom')
-            watermark_clip = watermark_clip.with_start(0).with_duration(audio_duration).with_position(('right','bottom'))
+        #add Fixed watermark Textclip
+        watermark_clip = TextClip(font ="Arial.ttf", text="MakeAIvideo.in", font_size=70, color='black',bg_color='rgb(255, 179, 255)', stroke_color='black', stroke_width=2, size=(500, None), method='caption', vertical_align='bottom')
+        watermark_clip = watermark_clip.with_start(0).with_duration(audio_duration).with_position(('right','bottom'))
+        return subtitle_clips + [watermark_clip]
 
-            #apply zoom effects in image clips   
-            # zoomed_clips = [
-            #     CompositeVideoClip([
-            #         #clip.with_effects([vfx.Resize(lambda t : 1.3 + 0.3*np.sin(3*t/2))]) ----- working zoom in out
-            #         clip.with_effects([vfx.Resize(lambda t : 1 + 0.05*t)])
-            #         ])
-            #     for clip in image_clips
-            # ]
+    def compose_scenes(self, scene_clips, scene_durations, resolution, transition_effect, transition_duration,
+                       fps=None):
+        """
+        Lay scene clips out on a timeline with transitions between them.
 
+        Hold pieces are plain subclips of one scene, so their frames take the
+        single-source path. Transition pieces only exist for the overlap
+        window around each cut and are the only frames that get blended.
+        With fps, piece bounds fall on frames (see plan_segments), which
+        segmented and farm renders need to keep pace with the audio.
 
-            final_clip = concatenate_videoclips(image_clips, padding=0)
-            # Combine the blank video and text clips
-            final_videoclip = CompositeVideoClip([final_clip] + subtitle_clips + [watermark_clip])
+        Returns:
+        list: (Segment, clip) pairs in timeline order
+        """
+        if transition_effect is not None and transition_effect not in self.TRANSITIONS:
+            logger.warning(f"Unknown transition '{transition_effect}', using hard cuts")
+            transition_effect = None
+        segments, scene_starts = plan_segments(scene_durations, transition_duration, transition_effect, fps)
+        fitted = [self._fitted_clip(clip, resolution) for clip in scene_clips]
 
-            # final_clip = concatenate_videoclips(zoomed_clips, padding=0)
-            
-            # If video is shorter than audio, loop the video
-            if final_videoclip.duration < audio_duration:
-                n_loops = int(audio_duration / final_videoclip.duration) + 1
-                logger.info(f"Looping video {n_loops} times to match audio duration")
-                final_videoclip = concatenate_videoclips([final_videoclip] * n_loops)
-            
-            # Trim video to match audio duration
-            final_clip = final_videoclip.with_duration(audio_duration)
+        pieces = []
+        for segment in segments:
+            if segment.kind == 'hold':
+                index = segment.scenes[0]
+                offset = scene_starts[index]
+                clip = fitted[index].subclipped(segment.start - offset, segment.end - offset)
+                keyed(clip, shifted_key(fitted[index], segment.start - offset))
+            else:
+                clip = self._transition_clip(segment, fitted, scene_starts)
+            pieces.append((segment, clip))
+        logger.info(f"Planned {len(segments)} segments "
+                    f"({sum(1 for s in segments if s.kind == 'transition')} transitions)")
+        return pieces
 
-            
-            
-            # Set audio
-            final_clip = final_clip.with_audio(audio)
-            
+    def _fitted_clip(self, clip, resolution):
+        """Wrap a scene clip so every frame is exactly the output resolution"""
+        size = tuple(resolution)
+        return keyed(VideoClip(
+            frame_function=lambda t: fit_frame(clip.get_frame(t), size),
+            duration=clip.duration
+        ), getattr(clip, 'frame_key', None))
+
+    def _transition_clip(self, segment, fitted, scene_starts):
+        """Clip covering one overlap window, blending the outgoing scene into the next"""
+        first, second = segment.scenes
+        clip_a, clip_b = fitted[first], fitted[second]
+        offset_a = segment.start - scene_starts[first]
+        offset_b = segment.start - scene_starts[second]
+        blend = self.TRANSITIONS[segment.effect]
+        duration = segment.duration
+
+        def frame_function(t):
+            return blend(clip_a.get_frame(offset_a + t), clip_b.get_frame(offset_b + t), ease(t / duration))
+
+        return VideoClip(frame_function=frame_function, duration=duration)
+
+    def write_video(self, pieces, overlays, audio, audio_path, output_path, resolution, fps, bitrate, segmented=False,
+                    encoded_audio_path=None, workspace=None):
+        """Composite overlays on the planned pieces and write the final MP4"""
+        audio_duration = audio.duration
+        base_duration = sum(segment.duration for segment, _ in pieces)
+        if base_duration < audio_duration - 1.0 / fps:
+            # Visuals are shorter than the narration: encode them once and loop
+            self.write_looped(pieces, overlays, encoded_audio_path or audio_path, audio_duration, output_path,
+                              resolution, fps, bitrate, segmented, audio_codec='copy' if encoded_audio_path else 'aac',
+                              workspace=workspace)
+            audio.close()
+            return
+        if segmented:
+            self.write_segmented(pieces, overlays, encoded_audio_path or audio_path, audio_duration, output_path,
+                                 resolution, fps, bitrate, audio_codec='copy' if encoded_audio_path else 'aac',
+                                 workspace=workspace)
+            audio.close()
+            return
+
+        # Combine the scenes and text clips, trimmed to match audio duration
+        final_clip, frames = self.composite([clip for _, clip in pieces], overlays, audio_duration)
+        ffmpeg_params = self.output_flags(fps) + self.frame_rate_flags(fps)
+
+        if encoded_audio_path and self.fragment_seconds:
+            # One pass that copies the AAC narration in, so fragments appear while encoding
             logger.info("Writing output file... This may take a while.")
-            # Write output file with progress bar
             final_clip.write_videofile(
                 output_path,
                 fps=fps,
                 codec='libx264',
-                audio_codec='aac',
                 bitrate=bitrate,
-                logger=None  # Disable moviepy's logger as we're using our own
+                audio=encoded_audio_path,
+                audio_codec='copy',
+                ffmpeg_params=ffmpeg_params,
+                threads=self.threads,
+                logger=None
             )
-            
-            # Clean up
+            logger.info(frames.report())
             final_clip.close()
             audio.close()
-            
-            logger.info(f"Video successfully created at: {output_path}")
-            
-        except Exception as e:
-            logger.error(f"Video creator: An error occurred: in {traceback.extract_tb(e.__traceback__)[0]}:\n{str(e)}") 
+            return
+
+        if encoded_audio_path:
+            # Narration is already AAC: write pictures only and mux by stream copy
+            video_only_path = self.scratch_path(output_path, '.video.mp4', workspace)
+            logger.info("Writing output file... This may take a while.")
+            final_clip.write_videofile(
+                video_only_path,
+                fps=fps,
+                codec='libx264',
+                bitrate=bitrate,
+                audio=False,
+                ffmpeg_params=self.frame_rate_flags(fps) or None,
+                threads=self.threads,
+                logger=None
+            )
+            logger.info(frames.report())
+            final_clip.close()
+            audio.close()
+            self.concat_segments([video_only_path], output_path, audio_path=encoded_audio_path,
+                                 duration=audio_duration, audio_codec='copy')
+            os.remove(video_only_path)
+            return
+
+        # Set audio
+        final_clip = final_clip.with_audio(audio)
+
+        logger.info("Writing output file... This may take a while.")
+        # Write output file with progress bar
+        final_clip.write_videofile(
+            output_path,
+            fps=fps,
+            codec='libx264',
+            audio_codec='aac',
+            bitrate=bitrate,
+            ffmpeg_params=ffmpeg_params or None,
+            threads=self.threads,
+            logger=None  # Disable moviepy's logger as we're using our own
+        )
+        logger.info(frames.report())
+
+        # Clean up
+        final_clip.close()
+        audio.close()
+
+    def write_looped(self, pieces, overlays, audio_path, audio_duration, output_path, resolution, fps, bitrate,
+                     segmented=False, audio_codec='aac', workspace=None):
+        """
+        Encode the base timeline once and repeat it under the narration.
+
+        The looped copies are never rendered again: without overlays the base
+        file is repeated by stream copy, otherwise one ffmpeg pass loops it
+        and burns the overlays in at their narration times.
+        """
+        base_duration = sum(segment.duration for segment, _ in pieces)
+        n_loops = math.ceil(audio_duration / base_duration)
+        logger.info(f"Visuals cover {base_duration:.2f}s of {audio_duration:.2f}s audio; "
+                    f"encoding them once and looping {n_loops} times")
+        base_path = self.scratch_path(output_path, '.base.mp4', workspace)
+        if segmented:
+            self.write_segmented(pieces, [], None, base_duration, base_path, resolution, fps, bitrate,
+                                 workspace=workspace)
+        else:
+            base_clip, frames = self.composite([clip for _, clip in pieces], [], base_duration)
+            base_clip.write_videofile(
+                base_path,
+                fps=fps,
+                codec='libx264',
+                bitrate=bitrate,
+                audio=False,
+                pixel_format='yuv420p',
+                threads=self.threads,
+                logger=None
+            )
+            logger.info(frames.report())
+            base_clip.close()
+        try:
+            if overlays:
+                self.overlay_pass(base_path, overlays, audio_path, audio_duration, output_path, resolution, fps,
+                                  bitrate, audio_codec, workspace)
+            else:
+                self.concat_segments([base_path] * n_loops, output_path, audio_path=audio_path,
+                                     duration=audio_duration, audio_codec=audio_codec)
+        finally:
+            os.remove(base_path)
+
+    def composite(self, clips, overlays, duration, resolution=None):
+        """
+        Clips played one after another with overlays on top, duration seconds long.
+
+        A frame is composited only when its state key (see frame_memo.py)
+        differs from the previous frame's; otherwise that frame is reused.
+
+        Returns:
+        tuple: (clip, MemoizedFrames whose stats count the frames composited)
+        """
+        base = concatenate_videoclips(clips, padding=0) if len(clips) > 1 else clips[0]
+        size = tuple(resolution) if resolution is not None else None
+        composite = CompositeVideoClip([base] + overlays, size=size)
+        frames = MemoizedFrames(composite.get_frame, timeline_key(clips, overlays))
+        clip = VideoClip(frame_function=frames, duration=duration)
+        # VideoClip drew frame 0 to learn its size; the first written frame reuses it
+        frames.stats['frames'] = 0
+        return clip, frames
+
+    def frame_rate_flags(self, fps):
+        """
+        ffmpeg options dropping repeated frames when variable_frame_rate is set.
+
+        Only exact repeats are dropped, and at most fps in a row so a still
+        scene keeps a frame every second.
+        """
+        if not self.variable_frame_rate:
+            return []
+        return ['-vf', f"mpdecimate=hi=0:lo=0:frac=0:max={fps}", '-fps_mode', 'vfr']
+
+    def thread_flags(self, decode=False):
+        """ffmpeg thread options: the decoder's (placed before an input) or the encoder's and filters'"""
+        if decode:
+            return ['-threads', str(self.decode_threads)] if self.decode_threads else []
+        if not self.threads:
+            return []
+        return ['-threads', str(self.threads), '-filter_complex_threads', str(self.threads)]
+
+    def output_flags(self, fps=None):
+        """
+        ffmpeg options for final outputs: none normally, fragmented MP4 when fragment_seconds is set.
+
+        Pass fps for an encoding pass so keyframes, where fragments start, come every fragment_seconds;
+        stream copies cut at the keyframes they already have.
+        """
+        if not self.fragment_seconds:
+            return []
+        flags = ['-movflags', '+frag_keyframe+empty_moov+default_base_moof', '-flush_packets', '1']
+        if fps:
+            flags += ['-force_key_frames', f"expr:gte(t,n_forced*{self.fragment_seconds})"]
+        return flags
+
+    def scratch_dir(self, prefix, output_path, workspace=None):
+        """Fresh directory for intermediates: in the workspace's scratch folder, else next to the output"""
+        if workspace is not None:
+            return workspace.scratch_dir(prefix)
+        return tempfile.mkdtemp(prefix=prefix, dir=os.path.dirname(os.path.abspath(output_path)))
+
+    def scratch_path(self, output_path, suffix, workspace=None):
+        """Path of an intermediate file derived from the output path"""
+        if workspace is not None:
+            return workspace.path('scratch', os.path.basename(output_path) + suffix)
+        return output_path + suffix
+
+    def overlay_images(self, overlays, resolution, directory):
+        """
+        Render each overlay clip to an RGBA PNG the way CompositeVideoClip would draw it.
+
+        Overlays are static text, so their first frame stands for the whole clip.
+
+        Returns:
+        list: (png path, x, y, start, end) per overlay
+        """
+        images = []
+        for number, overlay in enumerate(overlays):
+            image = Image.fromarray(overlay.get_frame(0).astype('uint8'))
+            if overlay.mask is not None:
+                mask = Image.fromarray((overlay.mask.get_frame(0) * 255).astype('uint8')).convert('L')
+                image = image.convert('RGBA')
+                image.putalpha(mask.resize(image.size))
+            x, y = compute_position(image.size, tuple(resolution), overlay.pos(0), overlay.relative_pos)
+            path = os.path.join(directory, f"overlay_{number:03d}.png")
+            image.save(path)
+            images.append((path, x, y, overlay.start, overlay.end))
+        return images
+
+    def overlay_pass(self, base_path, overlays, audio_path, audio_duration, output_path, resolution, fps, bitrate,
+                     audio_codec='aac', workspace=None, stretch=1.0):
+        """
+        Loop an encoded base video for the whole narration and burn the overlays in with ffmpeg.
+
+        stretch scales the base's timestamps first (2.0 plays it at half speed).
+        """
+        directory = self.scratch_dir('overlays_', output_path, workspace)
+        try:
+            images = self.overlay_images(overlays, resolution, directory)
+            command = [FFMPEG_BINARY, '-y', '-v', 'error'] + self.thread_flags(decode=True)
+            command += ['-stream_loop', '-1', '-i', base_path]
+            filters = []
+            last = '0:v'
+            if abs(stretch - 1.0) > 1e-6:
+                filters.append(f"[0:v]setpts={stretch:.6f}*PTS[base]")
+                last = 'base'
+            for number, (path, x, y, start, end) in enumerate(images, 1):
+                command += ['-i', path]
+                end = audio_duration if end is None else end
+                filters.append(f"[{last}][{number}:v]overlay=x={x}:y={y}:enable='between(t,{start:.3f},{end:.3f})'[v{number}]")
+                last = f"v{number}"
+            filters.append(f"[{last}]format=yuv420p[out]")
+            command += ['-i', audio_path, '-filter_complex', ';'.join(filters),
+                        '-map', '[out]', '-map', f"{len(images) + 1}:a",
+                        '-c:v', 'libx264', '-b:v', bitrate, '-r', str(fps), '-c:a', audio_codec,
+                        '-t', f"{audio_duration:.3f}"] + self.thread_flags() + self.output_flags(fps) + [output_path]
+            subprocess.run(command, capture_output=True, text=True, check=True)
+        except subprocess.CalledProcessError as e:
+            logger.error(f"ffmpeg overlay pass failed: {e.stderr}")
             raise
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def create_variant(self, base_path, base_duration, audio_path, subtitles_path, output_path,
+                       resolution=(1080, 1920), fps=30, bitrate="8000k", workspace=None):
+        """
+        Dub a caption-free base video: burn in one language's captions and mux its narration.
+
+        The base is stretched to the narration's length, so every scene keeps
+        its share of the timeline whichever language is the longest.
+
+        Parameters:
+        base_path (str): Video rendered without subtitles (see create_image_video / create_clip_video)
+        base_duration (float): Length of the base video in seconds
+        audio_path (str): Narration in this language
+        subtitles_path (str): SRT or .words.json captions in this language, or None
+        output_path (str): Path where the output MP4 will be saved
+        workspace (Workspace): Job workspace whose scratch folder takes the overlay images
+        """
+        audio = AudioFileClip(audio_path)
+        audio_duration = audio.duration
+        audio.close()
+        overlays = self.caption_clips(self.load_captions(subtitles_path), resolution) if subtitles_path else []
+        logger.info(f"Dubbing {base_path} with {audio_path} ({audio_duration:.2f}s) into {output_path}")
+        self.overlay_pass(base_path, overlays, audio_path, audio_duration, output_path, resolution, fps, bitrate,
+                          workspace=workspace, stretch=audio_duration / base_duration)
+
+    def write_segmented(self, pieces, overlays, audio_path, audio_duration, output_path, resolution, fps, bitrate,
+                        audio_codec='aac', workspace=None):
+        """
+        Encode each segment to its own file and join them without re-encoding.
+
+        All segments share codec, fps and pixel format, so the ffmpeg concat
+        demuxer can stream-copy them into the output while muxing the audio.
+        """
+        segment_dir = self.scratch_dir('segments_', output_path, workspace)
+        segment_files = []
+        for number, (segment, clip) in enumerate(tqdm(pieces, desc="Rendering segments")):
+            segment_path = os.path.join(segment_dir, f"segment_{number:03d}.mp4")
+            self.write_segment(clip, segment.start, segment.end, overlays, segment_path, resolution, fps, bitrate)
+            segment_files.append(segment_path)
+        self.concat_segments(segment_files, output_path, audio_path=audio_path, duration=audio_duration,
+                             audio_codec=audio_codec)
+        for segment_path in segment_files:
+            os.remove(segment_path)
+        os.rmdir(segment_dir)
+
+    def write_segment(self, clip, start, end, overlays, segment_path, resolution, fps, bitrate):
+        """Write one timeline segment with the overlays active inside [start, end)"""
+        layers = []
+        for overlay in overlays:
+            if overlay.start < end and (overlay.end is None or overlay.end > start):
+                layers.append(overlay.with_start(overlay.start - start))
+        # moviepy writes int(duration * fps) frames, and float error can put end - start just under a
+        # whole frame count, so the duration asked for sits half a frame past it
+        frames = round((end - start) * fps)
+        segment_clip, _ = self.composite([clip], layers, (frames + 0.5) / fps, resolution)
+        segment_clip.write_videofile(
+            segment_path,
+            fps=fps,
+            codec='libx264',
+            bitrate=bitrate,
+            audio=False,
+            pixel_format='yuv420p',
+            threads=self.threads,
+            logger=None
+        )
+        segment_clip.close()
+
+    def concat_segments(self, segment_files, output_path, audio_path=None, duration=None, audio_codec='aac'):
+        """Join encoded segments with the ffmpeg concat demuxer (stream copy)"""
+        list_path = output_path + '.segments.txt'
+        with open(list_path, 'w') as f:
+            for segment_path in segment_files:
+                escaped = os.path.abspath(segment_path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        command = [FFMPEG_BINARY, '-y', '-v', 'error', '-f', 'concat', '-safe', '0', '-i', list_path]
+        if audio_path:
+            command += ['-i', audio_path, '-map', '0:v', '-map', '1:a', '-c:a', audio_codec]
+        command += ['-c:v', 'copy']
+        if duration:
+            command += ['-t', f"{duration:.3f}"]
+        command += self.output_flags()
+        command.append(output_path)
+        try:
+            subprocess.run(command, capture_output=True, text=True, check=True)
+        except subprocess.CalledProcessError as e:
+            logger.error(f"ffmpeg concat failed: {e.stderr}")
+            raise
+        finally:
+            os.remove(list_path)
+
+    def load_captions(self, subtitles_path):
+        """
+        Cues of an SRT file as (start, end, text), or of a karaoke word-timing
+        file (karaoke.WORDS_SUFFIX) as (start, end, text, words).
+        """
+        if subtitles_path.endswith(karaoke.WORDS_SUFFIX):
+            return karaoke.load_words(subtitles_path)
+        return self.parse_srt(subtitles_path)
+
+    def caption_clips(self, cues, video_size):
+        """Overlay clips of cues from load_captions: word-highlighted when they carry word timings"""
+        if cues and len(cues[0]) == 4:
+            return [clip for cue in cues
+                    for clip in karaoke.cue_clips(cue, video_size, self.caption_font(cue[2]))]
+        return self.create_text_clips(cues, video_size)
+
+    # Fonts for scripts the caption font lacks, by Unicode block
+    SCRIPT_FONTS = (
+        (r'[\u0900-\u097F]', "TiroDevanagariHindi-Regular.ttf"),  # Devanagari (Hindi, Marathi, ...)
+        (r'[\u0590-\u06FF]', "Arial.ttf"),  # Hebrew, Arabic
+    )
+
+    def caption_font(self, text):
+        # Select font based on the script of the text; the caption font covers Latin, Greek and Cyrillic
+        for pattern, font in self.SCRIPT_FONTS:
+            if re.search(pattern, text):
+                return font
+        return "HussarBoldCondensed-mmrV.otf"
+
     def create_text_clips(self, subtitles, video_size):
         text_clips = []
         for start_time, end_time, text in subtitles:
             duration = end_time - start_time
-            # Select font based on language
-            if re.search(r'[\u0900-\u097F]', text):  # Check if text contains Hindi characters
-                font = "TiroDevanagariHindi-Regular.ttf"
-            else:
-                font = "HussarBoldCondensed-mmrV.otf"
+            font = self.caption_font(text)
             text_clip = TextClip(font=font, text=text, font_size=60, margin=(10,10), color='white', bg_color='white', stroke_color='black', stroke_width=2, size=(video_size[0], None), method='caption', vertical_align='bottom')
             text_clip = text_clip.with_start(start_time).with_duration(duration).with_position(('center', int(video_size[1] * 0.7)))
             text_clips.append(text_clip)
@@ -212,7 +882,11 @@ class VideoCreator:
                  transition_effect='zoom_in',
                  target_resolution=(1080, 1920),
                  fps=30,
-                 bitrate="8000k"):
+                 bitrate="8000k",
+                 segmented=False,
+                 encoded_audio_path=None,
+                 max_scene_duration=None,
+                 workspace=None):
         """
         Create a video from video clips and audio with enhanced features.
         
@@ -220,11 +894,17 @@ class VideoCreator:
         video_folder (str): Path to folder containing video clips
         audio_path (str): Path to WAV audio file
         output_path (str): Path where the output MP4 will be saved
-        transition_duration (int): Duration for each video clip in seconds
-        transition_effect (str): Type of transition ('fade', 'slide_left', 'slide_right', 'zoom_in', 'zoom_out')
+        transition_duration (float): Length of the overlap window around each cut in seconds
+        transition_effect (str): Name of a transition in TRANSITIONS, or None for hard cuts
         resolution (tuple): Output video resolution (width, height)
         fps (int): Frames per second
         bitrate (str): Video bitrate (higher = better quality)
+        segmented (bool): Encode hold and transition segments separately and join them by stream copy
+        encoded_audio_path (str): AAC version of the audio from encode_audio, muxed by stream copy
+        max_scene_duration (float): Cap on each scene's slot; if the scenes then fall short of the
+            audio, the timeline is encoded once and looped
+        workspace (Workspace): Job workspace whose scratch folder takes the intermediates
+            (trimmed clips, segments); None keeps them next to the output
         """
         try:
             logger.info("Starting video creation process from videoClips...")
@@ -247,21 +927,28 @@ class VideoCreator:
             video_files.sort()
             logger.info(f"Found {len(video_files)} video clips")
             clip_duration= audio_duration/len(video_files)
+            if max_scene_duration:
+                clip_duration = min(clip_duration, max_scene_duration)
+            
+            if self.clip_analyzer is not None:
+                video_files = [self.trim_clip(path, clip_duration + transition_duration, workspace)
+                               for path in video_files]
+            
+            if self.render_farm is not None:
+                self.render_on_farm(video_files, clip_duration, audio, audio_path, subtitles_path,
+                                    output_path, transition_duration, transition_effect, resolution, fps,
+                                    bitrate, encoded_audio_path, workspace)
+                return
             
             # Create progress bar for video clip processing
             progress_bar = tqdm(total=len(video_files), desc="Processing video clips")
             
-            # Create video clips with transitions
+            # Create video clips, long enough to cover the transition windows
             video_clips = []
             for video_path in video_files:
                 # Create video clip from file
-                # Calculate the resize factor
-                width, height = target_resolution
                 logger.info("Loading video clip... " + video_path)
-                clip = VideoFileClip(video_path) #.target_resolution(width=width, height=height)  # Resize to target resolution
-                clip = clip.with_duration(clip_duration)  # Set duration for each video clip
-                zoomed_clip= clip.with_effects([vfx.Resize(lambda t : 1 + 0.05*t)]) #zoom clip over time
-                video_clips.append(zoomed_clip)
+                video_clips.append(self.scene_clip(video_path, clip_duration + transition_duration))
                     
                 # Update the progress bar
                 progress_bar.update(1)
@@ -269,99 +956,20 @@ class VideoCreator:
             # Close the progress bar
             progress_bar.close()
 
-            #Load Subtitles 
-            subtitles =self.parse_srt(subtitles_path) 
-            # Create text clips from subtitles
-            subtitle_clips = self.create_text_clips(subtitles, video_size=resolution)
-
-            #add Fixed watermark Textclip
-            watermark_clip = TextClip(font ="Arial.ttf", text="MakeAIvideo.in", font_size=70, color='black',bg_color='rgb(255, 179, 255)', stroke_color='black', stroke_width=2, size=(500, None), method='caption', vertical_align='bottom')
-            watermark_clip = watermark_clip.with_start(0).with_duration(audio_duration).with_position(('right','bottom'))
-
-            ###########videoeffects_new
-            final_clip = concatenate_videoclips(video_clips, padding=0)
-            # Combine the blank video and text clips
-            final_videoclip = CompositeVideoClip([final_clip] + subtitle_clips + [watermark_clip])
-
-            # final_clip = concatenate_videoclips(zoomed_clips, padding=0)
-            
-            # If video is shorter than audio, loop the video
-            if final_videoclip.duration < audio_duration:
-                n_loops = int(audio_duration / final_videoclip.duration) + 1
-                logger.info(f"Looping video {n_loops} times to match audio duration")
-                final_videoclip = concatenate_videoclips([final_videoclip] * n_loops)
-            
-            # Trim video to match audio duration
-            final_clip = final_videoclip.with_duration(audio_duration)
-
-            
-            
-            # Set audio
-            final_clip = final_clip.with_audio(audio)
-            
-            logger.info("Writing output file... This may take a while.")
-            # Write output file with progress bar
-            final_clip.write_videofile(
-                output_path,
-                fps=fps,
-                codec='libx264',
-                audio_codec='aac',
-                bitrate=bitrate,
-                logger=None  # Disable moviepy's logger as we're using our own
+            overlays = self.create_overlays(subtitles_path, resolution, audio_duration)
+            pieces = self.compose_scenes(
+                video_clips,
+                [clip_duration] * len(video_clips),
+                resolution,
+                transition_effect,
+                transition_duration,
+                fps
             )
-            
-            # Clean up
-            final_clip.close()
-            audio.close()
+            self.write_video(pieces, overlays, audio, audio_path, output_path, resolution, fps, bitrate, segmented,
+                             encoded_audio_path, workspace)
             
             logger.info(f"Video successfully created at: {output_path}")
-            ##############################
-                
-            # # Create transition clips (e.g., crossfade)
-            # final_clips = []
-            # for i in range(len(video_clips) - 1):
-            #     final_clips.append(video_clips[i])
-            #     transition = video_clips[i].crossfadeout(transition_duration)
-            #     final_clips.append(transition)       
-            # final_clips.append(video_clips[-1])  # Add the last video clip
-            
-            # logger.info("Compositing video clips...")
-            
-            # # Concatenate all video clips
-            # final_clip = concatenate_videoclips(final_clips, method="compose")
-            
-            # # If video is shorter than audio, loop the video
-            # if final_clip.duration < audio_duration:
-            #     n_loops = int(audio_duration / final_clip.duration) + 1
-            #     logger.info(f"Looping video {n_loops} times to match audio duration")
-            #     final_clip = concatenate_videoclips([final_clip] * n_loops)
-            
-            # # Trim video to match audio duration
-            # final_clip = final_clip.subclip(0, audio_duration)
-            
-            # # Set audio
-            # final_clip = final_clip.set_audio(audio)
-            
-            # logger.info("Writing output file... This may take a while.")
-            # # Write output file with progress bar
-            # final_clip.write_videofile(
-            #     output_path,
-            #     fps=fps,
-            #     codec='libx264',
-            #     audio_codec='aac',
-            #     bitrate=bitrate,
-            #     logger=None  # Disable moviepy's logger as we're using our own
-            # )
-            
-            # # Clean up
-            # final_clip.close()
-            # audio.close()
-            
-            # logger.info(f"Video successfully created at: {output_path}")
             
         except Exception as e:
             logger.error(f"Video creator: An error occurred: in {traceback.extract_tb(e.__traceback__)[0]}:\n{str(e)}") 
             raise
-
-
-
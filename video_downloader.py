@@ -3,9 +3,13 @@ import json
 import requests
 from moviepy import  VideoFileClip
 import subprocess
+import time
+from workspace import Workspace
+from hedged_fetch import CONNECT_TIMEOUT, LatencyRecorder
 
 class VideoDownloader:
-    def __init__(self, config_path='config.json'):
+    def __init__(self, config_path='config.json', hash_index=None, asset_index=None, fetch_timeout=300.0,
+                 fallback_threshold=None, latency_recorder=None):
         with open(config_path, 'r') as file:
             self.config = json.load(file)
         self.api_url = self.config['api_url']
@@ -13,55 +17,129 @@ class VideoDownloader:
         self.headers = {
             'Authorization': self.api_key
         }
-        self.temp_dir = 'temp/videos'
-        os.makedirs(self.temp_dir, exist_ok=True)
-
-    def download_videos(self, search_keywords, required_resolution=(1080, 1920)):
+        # Optional AssetHashIndex consulted before a clip is accepted
+        self.hash_index = hash_index
+        # Optional AssetReuseIndex searched for an earlier clip with a similar query before searching Pexels
+        self.asset_index = asset_index
+        # Deadline of downloads that are given none, and per-source latencies
+        self.fetch_timeout = fetch_timeout
+        # Similarity accepted from the asset index when a fetch runs out of time (None: the index's own)
+        self.fallback_threshold = fallback_threshold
+        self.latency = latency_recorder or LatencyRecorder()
+
+    def download_videos(self, search_keywords, required_resolution=(1080, 1920), candidates_per_keyword=5,
+                        workspace=None):
         """Downloads videos matching search keywords and a specific resolution.
 
         Args:
             search_keywords: A list of search keywords.
             required_resolution: A tuple (width, height) specifying the desired resolution.
                             Defaults to (1080, 1920).
+            candidates_per_keyword: Search results to try when a clip is rejected
+                            by the hash index.
+            workspace: Workspace whose videos folder receives the clips
+                            (the shared temp folder when None).
         """
 
         for idx, keyword in enumerate(search_keywords):
-            params = {'query': keyword, "orientation": "portrait", 'per_page': 1}  # Keep 'per_page': 1
-            response = requests.get(self.api_url, headers=self.headers, params=params)
-
-            if response.status_code == 200:
-                data = response.json()
-                if data['videos']:
-                    video_data = data['videos'][0] # Get the whole video data so we can check all available resolutions
-                    best_video_url = None
-                    best_video_path = None
-
-                    for file_data in video_data.get('video_files', []):  # Iterate through available resolutions
-                        video_url = file_data.get('link')
-                        if video_url:
-                            resolution = self.get_video_resolution(video_url)
-                            if resolution:
-                                width, height = resolution
-                                print(f"Found resolution: {width}x{height} for {keyword}")
-
-                                if (width, height) == required_resolution:
-                                    best_video_url = video_url
-                                    best_video_path = os.path.join(self.temp_dir, f'{idx+1:02d}.mp4')
-                                    break # Found our resolution, no need to check other resolutions
-                            else:
-                                print(f"Could not get resolution for {keyword} from URL: {video_url}")
-
-
-                    if best_video_url:
-                        self._download_video(best_video_url, best_video_path)
+            self.download_video(idx, keyword, required_resolution, candidates_per_keyword, workspace)
+
+    def download_video(self, idx, keyword, required_resolution=(1080, 1920), candidates_per_keyword=5,
+                       workspace=None, deadline=None):
+        """Downloads the clip for one scene.
+
+        Args:
+            idx: Zero-based scene index; the clip is saved as {idx+1:02d}.mp4.
+            keyword: Search keyword.
+            workspace: Workspace whose videos folder receives the clip.
+            deadline: time.monotonic() value to give up at (see FetchBudget); the
+                most similar clip in the asset index then stands in.
+
+        Returns:
+            The path of the accepted clip, or None.
+        """
+        best_video_path = (workspace or Workspace()).path('videos', f'{idx+1:02d}.mp4')
+        # Clips are only reused at the resolution they were fetched at
+        kind = 'video {}x{}'.format(*required_resolution)
+        if self.asset_index is not None and self.asset_index.find(keyword, kind, best_video_path):
+            return best_video_path
+        start = time.monotonic()
+        deadline = deadline if deadline is not None else start + self.fetch_timeout
+        try:
+            path = self._download_scene(keyword, required_resolution, candidates_per_keyword, best_video_path,
+                                        kind, deadline)
+        except requests.exceptions.RequestException as e:
+            print(f"Download for keyword '{keyword}' failed: {e}")
+            path = None
+        outcome = 'ok' if path else ('deadline' if time.monotonic() >= deadline else 'failed')
+        self.latency.record('pexels', time.monotonic() - start, outcome)
+        if path is None and self.asset_index is not None:
+            # Out of time or candidates: the closest clip in the library stands in
+            path = self.asset_index.find(keyword, kind, best_video_path, threshold=self.fallback_threshold)
+        return path
+
+    def _download_scene(self, keyword, required_resolution, candidates_per_keyword, best_video_path, kind, deadline):
+        per_page = candidates_per_keyword if self.hash_index is not None else 1
+        params = {'query': keyword, "orientation": "portrait", 'per_page': per_page}
+        response = requests.get(self.api_url, headers=self.headers, params=params,
+                                timeout=(CONNECT_TIMEOUT, max(deadline - time.monotonic(), 0.1)))
+
+        if response.status_code == 200:
+            data = response.json()
+            if data['videos']:
+                found = False
+                for video_data in data['videos']:
+                    best_video_url = self.find_video_file(video_data, keyword, required_resolution)
+                    if not best_video_url:
+                        continue
+                    found = True
+                    if time.monotonic() >= deadline:
+                        break
+                    self._download_video(best_video_url, best_video_path, deadline)
+                    if self.accept_asset(best_video_path):
                         print(f"Downloaded video for keyword '{keyword}' with resolution {required_resolution}")
-                    else:
-                        print(f"No video found with resolution {required_resolution} for keyword: {keyword}")
+                        if self.asset_index is not None:
+                            self.asset_index.add(best_video_path, keyword, kind, video_tags(video_data))
+                        return best_video_path
+
+                if not found:
+                    print(f"No video found with resolution {required_resolution} for keyword: {keyword}")
 
-                else:
-                    print(f"No videos found for keyword: {keyword}")
             else:
-                print(f"Failed to search for keyword: {keyword}. Status code: {response.status_code}")
+                print(f"No videos found for keyword: {keyword}")
+        else:
+            print(f"Failed to search for keyword: {keyword}. Status code: {response.status_code}")
+        return None
+
+    def find_video_file(self, video_data, keyword, required_resolution):
+        """Return the link of the file in a search result with the required resolution, if any"""
+        for file_data in video_data.get('video_files', []):  # Iterate through available resolutions
+            video_url = file_data.get('link')
+            if video_url:
+                # Search results usually carry the size; probe the file only when they don't
+                if file_data.get('width') and file_data.get('height'):
+                    resolution = (file_data['width'], file_data['height'])
+                else:
+                    resolution = self.get_video_resolution(video_url)
+                if resolution:
+                    width, height = resolution
+                    print(f"Found resolution: {width}x{height} for {keyword}")
+
+                    if (width, height) == required_resolution:
+                        return video_url # Found our resolution, no need to check other resolutions
+                else:
+                    print(f"Could not get resolution for {keyword} from URL: {video_url}")
+        return None
+
+    def accept_asset(self, path):
+        """Check a downloaded clip against the hash index; delete it if rejected"""
+        if self.hash_index is None or not os.path.exists(path):
+            return os.path.exists(path)
+        accepted, reason = self.hash_index.check_asset(path)
+        if not accepted:
+            print(f"Rejected {path}: {reason}")
+            os.remove(path)
+        return accepted
 
     def get_video_resolution(self, video_url):
         """Gets the resolution of a video from a URL using ffprobe.
@@ -101,13 +179,31 @@ class VideoDownloader:
             return None
 
 
-    def _download_video(self, url, path):
-        response = requests.get(url, stream=True)
+    def _download_video(self, url, path, deadline=None):
+        deadline = deadline if deadline is not None else time.monotonic() + self.fetch_timeout
+        response = requests.get(url, stream=True, timeout=(CONNECT_TIMEOUT, max(deadline - time.monotonic(), 0.1)))
         if response.status_code == 200:
             with open(path, 'wb') as file:
-                for chunk in response.iter_content(chunk_size=1024):
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    if time.monotonic() >= deadline:
+                        break
                     if chunk:
                         file.write(chunk)
-            print(f"Downloaded video to {path}")
+                else:
+                    print(f"Downloaded video to {path}")
+                    return
+            response.close()
+            os.remove(path)
+            print(f"Gave up downloading {url}: deadline reached")
         else:
-            print(f"Failed to download video from {url}. Status code: {response.status_code}")
\ No newline at end of file
+            print(f"Failed to download video from {url}. Status code: {response.status_code}")
+
+
+def video_tags(video_data):
+    """Tags of a Pexels search result, plus the words of its page slug (pexels.com/video/<words>-<id>/)"""
+    tags = list(video_data.get('tags') or [])
+    slug = video_data.get('url', '').rstrip('/').rsplit('/', 1)[-1]
+    words = ' '.join(word for word in slug.split('-') if not word.isdigit())
+    if words:
+        tags.append(words)
+    return tags
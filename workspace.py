@@ -0,0 +1,133 @@
+"""
+Per-job working directories.
+
+Every job gets its own folder under the temp folder, so jobs running at the
+same time on one host never write to each other's 01.jpg. Intermediates that
+are written and read back within the job (resized images, trimmed clips,
+encoded audio, segments) go to a scratch folder, which can live on a RAM-
+backed filesystem such as /dev/shm.
+
+Finished workspaces are removed by a WorkspaceCleaner thread, off the job's
+critical path. The cleaner finishes its queue when the interpreter exits;
+processes that end without running exit handlers (multiprocessing workers)
+call drain() themselves.
+"""
+import atexit
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import uuid
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SUBFOLDERS = ('audio', 'images', 'videos', 'subtitles')
+
+
+def new_job_id():
+    """Sortable, unique id: start time plus a random suffix"""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+
+class Workspace:
+    """
+    Folders of one job.
+
+    Without a job_id the workspace is the shared temp folder itself
+    (temp/images, temp/videos, ...), which is what components fall back to
+    when no workspace is passed.
+
+    Example:
+        workspace = Workspace('temp', new_job_id(), scratch_root='/dev/shm')
+        image_path = workspace.path('images', '01.jpg')
+    """
+
+    def __init__(self, temp_folder='temp', job_id=None, scratch_root=None):
+        """
+        Args:
+            temp_folder: Parent of all job folders.
+            job_id: Name of this job's folder; None for the shared layout.
+            scratch_root: Where the scratch folder goes (e.g. /dev/shm); None
+                keeps it inside the job folder.
+        """
+        self.job_id = job_id
+        self.root = os.path.join(temp_folder, job_id) if job_id else temp_folder
+        if scratch_root:
+            self.scratch = os.path.join(scratch_root, f"script_to_video_{job_id or 'shared'}")
+        else:
+            self.scratch = os.path.join(self.root, 'scratch')
+
+    def folder(self, name):
+        """Path of a subfolder ('audio', 'images', 'videos', 'subtitles' or 'scratch'), created on demand"""
+        path = self.scratch if name == 'scratch' else os.path.join(self.root, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def path(self, name, filename):
+        return os.path.join(self.folder(name), filename)
+
+    def scratch_dir(self, prefix):
+        """Fresh directory inside the scratch folder"""
+        return tempfile.mkdtemp(prefix=prefix, dir=self.folder('scratch'))
+
+    def create(self):
+        for name in SUBFOLDERS + ('scratch',):
+            self.folder(name)
+        return self
+
+    def size(self):
+        """Bytes of the files this job holds, scratch included"""
+        total = 0
+        for directory in self.directories():
+            for folder, _, filenames in os.walk(directory):
+                for filename in filenames:
+                    try:
+                        total += os.path.getsize(os.path.join(folder, filename))
+                    except OSError:
+                        pass  # removed while walking
+        return total
+
+    def directories(self):
+        """Top-level directories to delete when the job is done"""
+        if self.scratch.startswith(self.root + os.sep):
+            return [self.root]
+        return [self.root, self.scratch]
+
+
+class WorkspaceCleaner:
+    """
+    Deletes finished workspaces on a background thread.
+
+    Example:
+        cleaner = WorkspaceCleaner()
+        cleaner.remove(workspace)  # returns immediately
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        # The thread is a daemon, so without this the last jobs' folders outlive the process
+        atexit.register(self.drain)
+
+    def remove(self, workspace):
+        if workspace.job_id is None:
+            raise ValueError("The shared workspace is not removed")
+        self.queue.put(workspace.directories())
+
+    def drain(self):
+        """Block until every queued workspace is gone"""
+        self.queue.join()
+
+    def _run(self):
+        while True:
+            directories = self.queue.get()
+            try:
+                for directory in directories:
+                    shutil.rmtree(directory, ignore_errors=True)
+                logger.debug(f"Removed {', '.join(directories)}")
+            finally:
+                self.queue.task_done()